@@ -0,0 +1,68 @@
+"""
+Benchmark language detection on megabyte-sized transcripts.
+
+    python -m benchmarks.bench_language
+
+Compares the shared detector in pfe.language with the previous per-view
+implementation (a Python-level any() over every character per script).
+"""
+import random
+import time
+
+from pfe import language
+
+
+def legacy_detect_language(text: str) -> str:
+    # The implementation previously in cards/views.py
+    if any("\u0600" <= char <= "\u06ff" for char in text):
+        return "arabic"
+    elif any("\u4e00" <= char <= "\u9fff" for char in text):
+        return "chinese"
+    return "english"
+
+
+WORDS = {
+    'english': 'the cell membrane controls what enters and leaves the cell through transport proteins'.split(),
+    'arabic': 'الغشاء الخلوي يتحكم في دخول المواد وخروجها من الخلية عبر بروتينات النقل'.split(),
+    'chinese': '细胞膜 控制 物质 进出 细胞 通过 转运 蛋白'.split(),
+}
+
+
+def make_text(lang: str, size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = WORDS[lang]
+    parts, length = [], 0
+    while length < size:
+        word = rng.choice(words)
+        parts.append(word)
+        length += len(word) + 1
+    return ' '.join(parts)
+
+
+def timeit(func, text, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    size = 1024 * 1024
+    print(f'{"input":<10}{"legacy":>12}{"detector":>12}{"cached":>12}  result')
+    inputs = {lang: make_text(lang, size) for lang in WORDS}
+    # English transcript quoting a single Arabic word at the end
+    inputs['mixed'] = inputs['english'] + ' ' + WORDS['arabic'][0]
+    for lang, text in inputs.items():
+        legacy = timeit(legacy_detect_language, text)
+        fresh = timeit(language._detect, text)
+        language.detect(text)
+        cached = timeit(language.detect, text)
+        result = language.detect(text)
+        print(f'{lang:<10}{legacy * 1000:>10.2f}ms{fresh * 1000:>10.2f}ms{cached * 1000:>10.2f}ms'
+              f'  {result.language} ({result.confidence:.2f}), legacy: {legacy_detect_language(text)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark Mermaid validation on generated flowcharts with thousands of nodes.
+
+    python -m benchmarks.bench_mermaid
+
+Compares the flowchart parser in mermiad.flowchart with the previous
+regex-based validate_mermaid_syntax, on well-formed diagrams and on an
+unterminated-label input that makes the old node pattern backtrack.
+"""
+import random
+import re
+import time
+
+from mermiad import flowchart
+
+
+def legacy_validate(diagram: str):
+    # The implementation previously in mermiad/views.py
+    diagram = re.sub(r'```mermaid\s*|```\s*$', '', diagram.strip())
+    required_elements = [
+        ('graph', r'(graph|flowchart)\s+(TB|TD|BT|RL|LR)'),
+        ('nodes', r'\w+\s*(\[|\(|\{).*?(\]|\)|\})'),
+        ('connections', r'\w+\s*(-+>|\.+>|=+>)\s*\w+'),
+    ]
+    for element, pattern in required_elements:
+        if not re.search(pattern, diagram):
+            return False, f"Missing or invalid {element} definition"
+    diagram = re.sub(r'\s+', ' ', diagram)
+    diagram = re.sub(r'(\[|\(|\{)\s+', r'\1', diagram)
+    diagram = re.sub(r'\s+(\]|\)|\})', r'\1', diagram)
+    return True, diagram
+
+
+def make_diagram(nodes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    shapes = [('[', ']'), ('(', ')'), ('{', '}'), ('((', '))')]
+    links = ['-->', '-.->', '==>', '---', '-->|rel|']
+    lines = ['graph TD']
+    for i in range(nodes):
+        opener, closer = rng.choice(shapes)
+        lines.append(f'    n{i}{opener}Concept number {i}{closer}')
+    group = 0
+    for i in range(1, nodes):
+        if i % 50 == 1:
+            if group:
+                lines.append('    end')
+            lines.append(f'    subgraph g{group} [Group {group}]')
+            group += 1
+        lines.append(f'        n{rng.randrange(i)} {rng.choice(links)} n{i}')
+    lines.append('    end')
+    lines.append('    click n0 "https://example.com" "Root"')
+    return '\n'.join(lines)
+
+
+def parse(text: str) -> None:
+    try:
+        flowchart.parse(text)
+    except flowchart.MermaidSyntaxError:
+        pass
+
+
+def timeit(func, text, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f'{"input":<26}{"chars":>10}{"legacy":>12}{"parser":>12}')
+    inputs = {f'{n} nodes': make_diagram(n) for n in (1000, 5000, 20000)}
+    # No closing bracket anywhere: the lazy ".*?" rescans the rest of the text per node
+    for n in (2000, 4000, 8000):
+        inputs[f'unterminated x{n}'] = 'graph TD\n' + ' '.join(f'n{i}[label' for i in range(n)) + '\nA-->B'
+    for name, text in inputs.items():
+        legacy = timeit(legacy_validate, text, repeat=1)
+        parser = timeit(parse, text)
+        print(f'{name:<26}{len(text):>10}{legacy * 1000:>10.1f}ms{parser * 1000:>10.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
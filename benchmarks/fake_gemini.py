@@ -0,0 +1,300 @@
+"""
+In-process stand-in for the Gemini API, for benchmarks and load tests.
+
+    with fake_gemini.install(FakeConfig(latency=0.3, error_rate=0.02)) as fake:
+        ...  # every pfe.llm call is answered by fake
+
+install() replaces google.generativeai.GenerativeModel (and the models
+already cached by pfe.llm) with FakeModel, and the YouTube transcript API
+with a fake of the same latency whose videos have transcripts in
+FakeConfig.transcript_languages and can be translated into any other. Answers follow what the prompt asks for:
+flashcards, quiz questions, a Mermaid diagram, JSON matching the response
+schema, "### ITEM n ###" sections for packed batch prompts and
+"### CARDS ###"-style sections for study packs. They are
+written in the language of the input text (English, Arabic or Chinese), with
+FakeConfig.items items of FakeConfig.words words each, and are different on
+every call so deduplication and caching behave as with real traffic.
+"""
+import asyncio
+import contextlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import google.generativeai as genai
+from google.api_core import exceptions
+from youtube_transcript_api import NoTranscriptFound
+
+from pfe import llm
+from pfe.batching import ITEM_MARKER
+from pfe.language import SCRIPT_RUNS
+from study.prompts import SECTION_MARKER
+
+WORDS = {
+    'english': ('cell membrane protein energy transport gradient molecule enzyme reaction '
+                'structure function diffusion osmosis channel signal receptor pathway '
+                'nucleus genome replication theory evidence system process').split(),
+    'arabic': ('الخلية الغشاء البروتين الطاقة النقل التدرج الجزيء الإنزيم التفاعل '
+               'البنية الوظيفة الانتشار التناضح القناة الإشارة المستقبل المسار '
+               'النواة الجينوم التضاعف النظرية الدليل النظام العملية').split(),
+    'chinese': ('细胞 细胞膜 蛋白质 能量 运输 梯度 分子 酶 反应 结构 功能 扩散 渗透 '
+                '通道 信号 受体 途径 细胞核 基因组 复制 理论 证据 系统 过程').split(),
+}
+QUESTION_MARKS = {'english': '?', 'arabic': '؟', 'chinese': '？'}
+# Approximate characters per token, for usage metadata
+CHARS_PER_TOKEN = {'english': 4, 'arabic': 3, 'chinese': 1.5}
+
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.5            # mean seconds before the answer (or first chunk)
+    jitter: float = 0.1             # standard deviation of the latency
+    chunk_delay: float = 0.02       # seconds between streamed chunks
+    chunk_chars: int = 40           # characters per streamed chunk
+    error_rate: float = 0.0         # share of calls that fail
+    rate_limit_share: float = 0.5   # share of failures that are 429s (the others are 503s)
+    items: int = 8                  # cards / questions per answer
+    words: int = 12                 # words per answer
+    diagram_nodes: int = 12
+    language: str = 'auto'          # or force 'english', 'arabic', 'chinese'
+    transcript_languages: Tuple[str, ...] = ('en',)
+    seed: Optional[int] = None
+
+
+def make_text(language: str, words: int, rng: random.Random) -> str:
+    separator = '' if language == 'chinese' else ' '
+    return separator.join(rng.choice(WORDS[language]) for _ in range(words))
+
+
+def input_language(prompt: str) -> str:
+    """The language with the most Arabic or Han letters in prompt, else English."""
+    counts = Counter()
+    for match in SCRIPT_RUNS.finditer(prompt):
+        if match.lastgroup in ('arabic', 'han'):
+            counts[match.lastgroup] += len(match.group())
+    if not counts:
+        return 'english'
+    return 'arabic' if counts['arabic'] >= counts['han'] else 'chinese'
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt_tokens: int = 0, output_tokens: int = 0):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens)
+
+
+class FakeStream:
+    """
+    Iterable of chunk responses, as returned with stream=True. The last chunk
+    carries the token counts of the whole answer.
+    """
+
+    def __init__(self, text: str, fake: 'FakeGemini', prompt_tokens: int = 0, output_tokens: int = 0):
+        self.text = text
+        self._fake = fake
+        self._usage = (prompt_tokens, output_tokens)
+        self._cancelled = False
+
+    def __iter__(self) -> Iterator[FakeResponse]:
+        config = self._fake.config
+        for start in range(0, len(self.text), config.chunk_chars):
+            if self._cancelled:
+                return
+            if start:
+                time.sleep(config.chunk_delay)
+            last = start + config.chunk_chars >= len(self.text)
+            yield FakeResponse(self.text[start:start + config.chunk_chars], *(self._usage if last else (0, 0)))
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        self._fake._record(cancelled=1)
+
+
+class FakeGemini:
+    """Answers prompts and keeps call statistics; shared by all FakeModels."""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _record(self, **counts) -> None:
+        with self._lock:
+            self._stats.update(counts)
+
+    def _random(self) -> random.Random:
+        with self._lock:
+            return random.Random(self._rng.random())
+
+    def delay(self) -> float:
+        return max(0.0, random.gauss(self.config.latency, self.config.jitter))
+
+    def maybe_fail(self, rng: random.Random) -> None:
+        if rng.random() >= self.config.error_rate:
+            return
+        if rng.random() < self.config.rate_limit_share:
+            self._record(rate_limited=1)
+            raise exceptions.ResourceExhausted('Quota exceeded (fake)')
+        self._record(unavailable=1)
+        raise exceptions.ServiceUnavailable('Model overloaded (fake)')
+
+    # Answers
+
+    def answer(self, prompt: str, generation_config: Optional[Dict], rng: random.Random) -> str:
+        language = self.config.language if self.config.language != 'auto' else input_language(prompt)
+        schema = (generation_config or {}).get('response_schema')
+        if schema:
+            fields = list(schema['items']['properties'])
+            return json.dumps([self.item(fields, language, rng) for _ in range(self.config.items)],
+                              ensure_ascii=False)
+        sections = [match.group(1).lower() for match in SECTION_MARKER.finditer(prompt)]
+        if sections:
+            return self.study_pack(sections, language, rng)
+        if 'mermaid' in prompt.lower():
+            return self.diagram(language, rng)
+        kind = 'quiz' if 'Question:' in prompt else 'cards'
+        packed = sorted({int(n) for n in ITEM_MARKER.findall(prompt)})
+        if len(packed) > 1:
+            return '\n\n'.join(f'### ITEM {n} ###\n{self.text_items(kind, language, rng)}' for n in packed)
+        return self.text_items(kind, language, rng)
+
+    def question(self, language: str, rng: random.Random) -> str:
+        return make_text(language, max(4, self.config.words // 2), rng) + QUESTION_MARKS[language]
+
+    def item(self, fields: List[str], language: str, rng: random.Random) -> Dict[str, str]:
+        return {
+            name: self.question(language, rng) if name == 'question' else make_text(language, self.config.words, rng)
+            for name in fields
+        }
+
+    def text_items(self, kind: str, language: str, rng: random.Random) -> str:
+        blocks = []
+        for _ in range(self.config.items):
+            question = self.question(language, rng)
+            if kind == 'quiz':
+                answers = '\n'.join(f'{letter}) {make_text(language, max(2, self.config.words // 3), rng)}'
+                                    for letter in 'abcd')
+                blocks.append(f'Question: {question}\n{answers}')
+            else:
+                blocks.append(f'{question}\n{make_text(language, self.config.words, rng)}')
+        return '\n\n'.join(blocks)
+
+    def study_pack(self, sections: List[str], language: str, rng: random.Random) -> str:
+        answers = {
+            'cards': lambda: self.text_items('cards', language, rng),
+            'quiz': lambda: self.text_items('quiz', language, rng),
+            'diagram': lambda: self.diagram(language, rng),
+        }
+        return '\n\n'.join(f'### {kind.upper()} ###\n{answers[kind]()}' for kind in sections)
+
+    def diagram(self, language: str, rng: random.Random) -> str:
+        lines = ['```mermaid', 'graph TD', f'    n0[{make_text(language, 3, rng)}]']
+        for i in range(1, self.config.diagram_nodes):
+            lines.append(f'    n{rng.randrange(i)} --> n{i}[{make_text(language, 3, rng)}]')
+        return '\n'.join(lines + ['```'])
+
+    def respond(self, prompt, stream: bool, generation_config: Optional[Dict]):
+        rng = self._random()
+        prompt = str(prompt)
+        self.maybe_fail(rng)
+        text = self.answer(prompt, generation_config, rng)
+        language = input_language(text)
+        self._record(calls=1, streamed=int(stream), output_chars=len(text))
+        usage = int(len(prompt) / CHARS_PER_TOKEN[language]), int(len(text) / CHARS_PER_TOKEN[language])
+        if stream:
+            return FakeStream(text, self, *usage)
+        return FakeResponse(text, *usage)
+
+    def transcript(self, video_id: str) -> List[Dict]:
+        """Segments in the shape returned by YouTubeTranscriptApi.get_transcript()."""
+        rng = self._random()
+        time.sleep(self.delay())
+        self._record(transcripts=1)
+        language = self.config.language if self.config.language != 'auto' else 'english'
+        return [{'text': make_text(language, self.config.words, rng), 'start': i * 4.0, 'duration': 4.0}
+                for i in range(self.config.items * 10)]
+
+
+class FakeTranscript:
+    """A transcript as listed by YouTubeTranscriptApi.list_transcripts()."""
+
+    is_translatable = True
+
+    def __init__(self, fake: FakeGemini, video_id: str, language_code: str):
+        self._fake = fake
+        self.video_id = video_id
+        self.language_code = language_code
+
+    def translate(self, language_code: str) -> 'FakeTranscript':
+        return FakeTranscript(self._fake, self.video_id, language_code)
+
+    def fetch(self) -> List[Dict]:
+        return self._fake.transcript(self.video_id)
+
+
+class FakeTranscriptList:
+    def __init__(self, fake: FakeGemini, video_id: str):
+        self.video_id = video_id
+        self._transcripts = [FakeTranscript(fake, video_id, code) for code in fake.config.transcript_languages]
+
+    def __iter__(self) -> Iterator[FakeTranscript]:
+        return iter(self._transcripts)
+
+    def find_transcript(self, language_codes) -> FakeTranscript:
+        for code in language_codes:
+            for transcript in self._transcripts:
+                if transcript.language_code == code:
+                    return transcript
+        raise NoTranscriptFound(self.video_id, language_codes, self)
+
+
+def make_model_class(fake: FakeGemini):
+    class FakeModel:
+        def __init__(self, model_name: str = 'gemini-1.5-flash', *args, **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, prompt, stream=False, generation_config=None, **kwargs):
+            time.sleep(fake.delay())
+            return fake.respond(prompt, stream, generation_config)
+
+        async def generate_content_async(self, prompt, stream=False, generation_config=None, **kwargs):
+            await asyncio.sleep(fake.delay())
+            return fake.respond(prompt, stream, generation_config)
+
+        def count_tokens(self, contents, **kwargs):
+            return {'total_tokens': len(str(contents)) // 4}
+
+    return FakeModel
+
+
+@contextlib.contextmanager
+def install(config: Optional[FakeConfig] = None) -> Iterator[FakeGemini]:
+    """Route model calls and transcript fetches to a FakeGemini for the duration."""
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    fake = FakeGemini(config or FakeConfig())
+    model_class = make_model_class(fake)
+    saved = (genai.GenerativeModel, YouTubeTranscriptApi.__dict__['get_transcript'],
+             YouTubeTranscriptApi.__dict__['list_transcripts'], dict(llm._models))
+    genai.GenerativeModel = model_class
+    YouTubeTranscriptApi.get_transcript = staticmethod(lambda video_id, *args, **kwargs: fake.transcript(video_id))
+    YouTubeTranscriptApi.list_transcripts = staticmethod(
+        lambda video_id, *args, **kwargs: FakeTranscriptList(fake, video_id)
+    )
+    llm._models.clear()
+    try:
+        yield fake
+    finally:
+        genai.GenerativeModel, YouTubeTranscriptApi.get_transcript, YouTubeTranscriptApi.list_transcripts, models = saved
+        llm._models.clear()
+        llm._models.update(models)
@@ -0,0 +1,397 @@
+"""
+Load scenarios for every API endpoint, answered by the fake Gemini.
+
+    python -m benchmarks.load                      # run and print a report
+    python -m benchmarks.load --save               # also store the baseline
+    python -m benchmarks.load --compare            # compare with the baseline
+    python -m benchmarks.load --scenario cards_create --scenario search --requests 200
+
+Requests go through Django's test client from --concurrency threads,
+against a fresh SQLite database in a temporary directory, with every model
+call and transcript fetch answered by benchmarks.fake_gemini. Inputs rotate
+between English, Arabic and Chinese. Each scenario reports p50/p95/p99
+latency (and time to first byte for streamed responses), throughput,
+status codes, database writes (INSERT/UPDATE/DELETE statements), model
+calls and the peak Python memory allocated while it ran (tracemalloc,
+which slows requests down a little; --no-memory turns it off).
+
+The Gemini rate limiter is off unless --rate-limit is given, so the numbers
+measure the application rather than the upstream quota. Results are written
+as JSON to --baseline (benchmarks/baselines/load.json) with --save;
+--compare exits with status 1 when p95 latency or writes per request grow,
+or throughput drops, by more than --tolerance compared to that file.
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_gemini import WORDS, make_text
+
+BASELINE = Path(__file__).resolve().parent / 'baselines' / 'load.json'
+LANGUAGES = ('english', 'arabic', 'chinese')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    url_name: str
+    # (request number, language, context) -> JSON body, or query parameters for GET
+    payload: Callable[[int, str, Dict], Optional[Dict]]
+    url_kwargs: Optional[Callable[[int, Dict], Dict]] = None
+    stream: bool = False
+
+
+def input_text(i: int, language: str, context: Dict) -> str:
+    # Different on every request so the generation cache doesn't answer it
+    return make_text(language, context['input_words'], random.Random(f'{context["scenario"]}-{language}-{i}'))
+
+
+def text_body(i, language, context):
+    return {'input_text': input_text(i, language, context)}
+
+
+def batch_body(i, language, context):
+    size = context['batch_size']
+    return {'items': [{'input_text': input_text(i * size + j, language, context)} for j in range(size)], 'pack': True}
+
+
+def captions_body(i, language, context):
+    # Half of the requests ask for a video fetched before
+    video = i % max(1, context['requests'] // 2)
+    return {'url': f'https://www.youtube.com/watch?v=vid{video:08d}'}
+
+
+def captions_bulk_body(i, language, context):
+    # Ten videos per request, overlapping the next request's by half
+    return {'urls': [f'https://www.youtube.com/watch?v=bulk{i * 5 + n:07d}' for n in range(10)]}
+
+
+def job_body(i, language, context):
+    return {'kind': 'cards', 'payload': text_body(i, language, context)}
+
+
+def search_params(i, language, context):
+    words = WORDS[language]
+    return {'q': f'{words[i % len(words)]} {words[(i * 7 + 3) % len(words)]}'}
+
+
+def stored_rows(label: str, context: Dict) -> List:
+    # Decks and quiz sets saved by the scenarios that ran before, loaded once
+    rows = context['stored'].get(label)
+    if rows is None:
+        from django.apps import apps
+        rows = context['stored'][label] = list(apps.get_model(label).objects.select_related('source').order_by('pk'))
+    return rows
+
+
+def stored_source_params(label: str) -> Callable:
+    def params(i, language, context):
+        rows = stored_rows(label, context)
+        return {'source': rows[i % len(rows)].source.text_hash if rows else 'missing'}
+    return params
+
+
+def stored_pk_kwargs(label: str, name: str) -> Callable:
+    def kwargs(i, context):
+        rows = stored_rows(label, context)
+        return {name: rows[i % len(rows)].pk if rows else 1}
+    return kwargs
+
+
+SCENARIOS = [
+    Scenario('cards_create', 'post', 'create_cards', text_body),
+    Scenario('cards_create_async', 'post', 'create_cards_async', text_body),
+    Scenario('cards_stream', 'post', 'create_cards_stream', lambda i, lang, ctx: {**text_body(i, lang, ctx), 'persist': True},
+             stream=True),
+    Scenario('cards_batch', 'post', 'create_cards_batch', batch_body),
+    Scenario('quiz_create', 'post', 'create_quizes', text_body),
+    Scenario('quiz_create_async', 'post', 'create_quizes_async', text_body),
+    Scenario('quiz_stream', 'post', 'create_quizes_stream',
+             lambda i, lang, ctx: {**text_body(i, lang, ctx), 'persist': True, 'count': 5}, stream=True),
+    Scenario('quiz_batch', 'post', 'create_quizes_batch', batch_body),
+    Scenario('quiz_show', 'get', 'get_quizes', lambda i, lang, ctx: {'limit': 100, 'cursor': i}),
+    Scenario('quiz_show_stream', 'get', 'get_quizes', lambda i, lang, ctx: {'stream': '1'}, stream=True),
+    Scenario('diagram_create', 'post', 'create_diagram', text_body),
+    Scenario('diagram_create_async', 'post', 'create_diagram_async', text_body),
+    Scenario('study_pack', 'post', 'create_study_pack', text_body),
+    Scenario('decks_list', 'get', 'list_decks', stored_source_params('cards.Deck')),
+    Scenario('deck_get', 'get', 'get_deck', lambda i, lang, ctx: None,
+             url_kwargs=stored_pk_kwargs('cards.Deck', 'deck_id')),
+    Scenario('quiz_sets_list', 'get', 'list_quiz_sets', stored_source_params('quiz.QuizSet')),
+    Scenario('quiz_set_get', 'get', 'get_quiz_set', lambda i, lang, ctx: None,
+             url_kwargs=stored_pk_kwargs('quiz.QuizSet', 'set_id')),
+    Scenario('captions', 'post', 'get_captions', captions_body),
+    Scenario('captions_async', 'post', 'get_captions_async', captions_body),
+    Scenario('captions_bulk', 'post', 'get_captions_bulk', captions_bulk_body),
+    Scenario('jobs_create', 'post', 'create_job', job_body),
+    Scenario('jobs_get', 'get', 'get_job', lambda i, lang, ctx: None,
+             url_kwargs=lambda i, ctx: {'job_id': ctx['job_ids'][i % len(ctx['job_ids'])] if ctx['job_ids'] else 1}),
+    Scenario('search', 'get', 'search', search_params),
+    Scenario('metrics', 'get', 'metrics', lambda i, lang, ctx: None),
+]
+
+
+class WriteCounter:
+    """Database execute wrapper counting write statements on every connection."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+            with self._lock:
+                self.count += len(params) if many and params is not None else 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        def add(sender, connection, **kwargs):
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+
+        connection_created.connect(add, weak=False)
+        for connection in connections.all():
+            add(None, connection)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        'p50': round(percentile(values, 50) * 1000, 2),
+        'p95': round(percentile(values, 95) * 1000, 2),
+        'p99': round(percentile(values, 99) * 1000, 2),
+        'max': round(max(values, default=0) * 1000, 2),
+    }
+
+
+_local = threading.local()
+
+
+def send(scenario: Scenario, i: int, context: Dict):
+    """Send one request; returns (status code, seconds, seconds to first byte)."""
+    from django.test import Client
+    from django.urls import reverse
+
+    client = getattr(_local, 'client', None)
+    if client is None:
+        client = _local.client = Client()
+    language = LANGUAGES[i % len(LANGUAGES)]
+    url = reverse(scenario.url_name, kwargs=scenario.url_kwargs(i, context) if scenario.url_kwargs else None)
+    payload = scenario.payload(i, language, context)
+
+    start = time.perf_counter()
+    if scenario.method == 'get':
+        response = client.get(url, payload)
+    else:
+        response = client.post(url, payload, content_type='application/json')
+    first_byte = time.perf_counter() - start
+    if response.streaming:
+        for index, _ in enumerate(response.streaming_content):
+            if not index:
+                first_byte = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+
+    if response.status_code >= 500 and not response.streaming:
+        print(f'{scenario.name}: {response.status_code} {response.content[:200]!r}', file=sys.stderr)
+    if scenario.url_name == 'create_job' and response.status_code == 202:
+        context['job_ids'].append(response.json()['id'])
+    return response.status_code, elapsed, first_byte
+
+
+def run_scenario(scenario: Scenario, context: Dict, fake, writes: WriteCounter, memory: bool) -> Dict:
+    requests, concurrency = context['requests'], context['concurrency']
+    context['scenario'] = scenario.name
+    before = fake.stats()
+    writes_before = writes.count
+    if memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda i: send(scenario, i, context), range(requests)))
+    elapsed = time.perf_counter() - start
+
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    statuses: Dict[str, int] = {}
+    for code, _, _ in results:
+        statuses[str(code)] = statuses.get(str(code), 0) + 1
+    latencies = [seconds for _, seconds, _ in results]
+    report = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(count for code, count in statuses.items() if int(code) >= 500),
+        'statuses': statuses,
+        'throughput_rps': round(requests / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': summarize(latencies),
+        'db_writes': writes.count - writes_before,
+        'db_writes_per_request': round((writes.count - writes_before) / requests, 2),
+        'model_calls': fake.stats().get('calls', 0) - before.get('calls', 0),
+        'transcript_fetches': fake.stats().get('transcripts', 0) - before.get('transcripts', 0),
+        'memory_peak_kb': round(peak / 1024),
+    }
+    if scenario.stream:
+        report['first_byte_ms'] = summarize([first_byte for _, _, first_byte in results])
+    return report
+
+
+def setup(args) -> None:
+    """Configure Django for the run: temporary database, limiter settings."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pfe.settings')
+    os.environ['GEMINI_WARM_UP'] = '0'
+    import django
+    from django.conf import settings
+
+    directory = tempfile.mkdtemp(prefix='pfe-load-')
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    settings.DATABASES['default']['NAME'] = str(Path(directory) / 'db.sqlite3')
+    settings.GEMINI_RATE_LIMIT = args.rate_limit
+    settings.GEMINI_MAX_CONCURRENCY = max(settings.GEMINI_MAX_CONCURRENCY, args.concurrency * 4)
+    django.setup()
+
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions of current against baseline, as report lines."""
+    regressions = []
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        checks = [
+            ('p95 latency', result['latency_ms']['p95'], before['latency_ms']['p95'], 1),
+            ('writes/request', result['db_writes_per_request'], before['db_writes_per_request'], 1),
+            ('throughput', result['throughput_rps'], before['throughput_rps'], -1),
+        ]
+        for label, now, then, direction in checks:
+            if then and direction * (now - then) / then > tolerance:
+                regressions.append(f'{name}: {label} {then} -> {now}')
+    return regressions
+
+
+def print_report(results: Dict) -> None:
+    print(f'{"scenario":<22}{"req/s":>8}{"p50":>9}{"p95":>9}{"p99":>9}{"writes":>8}{"calls":>7}{"errors":>7}{"mem KB":>9}')
+    for name, r in results['scenarios'].items():
+        latency = r['latency_ms']
+        print(f'{name:<22}{r["throughput_rps"]:>8}{latency["p50"]:>9}{latency["p95"]:>9}{latency["p99"]:>9}'
+              f'{r["db_writes"]:>8}{r["model_calls"]:>7}{r["errors"]:>7}{r["memory_peak_kb"]:>9}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run load scenarios against the fake Gemini.')
+    parser.add_argument('--scenario', action='append', choices=[s.name for s in SCENARIOS],
+                        help='Scenario to run (repeatable; default: all)')
+    parser.add_argument('--requests', type=int, default=60, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.2, help='Mean fake model latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--chunk-delay', type=float, default=0.01, help='Seconds between streamed chunks')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of model calls that fail')
+    parser.add_argument('--items', type=int, default=8, help='Cards or questions per model answer')
+    parser.add_argument('--words', type=int, default=12, help='Words per generated answer')
+    parser.add_argument('--input-words', type=int, default=200, help='Words per request input text')
+    parser.add_argument('--batch-size', type=int, default=10, help='Items per batch request')
+    parser.add_argument('--rate-limit', type=float, default=0, help='GEMINI_RATE_LIMIT for the run (0 = off)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="Don't trace memory allocations")
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='Write the results to --baseline')
+    parser.add_argument('--compare', action='store_true', help='Compare the results with --baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative regression')
+    args = parser.parse_args(argv)
+
+    setup(args)
+    from benchmarks import fake_gemini
+
+    config = fake_gemini.FakeConfig(
+        latency=args.latency, jitter=args.jitter, chunk_delay=args.chunk_delay, error_rate=args.error_rate,
+        items=args.items, words=args.words, seed=args.seed,
+    )
+    context = {
+        'requests': args.requests, 'concurrency': args.concurrency, 'input_words': args.input_words,
+        'batch_size': args.batch_size, 'job_ids': [], 'stored': {},
+    }
+    selected = [s for s in SCENARIOS if not args.scenario or s.name in args.scenario]
+    writes = WriteCounter()
+    writes.install()
+
+    results = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {key: value for key, value in vars(args).items()
+                       if key not in ('baseline', 'save', 'compare', 'scenario')},
+        },
+        'scenarios': {},
+    }
+    with fake_gemini.install(config) as fake:
+        for scenario in selected:
+            results['scenarios'][scenario.name] = run_scenario(scenario, context, fake, writes, not args.no_memory)
+            print(f'{scenario.name}: done', file=sys.stderr)
+    results['meta']['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print_report(results)
+
+    status = 0
+    if args.compare:
+        if not args.baseline.exists():
+            print(f'No baseline at {args.baseline}', file=sys.stderr)
+            status = 2
+        else:
+            regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+            print('\n'.join(['Regressions:'] + regressions) if regressions else 'No regressions')
+            status = int(bool(regressions))
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2, ensure_ascii=False) + '\n')
+        print(f'Saved {args.baseline}')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-18 07:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0002_fingerprint'),
+        ('sources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='source',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cards', to='sources.source'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['source', 'created_at'], name='card_source_created_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 07:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0003_source_created_at'),
+        ('sources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Deck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('options_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('cards', models.ManyToManyField(related_name='decks', to='cards.card')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='decks', to='sources.source')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'options_hash'), name='deck_source_options_uniq')],
+            },
+        ),
+    ]
@@ -1,7 +1,35 @@
 from django.db import models
+from django.utils import timezone
 
-class Card(models.Model):
+from pfe.fingerprint import Fingerprinted
+
+class Card(Fingerprinted):
     question = models.CharField(max_length=200)
     answer = models.CharField(max_length=200)
+    source = models.ForeignKey('sources.Source', null=True, blank=True, on_delete=models.SET_NULL,
+                               related_name='cards', db_index=False)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, editable=False)
+
+    class Meta:
+        # Listing by source in creation order; also serves lookups on source alone
+        indexes = [models.Index(fields=['source', 'created_at'], name='card_source_created_idx')]
+
+    def __str__(self):
+        return self.question
+
+
+class Deck(models.Model):
+    """The cards generated from one source with one set of options."""
+
+    source = models.ForeignKey('sources.Source', on_delete=models.CASCADE, related_name='decks')
+    options_hash = models.CharField(max_length=64)
+    # Many-to-many since near-duplicate merging can share a card between decks
+    cards = models.ManyToManyField(Card, related_name='decks')
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        # Its index also serves lookups on source alone
+        constraints = [models.UniqueConstraint(fields=['source', 'options_hash'], name='deck_source_options_uniq')]
+
     def __str__(self):
-        return self.question
\ No newline at end of file
+        return f'Deck {self.pk} of {self.source}'
@@ -0,0 +1,123 @@
+"""
+Flashcard prompt templates, registered with the shared prompt registry.
+"""
+from pfe.prompts import registry
+
+CARD_PROMPTS = {
+    "english": """
+        You are an expert educator tasked with creating comprehensive flashcards from the provided text.
+        
+        Text: {input_text}
+        
+        Guidelines for flashcard creation:
+        1. Analyze the text thoroughly to identify:
+           - Key concepts and definitions
+           - Important facts and figures
+           - Cause-and-effect relationships
+           - Sequential processes
+           - Notable examples and applications
+        
+        2. Create flashcards following these rules:
+           - Minimum cards: {min_cards}
+           - Maximum cards: {max_cards}
+           - Question format: {question_format}
+           - Answer length: {answer_length}
+           - Include {special_focus} concepts
+        
+        3. Structural requirements:
+           - Format each card as "Question\\nAnswer"
+           - Separate cards with double newlines
+           - Questions should be clear and specific
+           - Answers should be concise but complete
+        
+        4. Special instructions:
+           - {special_instructions}
+           - Ensure progressive difficulty when relevant
+           - Include application-based questions
+           - Create reverse cards for key concepts
+        
+        Example format:
+        What is the primary function of mitochondria?
+        Generates cellular energy through ATP production.
+
+        Define osmosis in simple terms.
+        Movement of water molecules across a semi-permeable membrane.
+        """,
+    
+    "arabic": """
+        أنت خبير تعليمي مكلف بإنشاء بطاقات تعليمية شاملة من النص المقدم.
+
+        النص: {input_text}
+
+        إرشادات إنشاء البطاقات التعليمية:
+        1. تحليل النص بدقة لتحديد:
+           - المفاهيم والتعريفات الرئيسية
+           - الحقائق والأرقام المهمة
+           - علاقات السبب والنتيجة
+           - العمليات المتسلسلة
+           - الأمثلة والتطبيقات البارزة
+
+        2. إنشاء البطاقات وفقاً للقواعد التالية:
+           - الحد الأدنى للبطاقات: {min_cards}
+           - الحد الأقصى للبطاقات: {max_cards}
+           - صيغة السؤال: {question_format}
+           - طول الإجابة: {answer_length}
+           - تضمين مفاهيم {special_focus}
+
+        3. المتطلبات الهيكلية:
+           - تنسيق كل بطاقة كـ "سؤال\\nجواب"
+           - فصل البطاقات بسطرين جديدين
+           - يجب أن تكون الأسئلة واضحة ومحددة
+           - يجب أن تكون الإجابات موجزة ولكن كاملة
+
+        4. تعليمات خاصة:
+           - {special_instructions}
+           - ضمان التدرج في الصعوبة عند الاقتضاء
+           - تضمين أسئلة تطبيقية
+           - إنشاء بطاقات عكسية للمفاهيم الرئيسية
+        """,
+    
+    "chinese": """
+        您是一位专业教育专家，负责从提供的文本中创建全面的学习卡片。
+
+        文本：{input_text}
+
+        学习卡片创建指南：
+        1. 仔细分析文本以确定：
+           - 关键概念和定义
+           - 重要事实和数据
+           - 因果关系
+           - 顺序过程
+           - 显著的例子和应用
+
+        2. 按照以下规则创建卡片：
+           - 最少卡片数：{min_cards}
+           - 最多卡片数：{max_cards}
+           - 问题格式：{question_format}
+           - 答案长度：{answer_length}
+           - 包含{special_focus}概念
+
+        3. 结构要求：
+           - 将每张卡片格式化为"问题\\n答案"
+           - 用双换行符分隔卡片
+           - 问题应清晰具体
+           - 答案应简明但完整
+
+        4. 特别说明：
+           - {special_instructions}
+           - 在相关时确保难度递进
+           - 包含应用型问题
+           - 为关键概念创建反向卡片
+        """
+}
+
+DEFAULT_CUSTOMIZATIONS = {
+    "min_cards": 3,
+    "max_cards": 20,
+    "question_format": "concise 5-7 words",
+    "answer_length": "one sentence, 10-15 words",
+    "special_focus": "theoretical and practical",
+    "special_instructions": "prioritize clear, actionable learning outcomes"
+}
+
+registry.register('cards', CARD_PROMPTS, defaults=DEFAULT_CUSTOMIZATIONS)
@@ -1,7 +1,17 @@
 from rest_framework import serializers
-from .models import Card
+from .models import Card, Deck
 
 class CardSerializer(serializers.ModelSerializer):
     class Meta:
         model = Card
-        fields = ['id', 'question', 'answer']
\ No newline at end of file
+        fields = ['id', 'question', 'answer']
+
+class DeckSerializer(serializers.ModelSerializer):
+    source = serializers.SlugRelatedField(slug_field='text_hash', read_only=True)
+    language = serializers.CharField(source='source.language', read_only=True)
+    origin_url = serializers.CharField(source='source.origin_url', read_only=True)
+    cards = CardSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Deck
+        fields = ['id', 'source', 'language', 'origin_url', 'created_at', 'cards']
@@ -1,3 +1,128 @@
-from django.test import TestCase
+import json
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from cards.models import Deck
+from cards.views import FlashcardStreamParser, parse_flashcards
+from pfe import generation_cache, long_input, structured
+from youtube.models import Youtube
+
+class TranscriptIdTests(TestCase):
+    def test_non_integer_transcript_id_is_rejected(self):
+        response = self.client.post('/api/cards/create/', {'transcript_id': 'abc'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'transcript_id must be an integer'})
+
+    def test_unknown_transcript_id_is_not_found(self):
+        response = self.client.post('/api/cards/create/', {'transcript_id': 12345}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'Transcript not found'})
+
+
+class ParserTests(SimpleTestCase):
+    def test_parse_flashcards_counts_dropped_blocks(self):
+        before = structured.stats()
+        cards = parse_flashcards('## Flashcards\n\nQ: What is osmosis?\nA: Water movement\n\nNot a card\n\n'
+                                 '2. What is diffusion?\nSpreading of molecules')
+        self.assertEqual(cards, [
+            {'question': 'What is osmosis?', 'answer': 'Water movement'},
+            {'question': 'What is diffusion?', 'answer': 'Spreading of molecules'},
+        ])
+        after = structured.stats()
+        self.assertEqual(after['text_items'] - before.get('text_items', 0), 2)
+        self.assertEqual(after['text_dropped'] - before.get('text_dropped', 0), 2)
+
+    def test_stream_parser_matches_the_batch_parser(self):
+        content = 'Q: What is osmosis?\nA: Water movement\n\nheading\n\nWhat is diffusion?\nSpreading\n\nLast?\nYes'
+        for size in (1, 3, 7, len(content)):
+            parser, cards = FlashcardStreamParser(), []
+            for start in range(0, len(content), size):
+                cards.extend(parser.feed(content[start:start + size]))
+            cards.extend(parser.close())
+            self.assertEqual(cards, parse_flashcards(content), size)
+
+
+STREAMED_CARDS = 'What is osmosis?\nWater movement\n\nWhat is diffusion?\nSpreading of molecules\n\n'
+
+
+class CardStreamTests(TestCase):
+    def stream(self, data):
+        response = self.client.post('/api/cards/create/stream/', data, content_type='application/json')
+        return b''.join(response.streaming_content).decode()
+
+    def events(self, body):
+        return [(block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+                for block in body.strip().split('\n\n')]
+
+    def test_persisted_cards_are_grouped_in_a_deck_and_replayed(self):
+        chunks = [SimpleNamespace(text=STREAMED_CARDS[i:i + 10]) for i in range(0, len(STREAMED_CARDS), 10)]
+        data = {'input_text': 'Cell transport', 'persist': True}
+        with mock.patch('cards.views.llm.generate', return_value=chunks) as generate:
+            events = self.events(self.stream(data))
+            replayed = self.events(self.stream(data))
+
+        self.assertEqual(generate.call_count, 1)
+        deck = Deck.objects.get()
+        self.assertEqual(events[-1], ('done', {'count': 2, 'deck': deck.pk}))
+        self.assertEqual([card['id'] for _, card in events[:-1]], list(deck.cards.values_list('pk', flat=True)))
+        self.assertEqual(replayed, events)
+        cards = self.client.get(f'/api/cards/decks/{deck.pk}/').json()['cards']
+        self.assertEqual([card['question'] for card in cards], ['What is osmosis?', 'What is diffusion?'])
+
+
+TOPICS = ['osmosis', 'mitochondria', 'ribosomes', 'chlorophyll', 'enzymes', 'vacuoles',
+          'cytoplasm', 'lysosomes', 'nucleolus', 'flagella', 'centrioles', 'peroxisomes']
+
+
+def fake_cards(model_name, prompt, **kwargs):
+    # One card per prompt, about the first topic of its chunk
+    topic = next(word for word in prompt.split() if word in TOPICS)
+    return SimpleNamespace(text=json.dumps([{'question': topic, 'answer': 'A part of the cell'}]))
+
+
+@override_settings(LONG_INPUT_THRESHOLD_TOKENS=50, LONG_INPUT_CHUNK_TOKENS=30, STRUCTURED_OUTPUT=True)
+class AsyncViewTests(TestCase):
+    url = '/api/cards/create/async/'
+
+    async def post(self, data):
+        return await self.async_client.post(self.url, data, content_type='application/json')
+
+    async def test_long_transcript_is_generated_chunk_by_chunk(self):
+        text = ' '.join(f'{topic} matter to every living cell.' for topic in TOPICS)
+        transcript = await Youtube.objects.acreate(video_id='abcdefghijk', url='https://youtu.be/abcdefghijk', text=text)
+        with mock.patch('pfe.llm.agenerate', new=mock.AsyncMock(side_effect=fake_cards)) as agenerate:
+            response = await self.post({'transcript_id': transcript.pk})
+            again = await self.post({'transcript_id': transcript.pk})
+
+        chunks = long_input.chunk_text(text)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(agenerate.await_count, len(chunks))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), len(chunks))
+        deck = await Deck.objects.select_related('source').aget()
+        self.assertEqual(deck.source.transcript_id, transcript.pk)
+        self.assertEqual((again.status_code, again.json()), (200, response.json()))
+
+    async def test_transcript_id_errors_match_the_sync_view(self):
+        self.assertEqual((await self.post({'transcript_id': 'abc'})).status_code, 400)
+        self.assertEqual((await self.post({'transcript_id': 12345})).status_code, 404)
+        self.assertEqual((await self.post({})).status_code, 400)
+
+
+@override_settings(LONG_INPUT_THRESHOLD_TOKENS=50, LONG_INPUT_CHUNK_TOKENS=30, STRUCTURED_OUTPUT=True)
+class BatchTests(TestCase):
+    def setUp(self):
+        generation_cache.clear()
+
+    def test_long_items_are_generated_chunk_by_chunk(self):
+        long_text = ' '.join(f'{topic} matter to every living cell.' for topic in TOPICS)
+        with mock.patch('pfe.llm.generate', side_effect=fake_cards) as generate:
+            response = self.client.post('/api/cards/batch/', {'items': [{'input_text': long_text}]},
+                                        content_type='application/json')
+        chunks = long_input.chunk_text(long_text)
+        self.assertEqual(generate.call_count, len(chunks))
+        result = response.json()['results'][0]
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(len(result['cards']), len(chunks))
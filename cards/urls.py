@@ -3,4 +3,9 @@ from . import views
 
 urlpatterns = [
     path('create/', views.create_cards, name='create_cards'),
+    path('create/async/', views.create_cards_async, name='create_cards_async'),
+    path('create/stream/', views.create_cards_stream, name='create_cards_stream'),
+    path('batch/', views.create_cards_batch, name='create_cards_batch'),
+    path('decks/', views.list_decks, name='list_decks'),
+    path('decks/<int:deck_id>/', views.get_deck, name='get_deck'),
 ]
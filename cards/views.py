@@ -1,163 +1,61 @@
-import google.generativeai as genai
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import Card
-from .serializers import CardSerializer
-import os
-from dotenv import load_dotenv
-from typing import Dict, List
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .models import Card, Deck
+from .serializers import CardSerializer, DeckSerializer
+from sources.models import Source, filter_by_source, options_hash
+from youtube.models import Youtube
+from pfe import batching, fingerprint, generation_cache, llm, long_input, structured, tracing
+from pfe.async_utils import parse_json_body
+from pfe.language import detect_language
+from pfe.prompts import registry
+from pfe.rate_limit import RateLimited
+import json
+from typing import Dict, List, Optional, Tuple
 import re
 
-# Load environment variables
-load_dotenv()
-
-# Configure the Google Generative AI model with API key
-genai.configure(api_key=os.getenv('GEMINI_API'))
-
-def detect_language(text: str) -> str:
-    """
-    Detect the primary language of the input text.
-    Currently supports Arabic, English, and Chinese detection.
-    """
-    # Arabic character range
-    if any("\u0600" <= char <= "\u06FF" for char in text):
-        return "arabic"
-    # Chinese character range
-    elif any("\u4e00" <= char <= "\u9fff" for char in text):
-        return "chinese"
-    # Default to English for other scripts
-    return "english"
-
-def get_prompt_template(language: str, customizations: Dict = None) -> str:
-    """
-    Get the appropriate prompt template based on language and custom parameters.
-    """
-    base_prompts = {
-        "english": """
-        You are an expert educator tasked with creating comprehensive flashcards from the provided text.
-        
-        Text: {input_text}
-        
-        Guidelines for flashcard creation:
-        1. Analyze the text thoroughly to identify:
-           - Key concepts and definitions
-           - Important facts and figures
-           - Cause-and-effect relationships
-           - Sequential processes
-           - Notable examples and applications
-        
-        2. Create flashcards following these rules:
-           - Minimum cards: {min_cards}
-           - Maximum cards: {max_cards}
-           - Question format: {question_format}
-           - Answer length: {answer_length}
-           - Include {special_focus} concepts
-        
-        3. Structural requirements:
-           - Format each card as "Question\\nAnswer"
-           - Separate cards with double newlines
-           - Questions should be clear and specific
-           - Answers should be concise but complete
-        
-        4. Special instructions:
-           - {special_instructions}
-           - Ensure progressive difficulty when relevant
-           - Include application-based questions
-           - Create reverse cards for key concepts
-        
-        Example format:
-        What is the primary function of mitochondria?
-        Generates cellular energy through ATP production.
-
-        Define osmosis in simple terms.
-        Movement of water molecules across a semi-permeable membrane.
-        """,
-        
-        "arabic": """
-        أنت خبير تعليمي مكلف بإنشاء بطاقات تعليمية شاملة من النص المقدم.
-
-        النص: {input_text}
-
-        إرشادات إنشاء البطاقات التعليمية:
-        1. تحليل النص بدقة لتحديد:
-           - المفاهيم والتعريفات الرئيسية
-           - الحقائق والأرقام المهمة
-           - علاقات السبب والنتيجة
-           - العمليات المتسلسلة
-           - الأمثلة والتطبيقات البارزة
-
-        2. إنشاء البطاقات وفقاً للقواعد التالية:
-           - الحد الأدنى للبطاقات: {min_cards}
-           - الحد الأقصى للبطاقات: {max_cards}
-           - صيغة السؤال: {question_format}
-           - طول الإجابة: {answer_length}
-           - تضمين مفاهيم {special_focus}
-
-        3. المتطلبات الهيكلية:
-           - تنسيق كل بطاقة كـ "سؤال\\nجواب"
-           - فصل البطاقات بسطرين جديدين
-           - يجب أن تكون الأسئلة واضحة ومحددة
-           - يجب أن تكون الإجابات موجزة ولكن كاملة
-
-        4. تعليمات خاصة:
-           - {special_instructions}
-           - ضمان التدرج في الصعوبة عند الاقتضاء
-           - تضمين أسئلة تطبيقية
-           - إنشاء بطاقات عكسية للمفاهيم الرئيسية
-        """,
-        
-        "chinese": """
-        您是一位专业教育专家，负责从提供的文本中创建全面的学习卡片。
-
-        文本：{input_text}
-
-        学习卡片创建指南：
-        1. 仔细分析文本以确定：
-           - 关键概念和定义
-           - 重要事实和数据
-           - 因果关系
-           - 顺序过程
-           - 显著的例子和应用
-
-        2. 按照以下规则创建卡片：
-           - 最少卡片数：{min_cards}
-           - 最多卡片数：{max_cards}
-           - 问题格式：{question_format}
-           - 答案长度：{answer_length}
-           - 包含{special_focus}概念
-
-        3. 结构要求：
-           - 将每张卡片格式化为"问题\\n答案"
-           - 用双换行符分隔卡片
-           - 问题应清晰具体
-           - 答案应简明但完整
-
-        4. 特别说明：
-           - {special_instructions}
-           - 在相关时确保难度递进
-           - 包含应用型问题
-           - 为关键概念创建反向卡片
-        """
-    }
-    
-    # Get base prompt for the language
-    prompt = base_prompts.get(language, base_prompts["english"])
-    
-    # Apply customizations if provided
-    default_customizations = {
-        "min_cards": 3,
-        "max_cards": 20,
-        "question_format": "concise 5-7 words",
-        "answer_length": "one sentence, 10-15 words",
-        "special_focus": "theoretical and practical",
-        "special_instructions": "prioritize clear, actionable learning outcomes"
+MODEL_NAME = "gemini-1.5-flash"
+
+# Fields requested from the model in JSON output mode
+CARD_FIELDS = ('question', 'answer')
+
+BLOCK_SEPARATOR = re.compile(r'\n\s*\n')
+# "## Title" headings, and bold "**Label: ...**" lines that aren't questions
+MARKDOWN_HEADING = re.compile(r'^(#+\s.*|\*\*[^*?\u061f]*:[^*?\u061f]*\*\*:?)$')
+
+def parse_flashcard_block(card_raw: str) -> Optional[Dict[str, str]]:
+    """
+    Parse one blank-line-delimited block into a flashcard, or None if it isn't one.
+    """
+    # Try different splitting patterns
+    splits = card_raw.split('\n')
+    splits = [s.strip() for s in splits if s.strip()]
+
+    # Drop markdown headings such as "## Flashcards" or "**Concept: ...**"
+    splits = [s for s in splits if not MARKDOWN_HEADING.match(s)]
+
+    if len(splits) < 2:
+        return None
+
+    # Extract question and answer
+    question = splits[0]
+    answer = splits[1]
+
+    # Clean up common formatting issues
+    question = re.sub(r'^Q:\s*|^\d+\.\s*|^Question:\s*', '', question)
+    answer = re.sub(r'^A:\s*|^Answer:\s*', '', answer)
+
+    return {
+        'question': question.strip(),
+        'answer': answer.strip()
     }
-    
-    # Merge default customizations with provided ones
-    final_customizations = {**default_customizations, **(customizations or {})}
-    
-    return prompt.format(**final_customizations, input_text="{input_text}")
 
 def parse_flashcards(content: str) -> List[Dict[str, str]]:
     """
@@ -165,83 +63,474 @@ def parse_flashcards(content: str) -> List[Dict[str, str]]:
     Handles various formats and cleans the output.
     """
     # Split content into individual cards
-    cards_raw = re.split(r'\n\s*\n', content.strip())
-    
+    cards_raw = BLOCK_SEPARATOR.split(content.strip())
+
     parsed_cards = []
     for card_raw in cards_raw:
-        # Skip empty cards
-        if not card_raw.strip():
-            continue
-            
-        # Try different splitting patterns
-        splits = card_raw.split('\n')
-        splits = [s.strip() for s in splits if s.strip()]
-        
-        if len(splits) >= 2:
-            # Extract question and answer
-            question = splits[0]
-            answer = splits[1]
-            
-            # Clean up common formatting issues
-            question = re.sub(r'^Q:\s*|^\d+\.\s*|^Question:\s*', '', question)
-            answer = re.sub(r'^A:\s*|^Answer:\s*', '', answer)
-            
-            parsed_cards.append({
-                'question': question.strip(),
-                'answer': answer.strip()
-            })
-    
+        card = parse_flashcard_block(card_raw)
+        if card:
+            parsed_cards.append(card)
+
+    blocks = sum(1 for card_raw in cards_raw if card_raw.strip())
+    structured.record_text_items(len(parsed_cards), blocks - len(parsed_cards))
+    return parsed_cards
+
+class FlashcardStreamParser:
+    """
+    Incremental parser for streamed model output.
+    feed() returns the cards whose block has been closed by a blank line;
+    close() parses whatever is left once the stream ends.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, text: str) -> List[Dict[str, str]]:
+        self._buffer += text
+        blocks = BLOCK_SEPARATOR.split(self._buffer)
+        # The last block may still be growing
+        self._buffer = blocks.pop()
+        return self._parse(blocks)
+
+    def close(self) -> List[Dict[str, str]]:
+        cards = self._parse([self._buffer])
+        self._buffer = ''
+        return cards
+
+    def _parse(self, blocks: List[str]) -> List[Dict[str, str]]:
+        blocks = [block for block in blocks if block.strip()]
+        cards = [card for card in map(parse_flashcard_block, blocks) if card]
+        structured.record_text_items(len(cards), len(blocks) - len(cards))
+        return cards
+
+def get_customizations(data) -> Dict:
+    """
+    Extract the flashcard customization options from request data, dropping unset ones.
+    """
+    customizations = {
+        'min_cards': data.get('min_cards', 3),
+        'max_cards': data.get('max_cards', 20),
+        'question_format': data.get('question_format'),
+        'answer_length': data.get('answer_length'),
+        'special_focus': data.get('special_focus'),
+        'special_instructions': data.get('special_instructions')
+    }
+
+    # Remove None values
+    return {k: v for k, v in customizations.items() if v is not None}
+
+def generate_card_data(input_text: str, customizations: Dict) -> List[Dict[str, str]]:
+    """
+    Generate and parse flashcards for one prompt-sized text, without saving.
+    """
+    # Detect language and get appropriate prompt
+    with tracing.span('detect_language'):
+        language = detect_language(input_text)
+
+    # Reuse a previous generation for the same text and options
+    with tracing.span('cache'):
+        cache_key = generation_cache.make_key('cards', MODEL_NAME, language, input_text, customizations)
+        cached = generation_cache.get(cache_key)
+
+    if cached is not None:
+        parsed_cards = cached['parsed']
+    else:
+        with tracing.span('prompt'):
+            prompt = registry.build('cards', language, input_text, customizations)
+        # Generate and parse content using the AI model
+        raw_text, parsed_cards = structured.generate_items(MODEL_NAME, prompt, CARD_FIELDS, parse_flashcards)
+        if parsed_cards:
+            generation_cache.set(cache_key, raw_text, parsed_cards)
+
+    return parsed_cards
+
+async def agenerate_card_data(input_text: str, customizations: Dict) -> List[Dict[str, str]]:
+    """Async variant of generate_card_data()."""
+    with tracing.span('detect_language'):
+        language = detect_language(input_text)
+
+    with tracing.span('cache'):
+        cache_key = generation_cache.make_key('cards', MODEL_NAME, language, input_text, customizations)
+        cached = await generation_cache.aget(cache_key)
+
+    if cached is not None:
+        return cached['parsed']
+    with tracing.span('prompt'):
+        prompt = registry.build('cards', language, input_text, customizations)
+    raw_text, parsed_cards = await structured.agenerate_items(MODEL_NAME, prompt, CARD_FIELDS, parse_flashcards)
+    if parsed_cards:
+        await generation_cache.aset(cache_key, raw_text, parsed_cards)
     return parsed_cards
 
+def generate_card_data_packed(texts: List[str], language: str, customizations: Dict) -> List[Optional[List[Dict[str, str]]]]:
+    """
+    Generate flashcards for several short texts with one model call.
+    Returns the parsed cards per text, None for texts the model skipped.
+    """
+    keys = [generation_cache.make_key('cards', MODEL_NAME, language, text, customizations) for text in texts]
+    results, missing = [], []
+    for i, key in enumerate(keys):
+        cached = generation_cache.get(key)
+        results.append(cached['parsed'] if cached is not None else None)
+        if cached is None:
+            missing.append(i)
+
+    if missing:
+        prompt = (registry.build('cards', language, batching.pack_inputs([texts[i] for i in missing]), customizations)
+                  + batching.pack_instructions(len(missing)))
+        response = llm.generate(MODEL_NAME, prompt)
+        sections = batching.unpack_output(response.text, len(missing))
+        for i, section in zip(missing, sections):
+            parsed_cards = parse_flashcards(section) if section else []
+            if parsed_cards:
+                generation_cache.set(keys[i], section, parsed_cards)
+                results[i] = parsed_cards
+    return results
+
+def generate_card_items(input_text: str, customizations: Dict) -> List[Dict[str, str]]:
+    """
+    Generate and parse flashcards for a text of any length, without saving.
+    """
+    if long_input.is_long(input_text):
+        # Long inputs are generated chunk by chunk in parallel, then merged
+        return long_input.map_reduce(input_text, lambda chunk: generate_card_data(chunk, customizations))
+    return generate_card_data(input_text, customizations)
+
+def generate_cards(input_text: str, customizations: Dict = None, source: Optional[Source] = None) -> List[Card]:
+    """
+    Generate flashcards for the input text and save them, linked to source.
+    Shared by the HTTP view and the background job handler.
+    """
+    parsed_cards = generate_card_items(input_text, customizations or {})
+
+    # Save all cards in a single bulk insert, merging near-duplicates
+    with tracing.span('db_write'):
+        return fingerprint.save_unique(
+            Card(question=card_data['question'], answer=card_data['answer'], source=source)
+            for card_data in parsed_cards
+        )
+
+def deck_queryset():
+    """Decks with their source, and their cards in one prefetch query."""
+    return Deck.objects.select_related('source').prefetch_related(
+        Prefetch('cards', queryset=Card.objects.order_by('pk'))
+    )
+
+def save_deck(source: Source, key: str, cards: List[Card]) -> Tuple[Deck, List[Card]]:
+    """
+    Group freshly saved cards into the deck for source and options. If a
+    concurrent request stored that deck first, it is returned with its cards.
+    """
+    with transaction.atomic():
+        deck, created = Deck.objects.get_or_create(source=source, options_hash=key)
+        if created:
+            deck.cards.set(cards)
+            return deck, cards
+    return deck, list(deck.cards.order_by('pk'))
+
+def generate_deck(input_text: str, customizations: Dict, source: Source) -> Tuple[Optional[Deck], List[Card], bool]:
+    """
+    Return (deck, cards, generated) for the source and options, reusing the
+    stored deck when there is one. Empty generations aren't kept as a deck
+    (deck is None), so the next submission tries again.
+    """
+    key = options_hash(customizations)
+    with tracing.span('source'):
+        deck = deck_queryset().filter(source=source, options_hash=key).first()
+    if deck is not None:
+        return deck, list(deck.cards.all()), False
+
+    cards = generate_cards(input_text, customizations, source)
+    if not cards:
+        return None, cards, True
+    with tracing.span('db_write'):
+        deck, cards = save_deck(source, key, cards)
+    return deck, cards, True
+
+def _deck_headers(deck: Optional[Deck]) -> Dict[str, str]:
+    return {'X-Deck-Id': str(deck.pk)} if deck is not None else {}
+
 @api_view(['POST'])
 def create_cards(request):
     """
     Create flashcards from input text with advanced customization options.
+    A stored transcript can be used instead by passing transcript_id.
+    The cards are grouped in a deck whose id is sent in the X-Deck-Id header;
+    submitting the same text and options again returns that deck (status 200)
+    without calling the model.
     """
-    input_text = request.data.get('input_text')
+    try:
+        input_text = long_input.resolve_input_text(request.data)
+    except Youtube.DoesNotExist:
+        return Response({'error': 'Transcript not found'}, status=404)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
     if not input_text:
         return Response({'error': 'Input text is required'}, status=400)
 
     try:
         # Get customization parameters from request
-        customizations = {
-            'min_cards': request.data.get('min_cards', 3),
-            'max_cards': request.data.get('max_cards', 20),
-            'question_format': request.data.get('question_format'),
-            'answer_length': request.data.get('answer_length'),
-            'special_focus': request.data.get('special_focus'),
-            'special_instructions': request.data.get('special_instructions')
-        }
-        
-        # Remove None values
-        customizations = {k: v for k, v in customizations.items() if v is not None}
-
-        # Detect language and get appropriate prompt
-        language = detect_language(input_text)
-        prompt_template = get_prompt_template(language, customizations)
-        
-        # Generate content using the AI model
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt_template.format(input_text=input_text))
-        
-        # Parse the generated content
-        parsed_cards = parse_flashcards(response.text)
-        
-        # Save cards to database
-        saved_cards = []
-        for card_data in parsed_cards:
-            card = Card.objects.create(
-                question=card_data['question'],
-                answer=card_data['answer']
-            )
-            saved_cards.append(card)
+        customizations = get_customizations(request.data)
+
+        with tracing.span('source'):
+            source = Source.objects.for_request(request.data, input_text)
+
+        # Reuse the deck of an earlier submission, or generate, parse and save the cards
+        deck, saved_cards, generated = generate_deck(input_text, customizations, source)
 
         # Serialize and return the response
-        serializer = CardSerializer(saved_cards, many=True)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        with tracing.span('serialize'):
+            data = CardSerializer(saved_cards, many=True).data
+        return Response(data, status=status.HTTP_201_CREATED if generated else status.HTTP_200_OK,
+                        headers=_deck_headers(deck))
+
+    except RateLimited as e:
+        return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={'Retry-After': str(e.retry_after)})
+
+    except Exception as e:
+        return Response({
+            'error': str(e),
+            'error_type': type(e).__name__
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+def create_cards_batch(request):
+    """
+    Create flashcards for many texts in one request.
+    Body: {"items": [{"input_text": ..., <customization options>}, ...], "pack": bool}
+    With "pack", small items sharing a language and options are sent to the
+    model together. All cards are saved in one transaction and the response
+    has one result per item, in input order.
+    """
+    items = request.data.get('items')
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'items must be a non-empty list'}, status=400)
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        return Response({'error': f'At most {settings.BATCH_MAX_ITEMS} items are allowed'}, status=400)
+
+    try:
+        results = [None] * len(items)
+        prepared = []
+        for index, item in enumerate(items):
+            input_text = item.get('input_text') if isinstance(item, dict) else None
+            if not input_text:
+                results[index] = {'index': index, 'status': 'error', 'error': 'Input text is required'}
+                continue
+            prepared.append({
+                'index': index,
+                'input_text': input_text,
+                'customizations': get_customizations(item),
+                'language': detect_language(input_text),
+            })
+
+        generated = batching.run_batch(
+            prepared,
+            generate_one=lambda item: generate_card_items(item['input_text'], item['customizations']),
+            generate_pack=lambda pack: generate_card_data_packed(
+                [item['input_text'] for item in pack], pack[0]['language'], pack[0]['customizations']
+            ),
+            group_key=lambda item: (item['language'], json.dumps(item['customizations'], sort_keys=True, default=str)),
+            pack=bool(request.data.get('pack', False)),
+        )
+
+        # Save the cards of every item in a single bulk insert
+        cards_per_item = fingerprint.save_unique_groups([
+            [Card(question=card_data['question'], answer=card_data['answer']) for card_data in outcome.get('items', [])]
+            for outcome in generated
+        ])
+
+        for item, outcome, cards in zip(prepared, generated, cards_per_item):
+            if 'error' in outcome:
+                results[item['index']] = {'index': item['index'], 'status': 'error', **outcome}
+            else:
+                results[item['index']] = {
+                    'index': item['index'],
+                    'status': 'ok',
+                    'cards': CardSerializer(cards, many=True).data,
+                }
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
 
     except Exception as e:
         return Response({
             'error': str(e),
             'error_type': type(e).__name__
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _sse(event: str, data) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _stream_cards(input_text: str, customizations: Dict, persist: bool, source: Optional[Source] = None):
+    """
+    Generate flashcards with Gemini's streaming API and yield each one as an
+    SSE event as soon as its block is complete. With persist, each card is
+    saved as it arrives and the cards are grouped in the deck for the source
+    and options; a deck stored before is replayed without calling the model.
+    """
+    count = 0
+    try:
+        key = options_hash(customizations)
+        deck = deck_queryset().filter(source=source, options_hash=key).first() if persist else None
+        if deck is not None:
+            for card in deck.cards.all():
+                count += 1
+                yield _sse('card', CardSerializer(card).data)
+            yield _sse('done', {'count': count, 'deck': deck.pk})
+            return
+
+        language = detect_language(input_text)
+        cache_key = generation_cache.make_key('cards', MODEL_NAME, language, input_text, customizations)
+        cached = generation_cache.get(cache_key)
+
+        if cached is not None:
+            batches = [cached['parsed']]
+            raw_chunks = None
+        else:
+            response = llm.generate(MODEL_NAME, registry.build('cards', language, input_text, customizations), stream=True)
+            raw_chunks = []
+            batches = _parse_stream(response, raw_chunks)
+
+        parsed_cards, saved = [], []
+        for batch in batches:
+            for card_data in batch:
+                parsed_cards.append(card_data)
+                if persist:
+                    rows = fingerprint.save_unique([
+                        Card(question=card_data['question'], answer=card_data['answer'], source=source)
+                    ])
+                    if not rows:
+                        continue
+                    saved.extend(rows)
+                    card_data = CardSerializer(rows[0]).data
+                count += 1
+                yield _sse('card', card_data)
+
+        if raw_chunks is not None and parsed_cards:
+            generation_cache.set(cache_key, ''.join(raw_chunks), parsed_cards)
+
+        done = {'count': count}
+        if saved:
+            deck, _ = save_deck(source, key, saved)
+            done['deck'] = deck.pk
+        yield _sse('done', done)
+
+    except Exception as e:
+        yield _sse('error', {'error': str(e), 'error_type': type(e).__name__, 'count': count})
+
+def _parse_stream(response, raw_chunks: List[str]):
+    # Feed streamed chunks to the incremental parser, keeping the raw text for the cache
+    parser = FlashcardStreamParser()
+    for chunk in response:
+        raw_chunks.append(chunk.text)
+        yield parser.feed(chunk.text)
+    yield parser.close()
+
+@api_view(['POST'])
+def create_cards_stream(request):
+    """
+    Stream flashcards as Server-Sent Events while the model is still generating.
+    Emits one "card" event per card, then "done" (or "error").
+    Pass "persist": true to save each card as it arrives; the events then
+    carry the saved card including its id, the cards are grouped in a deck
+    whose id is in the "done" event, and a text whose deck is already
+    stored is replayed from it.
+    """
+    input_text = request.data.get('input_text')
+    if not input_text:
+        return Response({'error': 'Input text is required'}, status=400)
+
+    persist = bool(request.data.get('persist', False))
+    source = Source.objects.for_request(request.data, input_text) if persist else None
+    response = StreamingHttpResponse(
+        _stream_cards(input_text, get_customizations(request.data), persist, source),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@csrf_exempt
+@require_POST
+async def create_cards_async(request):
+    """
+    Async variant of create_cards for ASGI deployments, taking the same
+    body (input_text or transcript_id, and the options). The model calls
+    are awaited instead of holding a worker thread.
+    """
+    data = parse_json_body(request)
+    if data is None:
+        return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+
+    try:
+        input_text = await long_input.aresolve_input_text(data)
+    except Youtube.DoesNotExist:
+        return JsonResponse({'error': 'Transcript not found'}, status=404)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not input_text:
+        return JsonResponse({'error': 'Input text is required'}, status=400)
+
+    try:
+        customizations = get_customizations(data)
+
+        with tracing.span('source'):
+            source = await Source.objects.afor_request(data, input_text)
+            key = options_hash(customizations)
+            deck = await deck_queryset().filter(source=source, options_hash=key).afirst()
+        if deck is not None:
+            with tracing.span('serialize'):
+                data = CardSerializer(deck.cards.all(), many=True).data
+            return JsonResponse(data, status=status.HTTP_200_OK, safe=False, headers=_deck_headers(deck))
+
+        if long_input.is_long(input_text):
+            # Long inputs are generated chunk by chunk concurrently, then merged
+            parsed_cards = await long_input.amap_reduce(
+                input_text, lambda chunk: agenerate_card_data(chunk, customizations)
+            )
+        else:
+            parsed_cards = await agenerate_card_data(input_text, customizations)
+
+        with tracing.span('db_write'):
+            saved_cards = await fingerprint.asave_unique(
+                Card(question=card_data['question'], answer=card_data['answer'], source=source)
+                for card_data in parsed_cards
+            )
+            if saved_cards:
+                deck, saved_cards = await sync_to_async(save_deck)(source, key, saved_cards)
+
+        with tracing.span('serialize'):
+            data = CardSerializer(saved_cards, many=True).data
+        return JsonResponse(data, status=status.HTTP_201_CREATED, safe=False, headers=_deck_headers(deck))
+
+    except RateLimited as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                            headers={'Retry-After': str(e.retry_after)})
+
+    except Exception as e:
+        return JsonResponse({
+            'error': str(e),
+            'error_type': type(e).__name__
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+def list_decks(request):
+    """
+    List the decks generated from one text, newest first, with their cards.
+    Query parameters: source (the text hash) or transcript_id.
+    """
+    try:
+        decks = filter_by_source(deck_queryset(), request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    decks = decks.order_by('-created_at', '-pk')
+    return Response(DeckSerializer(decks, many=True).data)
+
+@api_view(['GET'])
+def get_deck(request, deck_id):
+    """Return a deck and all of its cards."""
+    deck = deck_queryset().filter(pk=deck_id).first()
+    if deck is None:
+        return Response({'error': 'Deck not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(DeckSerializer(deck).data)
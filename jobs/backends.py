@@ -0,0 +1,107 @@
+"""
+Job queue backends.
+
+The backend is chosen with the JOBS_BACKEND setting (a dotted path). The
+default DatabaseBackend stores jobs in the Job table, so no external broker
+is needed; another backend only has to implement BaseBackend.
+"""
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+
+class BaseBackend:
+    def enqueue(self, kind: str, payload: dict, priority: int = 0, max_attempts: int = 3) -> Job:
+        raise NotImplementedError
+
+    def get(self, job_id: int) -> Optional[Job]:
+        raise NotImplementedError
+
+    def claim(self, kinds: Iterable[str]) -> Optional[Job]:
+        """Mark the next runnable job of one of the given kinds as running and return it."""
+        raise NotImplementedError
+
+    def complete(self, job: Job, result) -> None:
+        raise NotImplementedError
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> None:
+        """Record a failed attempt, rescheduling the job with backoff if it has attempts left."""
+        raise NotImplementedError
+
+
+class DatabaseBackend(BaseBackend):
+    # Number of candidates to try when another worker wins the race for a job
+    claim_batch = 10
+
+    def enqueue(self, kind, payload, priority=0, max_attempts=3):
+        return Job.objects.create(kind=kind, payload=payload, priority=priority, max_attempts=max_attempts)
+
+    def get(self, job_id):
+        return Job.objects.filter(pk=job_id).first()
+
+    def claim(self, kinds):
+        kinds = list(kinds)
+        if not kinds:
+            return None
+        now = timezone.now()
+        candidates = (Job.objects
+                      .filter(status=Job.QUEUED, kind__in=kinds, run_after__lte=now)
+                      .order_by('-priority', 'run_after', 'id')
+                      .values_list('id', flat=True)[:self.claim_batch])
+        for job_id in candidates:
+            # Conditional update: only one worker can move a job out of 'queued'
+            claimed = (Job.objects
+                       .filter(pk=job_id, status=Job.QUEUED)
+                       .update(status=Job.RUNNING, attempts=F('attempts') + 1, started_at=now))
+            if claimed:
+                return Job.objects.get(pk=job_id)
+        return None
+
+    def complete(self, job, result):
+        job.status = Job.SUCCEEDED
+        job.result = result
+        job.error = ''
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+
+    def fail(self, job, error, retry=True):
+        job.error = error
+        if retry and job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+            job.save(update_fields=['status', 'error', 'run_after'])
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+
+    def requeue_stale(self, older_than: timedelta, exclude: Iterable[int] = ()) -> int:
+        """Put back jobs left 'running' by a worker that died, except the excluded ids."""
+        cutoff = timezone.now() - older_than
+        return (Job.objects
+                .filter(status=Job.RUNNING, started_at__lt=cutoff)
+                .exclude(pk__in=list(exclude))
+                .update(status=Job.QUEUED, run_after=timezone.now()))
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff: JOBS_RETRY_BASE_DELAY * 2 ** (attempts - 1), capped."""
+    base = getattr(settings, 'JOBS_RETRY_BASE_DELAY', 5)
+    cap = getattr(settings, 'JOBS_RETRY_MAX_DELAY', 300)
+    return min(cap, base * 2 ** max(0, attempts - 1))
+
+
+_backend = None
+
+
+def get_backend() -> BaseBackend:
+    global _backend
+    if _backend is None:
+        _backend = import_string(getattr(settings, 'JOBS_BACKEND', 'jobs.backends.DatabaseBackend'))()
+    return _backend
@@ -0,0 +1,71 @@
+"""
+Job handlers: one function per job kind, taking the job payload and
+returning a JSON-serializable result.
+"""
+from cards.serializers import CardSerializer
+from cards.views import generate_deck, get_customizations
+from mermiad.serializers import DiagramSerializer
+from mermiad.views import generate_diagram
+from quiz.serializers import QuizSerializer
+from quiz.views import generate_quiz_set
+from pfe.long_input import resolve_input_text
+from sources.models import Source
+from youtube.models import Youtube
+from youtube.serializers import YoutubeSerializer
+from youtube.views import save_captions
+
+
+class PermanentJobError(Exception):
+    """A failure that retrying can't fix (e.g. a missing input); the job fails immediately."""
+
+
+def _require(payload, key):
+    value = payload.get(key)
+    if not value:
+        raise PermanentJobError(f'{key} is required')
+    return value
+
+
+def _input_text(payload):
+    # input_text, or the text of a stored transcript given by transcript_id
+    try:
+        input_text = resolve_input_text(payload)
+    except Youtube.DoesNotExist:
+        raise PermanentJobError('Transcript not found')
+    except ValueError as e:
+        raise PermanentJobError(str(e))
+    if not input_text:
+        raise PermanentJobError('input_text or transcript_id is required')
+    return input_text
+
+
+def run_cards(payload):
+    text = _input_text(payload)
+    _, cards, _ = generate_deck(text, get_customizations(payload), Source.objects.for_request(payload, text))
+    return CardSerializer(cards, many=True).data
+
+
+def run_quiz(payload):
+    text = _input_text(payload)
+    _, quizzes, _ = generate_quiz_set(text, Source.objects.for_request(payload, text))
+    if not quizzes:
+        raise ValueError('No valid questions were generated')
+    return QuizSerializer(quizzes, many=True).data
+
+
+def run_diagram(payload):
+    text = _require(payload, 'input_text')
+    diagram, mermaid_code = generate_diagram(text, Source.objects.for_request(payload, text))
+    return {'diagram': DiagramSerializer(diagram).data, 'mermaid_code': mermaid_code}
+
+
+def run_captions(payload):
+    return YoutubeSerializer(save_captions(_require(payload, 'url'))).data
+
+
+HANDLERS = {
+    'cards': run_cards,
+    'quiz': run_quiz,
+    'diagram': run_diagram,
+    'captions': run_captions,
+}
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from jobs.backends import get_backend
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run a worker pool that executes queued generation jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when no job is available.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        worker = Worker(poll_interval=options['poll_interval'], backend=get_backend())
+        self.stdout.write(f'Worker started with limits {worker.limits}')
+        try:
+            worker.run(burst=options['burst'])
+        except KeyboardInterrupt:
+            worker.stop()
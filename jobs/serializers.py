@@ -0,0 +1,14 @@
+from rest_framework import serializers
+from .models import Job
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'priority', 'attempts', 'max_attempts',
+                  'result', 'error', 'created_at', 'started_at', 'finished_at']
+
+class JobCreateSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=Job.KIND_CHOICES)
+    payload = serializers.DictField()
+    priority = serializers.IntegerField(default=0)
+    max_attempts = serializers.IntegerField(default=3, min_value=1)
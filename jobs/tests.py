@@ -0,0 +1,147 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from jobs.backends import DatabaseBackend, retry_delay
+from jobs.handlers import PermanentJobError
+from jobs.models import Job
+from jobs.worker import Worker
+
+
+class DatabaseBackendTests(TestCase):
+    backend = DatabaseBackend()
+
+    def test_claim_takes_the_highest_priority_runnable_job(self):
+        low = self.backend.enqueue('cards', {}, priority=0)
+        high = self.backend.enqueue('cards', {}, priority=5)
+        later = self.backend.enqueue('cards', {}, priority=9)
+        Job.objects.filter(pk=later.pk).update(run_after=timezone.now() + timedelta(minutes=5))
+        self.backend.enqueue('diagram', {}, priority=9)
+
+        job = self.backend.claim(['cards'])
+        self.assertEqual(job.pk, high.pk)
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+        self.assertIsNotNone(job.started_at)
+        self.assertEqual(self.backend.claim(['cards']).pk, low.pk)
+        self.assertIsNone(self.backend.claim(['cards']))
+        self.assertIsNone(self.backend.claim([]))
+
+    def test_a_claimed_job_cannot_be_claimed_again(self):
+        job = self.backend.enqueue('quiz', {})
+        self.assertEqual(self.backend.claim(['quiz']).pk, job.pk)
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(self.backend.claim(['quiz']))
+
+    @override_settings(JOBS_RETRY_BASE_DELAY=5, JOBS_RETRY_MAX_DELAY=300)
+    def test_failed_attempts_are_retried_with_backoff_then_fail(self):
+        self.backend.enqueue('cards', {}, max_attempts=2)
+        job = self.backend.claim(['cards'])
+        self.backend.fail(job, 'boom')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=4))
+        self.assertIsNone(self.backend.claim(['cards']))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = self.backend.claim(['cards'])
+        self.backend.fail(job, 'boom again')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (Job.FAILED, 2, 'boom again'))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_permanent_failure_is_not_retried(self):
+        self.backend.enqueue('cards', {})
+        job = self.backend.claim(['cards'])
+        self.backend.fail(job, 'bad payload', retry=False)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_stale_running_jobs_are_requeued(self):
+        stale = self.backend.enqueue('captions', {})
+        fresh = self.backend.enqueue('captions', {})
+        self.backend.claim(['captions'])
+        self.backend.claim(['captions'])
+        Job.objects.filter(pk=stale.pk).update(started_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(self.backend.requeue_stale(timedelta(minutes=10)), 1)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, Job.RUNNING)
+
+    def test_excluded_stale_jobs_are_left_running(self):
+        job = self.backend.enqueue('captions', {})
+        self.backend.claim(['captions'])
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(self.backend.requeue_stale(timedelta(minutes=10), exclude=[job.pk]), 0)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.RUNNING)
+
+    @override_settings(JOBS_RETRY_BASE_DELAY=5, JOBS_RETRY_MAX_DELAY=30)
+    def test_retry_delay(self):
+        self.assertEqual([retry_delay(attempts) for attempts in (1, 2, 3, 4, 5)], [5, 10, 20, 30, 30])
+
+
+class WorkerTests(SimpleTestCase):
+    def make_worker(self, handler):
+        backend = mock.Mock()
+        with mock.patch.dict('jobs.worker.HANDLERS', {'cards': handler}, clear=True):
+            worker = Worker({'cards': 1, 'diagram': 2}, backend=backend)
+        return worker, backend
+
+    def test_only_kinds_with_a_handler_and_a_free_slot_are_claimed(self):
+        worker, _ = self.make_worker(lambda payload: None)
+        self.assertEqual(worker.available_kinds(), ['cards'])
+        worker._active['cards'] = 1
+        self.assertEqual(worker.available_kinds(), [])
+
+    def test_outcomes_are_reported_to_the_backend(self):
+        job = SimpleNamespace(pk=1, kind='cards', payload={}, attempts=1)
+        for handler, expected in (
+            (lambda payload: {'ok': True}, mock.call.complete(job, {'ok': True})),
+            (mock.Mock(side_effect=PermanentJobError('bad')), mock.call.fail(job, 'bad', retry=False)),
+            (mock.Mock(side_effect=RuntimeError('flaky')), mock.call.fail(job, 'RuntimeError: flaky')),
+        ):
+            worker, backend = self.make_worker(handler)
+            worker._active['cards'] = 1
+            with mock.patch.dict('jobs.worker.HANDLERS', {'cards': handler}), \
+                    mock.patch('jobs.worker.close_old_connections'), mock.patch('jobs.worker.logger'):
+                worker._execute(job)
+            self.assertEqual(backend.mock_calls, [expected])
+            self.assertEqual(worker._active['cards'], 0)
+            worker._executor.shutdown()
+
+    def run_polls(self, polls, **overrides):
+        worker, backend = self.make_worker(lambda payload: None)
+        worker.poll_interval = 0
+        backend.requeue_stale.return_value = 0
+
+        def claim(kinds):
+            polls_left[0] -= 1
+            if not polls_left[0]:
+                worker.stop()
+            return None
+
+        polls_left = [polls]
+        backend.claim.side_effect = claim
+        with override_settings(JOBS_STALE_AFTER=60, **overrides):
+            worker.run()
+        return backend
+
+    def test_stale_jobs_are_requeued_periodically_while_running(self):
+        backend = self.run_polls(3, JOBS_REQUEUE_INTERVAL=0)
+        self.assertEqual(backend.requeue_stale.call_count, 3)
+        backend.requeue_stale.assert_called_with(timedelta(seconds=60), exclude=[])
+
+        backend = self.run_polls(3, JOBS_REQUEUE_INTERVAL=3600)
+        self.assertEqual(backend.requeue_stale.call_count, 1)
+
+    def test_jobs_this_worker_is_running_are_not_requeued(self):
+        worker, backend = self.make_worker(lambda payload: None)
+        backend.requeue_stale.return_value = 0
+        worker._running.add(7)
+        with override_settings(JOBS_STALE_AFTER=60):
+            worker.requeue_stale()
+        backend.requeue_stale.assert_called_once_with(timedelta(seconds=60), exclude=[7])
+        worker._executor.shutdown()
@@ -0,0 +1,29 @@
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from .backends import get_backend
+from .serializers import JobCreateSerializer, JobSerializer
+
+
+@api_view(['POST'])
+def create_job(request):
+    """
+    Enqueue a generation job and return its id immediately.
+    Body: {"kind": "cards" | "quiz" | "diagram" | "captions", "payload": {...}, "priority": int}
+    The payload holds the same fields the matching synchronous endpoint takes.
+    """
+    serializer = JobCreateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    job = get_backend().enqueue(**serializer.validated_data)
+    return Response({'id': job.pk, 'status': job.status}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def get_job(request, job_id):
+    """Return the status of a job, and its result once it has succeeded."""
+    job = get_backend().get(job_id)
+    if job is None:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(JobSerializer(job).data)
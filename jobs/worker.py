@@ -0,0 +1,104 @@
+"""
+Worker pool that executes queued jobs.
+
+Each job kind has its own concurrency limit (JOBS_CONCURRENCY); the worker
+only claims jobs of kinds that still have a free slot, so a burst of slow
+diagram jobs can't starve caption fetches. Every JOBS_REQUEUE_INTERVAL
+seconds the worker also puts back jobs left running for longer than
+JOBS_STALE_AFTER by a worker that died.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .backends import get_backend
+from .handlers import HANDLERS, PermanentJobError
+
+logger = logging.getLogger(__name__)
+
+class Worker:
+    def __init__(self, concurrency: Optional[Dict[str, int]] = None, poll_interval: float = 1.0, backend=None):
+        limits = concurrency or settings.JOBS_CONCURRENCY
+        self.limits = {kind: limit for kind, limit in limits.items() if kind in HANDLERS and limit > 0}
+        self.poll_interval = poll_interval
+        self.backend = backend or get_backend()
+        self._active = {kind: 0 for kind in self.limits}
+        self._running = set()
+        self._last_requeue = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=sum(self.limits.values()) or 1,
+                                            thread_name_prefix='job-worker')
+
+    def available_kinds(self):
+        with self._lock:
+            return [kind for kind, limit in self.limits.items() if self._active[kind] < limit]
+
+    def idle(self) -> bool:
+        with self._lock:
+            return not any(self._active.values())
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def requeue_stale(self) -> int:
+        """Requeue stale jobs, skipping the ones this worker is still running."""
+        self._last_requeue = time.monotonic()
+        if not hasattr(self.backend, 'requeue_stale'):
+            return 0
+        with self._lock:
+            running = list(self._running)
+        stale = self.backend.requeue_stale(timedelta(seconds=settings.JOBS_STALE_AFTER), exclude=running)
+        if stale:
+            logger.warning('Requeued %s stale job(s)', stale)
+        return stale
+
+    def _requeue_due(self) -> bool:
+        return (self._last_requeue is None
+                or time.monotonic() - self._last_requeue >= settings.JOBS_REQUEUE_INTERVAL)
+
+    def run(self, burst: bool = False) -> None:
+        """
+        Claim and execute jobs until stop() is called. With burst=True, return
+        once the queue is empty and all running jobs have finished.
+        """
+        try:
+            while not self._stop.is_set():
+                if self._requeue_due():
+                    self.requeue_stale()
+                kinds = self.available_kinds()
+                job = self.backend.claim(kinds) if kinds else None
+                if job is not None:
+                    with self._lock:
+                        self._active[job.kind] += 1
+                        self._running.add(job.pk)
+                    self._executor.submit(self._execute, job)
+                    continue
+                if burst and kinds and self.idle():
+                    break
+                self._stop.wait(self.poll_interval)
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _execute(self, job) -> None:
+        close_old_connections()
+        try:
+            result = HANDLERS[job.kind](job.payload)
+        except PermanentJobError as e:
+            self.backend.fail(job, str(e), retry=False)
+        except Exception as e:
+            logger.warning('Job %s failed on attempt %s: %s', job.pk, job.attempts, e)
+            self.backend.fail(job, f'{type(e).__name__}: {e}')
+        else:
+            self.backend.complete(job, result)
+        finally:
+            with self._lock:
+                self._active[job.kind] -= 1
+                self._running.discard(job.pk)
+            close_old_connections()
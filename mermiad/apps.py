@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MermiadConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mermiad'
+
+    def ready(self):
+        # Register the diagram prompt templates once at startup
+        from . import prompts  # noqa: F401
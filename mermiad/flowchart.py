@@ -0,0 +1,507 @@
+"""
+Parser for the Mermaid flowchart subset the diagram prompts ask for.
+
+parse() reads the model output in a single left-to-right pass: every
+character is looked at a bounded number of times and no regex is involved,
+so the run time is linear in the size of the diagram. It builds a Flowchart
+(nodes, edges, subgraphs, click directives and style statements) and
+rejects diagrams that are not well formed: missing header, unbalanced
+subgraphs, unterminated labels, dangling edges, or click/style/class
+statements naming unknown nodes.
+
+Flowchart.to_mermaid() re-emits the diagram in canonical form: one
+statement per line, indented per subgraph, edge chains and "&" groups
+expanded into single edges, and each node's shape written once, at its
+first use.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+HEADERS = ('graph', 'flowchart')
+DIRECTIONS = ('TB', 'TD', 'BT', 'RL', 'LR')
+DEFAULT_DIRECTION = 'TD'
+
+# Node shape openers, longest first, with the closers each one accepts
+SHAPES = (
+    ('(((', (')))',)),
+    ('((', ('))',)),
+    ('([', ('])',)),
+    ('[[', (']]',)),
+    ('[(', (')]',)),
+    ('[/', ('/]', '\\]')),
+    ('[\\', ('\\]', '/]')),
+    ('{{', ('}}',)),
+    ('(', (')',)),
+    ('[', (']',)),
+    ('{', ('}',)),
+    ('>', (']',)),
+)
+
+# Statements kept verbatim, after checking the node ids they name
+STYLE_KEYWORDS = ('style', 'class', 'classDef', 'linkStyle')
+RESERVED_IDS = ('end', 'subgraph', 'graph', 'flowchart')
+# Characters that force a label to be quoted on output
+LABEL_SPECIAL = frozenset('[](){}<>|"')
+
+
+class MermaidSyntaxError(ValueError):
+    def __init__(self, message: str, line: Optional[int] = None):
+        self.line = line
+        super().__init__(f'{message} (line {line})' if line else message)
+
+
+@dataclass
+class Node:
+    id: str
+    text: Optional[str] = None
+    shape: Optional[Tuple[str, str]] = None
+    classes: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Edge:
+    source: str
+    target: str
+    style: str = 'solid'  # solid, dotted or thick
+    tip: str = '>'  # '>', 'o', 'x' or '' for an open link
+    length: int = 1
+    bidirectional: bool = False
+    label: Optional[str] = None
+
+    @property
+    def operator(self) -> str:
+        if self.style == 'dotted':
+            body = '-' + '.' * self.length + '-'
+        else:
+            char = '=' if self.style == 'thick' else '-'
+            body = char * (self.length + (1 if self.tip else 2))
+        return ('<' if self.bidirectional else '') + body + self.tip
+
+
+@dataclass
+class Subgraph:
+    id: Optional[str]
+    title: Optional[str]
+    line: int
+    direction: Optional[str] = None
+    statements: List['Statement'] = field(default_factory=list)
+
+
+# ('node', id) | ('edge', Edge) | ('raw', text) | Subgraph
+Statement = Union[Tuple[str, object], Subgraph]
+
+
+@dataclass
+class Flowchart:
+    keyword: str = 'graph'
+    direction: str = DEFAULT_DIRECTION
+    nodes: Dict[str, Node] = field(default_factory=dict)
+    edges: List[Edge] = field(default_factory=list)
+    subgraphs: List[Subgraph] = field(default_factory=list)
+    clicks: List[str] = field(default_factory=list)
+    statements: List[Statement] = field(default_factory=list)
+
+    def to_mermaid(self) -> str:
+        lines = [f'{self.keyword} {self.direction}']
+        emitted = set()
+
+        def ref(node_id: str) -> str:
+            node = self.nodes.get(node_id)
+            if node is None or node_id in emitted:
+                return node_id
+            emitted.add(node_id)
+            out = node_id
+            if node.shape:
+                out += node.shape[0] + _format_label(node.text) + node.shape[1]
+            if node.classes:
+                out += ':::' + node.classes[-1]
+            return out
+
+        def emit(statements: List[Statement], depth: int) -> None:
+            indent = '    ' * depth
+            for statement in statements:
+                if isinstance(statement, Subgraph):
+                    header = 'subgraph'
+                    if statement.id:
+                        header += f' {statement.id}'
+                        if statement.title is not None:
+                            header += f' [{_format_label(statement.title)}]'
+                    elif statement.title:
+                        header += f' {statement.title}'
+                    lines.append(indent + header)
+                    if statement.direction:
+                        lines.append(indent + f'    direction {statement.direction}')
+                    emit(statement.statements, depth + 1)
+                    lines.append(indent + 'end')
+                    continue
+                kind, value = statement
+                if kind == 'node':
+                    lines.append(indent + ref(value))
+                elif kind == 'edge':
+                    label = f'|{_format_label(value.label)}|' if value.label is not None else ''
+                    lines.append(indent + f'{ref(value.source)} {value.operator}{label} {ref(value.target)}')
+                else:
+                    lines.append(indent + value)
+
+        emit(self.statements, 1)
+        return '\n'.join(lines)
+
+
+def _format_label(text: Optional[str]) -> str:
+    text = text or ''
+    if any(char in LABEL_SPECIAL for char in text):
+        return '"' + text.replace('"', '#quot;') + '"'
+    return text
+
+
+def _is_id_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.lines = text.splitlines()
+        self.chart = Flowchart()
+        self.stack: List[Subgraph] = []
+        self.checked_refs: List[Tuple[str, int]] = []
+        self.line = ''
+        self.lineno = 0
+
+    def error(self, message: str):
+        raise MermaidSyntaxError(message, self.lineno)
+
+    @property
+    def target(self) -> List[Statement]:
+        return self.stack[-1].statements if self.stack else self.chart.statements
+
+    # Scanning helpers; all take and return an index into self.line
+
+    def skip_spaces(self, i: int) -> int:
+        line = self.line
+        while i < len(line) and line[i] in ' \t':
+            i += 1
+        return i
+
+    def scan_word(self, i: int) -> int:
+        line = self.line
+        while i < len(line) and _is_id_char(line[i]):
+            i += 1
+        return i
+
+    def scan_run(self, i: int, char: str) -> int:
+        line = self.line
+        while i < len(line) and line[i] == char:
+            i += 1
+        return i
+
+    def at_statement_end(self, i: int) -> bool:
+        return i >= len(self.line) or self.line[i] == ';'
+
+    def rest_of_statement(self, i: int) -> Tuple[str, int]:
+        end = self.line.find(';', i)
+        if end == -1:
+            end = len(self.line)
+        return self.line[i:end].strip(), end
+
+    # Grammar
+
+    def parse(self) -> Flowchart:
+        start = self.parse_header()
+        for self.lineno in range(start + 1, len(self.lines) + 1):
+            self.line = self.lines[self.lineno - 1]
+            stripped = self.line.strip()
+            if stripped.startswith('```'):
+                break
+            self.parse_line(0)
+
+        if self.stack:
+            self.lineno = self.stack[-1].line
+            self.error('Unclosed subgraph')
+        if not self.chart.edges:
+            raise MermaidSyntaxError('Missing or invalid connections definition')
+        known = set(self.chart.nodes).union(s.id for s in self.chart.subgraphs)
+        for node_id, lineno in self.checked_refs:
+            if node_id not in known:
+                raise MermaidSyntaxError(f'Unknown node {node_id!r}', lineno)
+        return self.chart
+
+    def parse_header(self) -> int:
+        # Anything before the header (code fences, prose) is dropped
+        for index, line in enumerate(self.lines):
+            self.line, self.lineno = line, index + 1
+            i = self.skip_spaces(0)
+            end = self.scan_word(i)
+            keyword = line[i:end]
+            if keyword not in HEADERS:
+                continue
+            self.chart.keyword = keyword
+            i = self.skip_spaces(end)
+            end = self.scan_word(i)
+            if line[i:end] in DIRECTIONS:
+                self.chart.direction = line[i:end]
+            elif end > i:
+                self.error(f'Invalid direction {line[i:end]!r}')
+            self.parse_line(end)
+            return index + 1
+        raise MermaidSyntaxError('Missing or invalid graph definition')
+
+    def parse_line(self, i: int) -> None:
+        line = self.line
+        while True:
+            i = self.skip_spaces(i)
+            if i >= len(line) or line.startswith('%%', i):
+                return
+            if line[i] == ';':
+                i += 1
+                continue
+            i = self.parse_statement(i)
+            i = self.skip_spaces(i)
+            if not self.at_statement_end(i) and not line.startswith('%%', i):
+                self.error(f'Unexpected {line[i]!r}')
+
+    def parse_statement(self, i: int) -> int:
+        end = self.scan_word(i)
+        word = self.line[i:end]
+        followed_by_space = end >= len(self.line) or self.line[end] in ' \t;'
+
+        if word == 'subgraph' and followed_by_space:
+            return self.parse_subgraph(end)
+        if word == 'end' and followed_by_space:
+            if not self.stack:
+                self.error("'end' without a subgraph")
+            self.stack.pop()
+            return end
+        if word == 'direction' and followed_by_space and self.stack:
+            value, end = self.rest_of_statement(end)
+            if value not in DIRECTIONS:
+                self.error(f'Invalid direction {value!r}')
+            self.stack[-1].direction = value
+            return end
+        if word == 'click' and followed_by_space:
+            text, end = self.rest_of_statement(i)
+            self.check_refs(text.split()[1:2])
+            self.chart.clicks.append(text)
+            self.target.append(('raw', text))
+            return end
+        if word in STYLE_KEYWORDS and followed_by_space:
+            text, end = self.rest_of_statement(i)
+            args = text.split()
+            if word == 'style':
+                self.check_refs(args[1:2])
+            elif word == 'class' and len(args) > 1:
+                self.check_refs(args[1].split(','))
+            self.target.append(('raw', text))
+            return end
+        return self.parse_chain(i)
+
+    def parse_subgraph(self, i: int) -> int:
+        i = self.skip_spaces(i)
+        end = self.scan_word(i)
+        subgraph_id, title = self.line[i:end] or None, None
+        after = self.skip_spaces(end)
+        if subgraph_id and after < len(self.line) and self.line[after] == '[':
+            title, _, end = self.scan_label(after + 1, (']',))
+        else:
+            rest, end = self.rest_of_statement(i)
+            if rest != (subgraph_id or ''):
+                # "subgraph Some title": the title doubles as the id
+                subgraph_id, title = None, rest
+        subgraph = Subgraph(subgraph_id, title, self.lineno)
+        self.target.append(subgraph)
+        self.chart.subgraphs.append(subgraph)
+        self.stack.append(subgraph)
+        return end
+
+    def parse_chain(self, i: int) -> int:
+        """Parse "A[x] & B --> C -.->|label| D" style statements."""
+        group, i = self.parse_node_group(i)
+        linked = False
+        while True:
+            j = self.skip_spaces(i)
+            link = self.scan_link(j)
+            if link is None:
+                break
+            edge, j = link
+            j = self.skip_spaces(j)
+            if self.at_statement_end(j):
+                self.error('Edge without a target node')
+            targets, i = self.parse_node_group(j)
+            for source in group:
+                for target in targets:
+                    new_edge = Edge(source, target, edge.style, edge.tip, edge.length,
+                                    edge.bidirectional, edge.label)
+                    self.chart.edges.append(new_edge)
+                    self.target.append(('edge', new_edge))
+            group = targets
+            linked = True
+        if not linked:
+            for node_id in group:
+                self.target.append(('node', node_id))
+        return i
+
+    def parse_node_group(self, i: int) -> Tuple[List[str], int]:
+        group = []
+        while True:
+            node_id, i = self.parse_node(i)
+            group.append(node_id)
+            j = self.skip_spaces(i)
+            if j < len(self.line) and self.line[j] == '&':
+                i = self.skip_spaces(j + 1)
+                continue
+            return group, i
+
+    def parse_node(self, i: int) -> Tuple[str, int]:
+        line = self.line
+        end = self.scan_word(i)
+        if end == i:
+            self.error(f'Expected a node id, found {line[i]!r}' if i < len(line) else 'Expected a node id')
+        node_id = line[i:end]
+        if node_id in RESERVED_IDS:
+            self.error(f'{node_id!r} cannot be used as a node id')
+        node = self.chart.nodes.get(node_id)
+        if node is None:
+            node = self.chart.nodes[node_id] = Node(node_id)
+        i = end
+
+        for opener, closers in SHAPES:
+            if line.startswith(opener, i):
+                node.text, closer, i = self.scan_label(i + len(opener), closers)
+                node.shape = (opener, closer)
+                break
+        if line.startswith(':::', i):
+            end = self.scan_word(i + 3)
+            if end == i + 3:
+                self.error('Expected a class name')
+            node.classes.append(line[i + 3:end])
+            i = end
+        return node_id, i
+
+    def scan_label(self, i: int, closers: Tuple[str, ...]) -> Tuple[str, str, int]:
+        """Scan label text up to one of closers; returns (text, closer, index after it)."""
+        line = self.line
+        if i < len(line) and line[i] == '"':
+            end = line.find('"', i + 1)
+            if end == -1:
+                self.error('Unterminated quoted label')
+            for closer in closers:
+                if line.startswith(closer, end + 1):
+                    return line[i + 1:end], closer, end + 1 + len(closer)
+            self.error(f'Expected {closers[0]!r} after quoted label')
+        if len(closers) == 1:
+            # Scanning stops at the first closer, so this stays linear
+            j = line.find(closers[0], i)
+            if j != -1:
+                return line[i:j].strip(), closers[0], j + len(closers[0])
+            self.error(f'Unterminated label, expected {closers[0]!r}')
+        j = i
+        while j < len(line):
+            for closer in closers:
+                if line.startswith(closer, j):
+                    return line[i:j].strip(), closer, j + len(closer)
+            j += 1
+        self.error(f'Unterminated label, expected {closers[0]!r}')
+
+    def scan_link(self, i: int) -> Optional[Tuple[Edge, int]]:
+        """
+        Scan a link operator ("-->", "-.->", "==>", "---", "--o", "<-->",
+        "-- text -->", ...) and an optional "|label|". Returns None if there
+        is no link at i.
+        """
+        line = self.line
+        edge = Edge('', '')
+        if line.startswith('<', i):
+            edge.bidirectional = True
+            i += 1
+        link = self.scan_operator(i, opening=True)
+        if link is None:
+            if edge.bidirectional:
+                self.error("Expected a link after '<'")
+            return None
+        edge.style, edge.tip, edge.length, i = link
+
+        if edge.length == 0:
+            # "-- text -->" form: the label runs to the closing operator
+            start = i
+            while True:
+                if i >= len(line):
+                    self.error('Unterminated link label')
+                if line[i] in '-=.' and line[i - 1] in ' \t':
+                    closing = self.scan_operator(i, opening=False)
+                    if closing is not None and closing[0] == edge.style:
+                        edge.label = line[start:i].strip()
+                        _, edge.tip, edge.length, i = closing
+                        break
+                    i = max(i + 1, closing[3] if closing else i + 1)
+                else:
+                    i += 1
+
+        j = self.skip_spaces(i)
+        if j < len(line) and line[j] == '|':
+            end = line.find('|', j + 1)
+            if end == -1:
+                self.error('Unterminated link label')
+            edge.label = line[j + 1:end].strip().strip('"')
+            i = end + 1
+        return edge, i
+
+    def scan_operator(self, i: int, opening: bool) -> Optional[Tuple[str, str, int, int]]:
+        """
+        Returns (style, tip, length, end). length is 0 for the opening half
+        of a "-- text -->" link.
+        """
+        line = self.line
+        if i >= len(line):
+            return None
+        char = line[i]
+
+        if char == '.' and not opening:
+            # Closing half of "-. text .->"
+            end = self.scan_run(i, '.')
+            if not line.startswith('-', end):
+                return None
+            dots, end = end - i, end + 1
+            tip = '>' if line.startswith('>', end) else ''
+            return 'dotted', tip, dots, end + len(tip)
+
+        if char not in '-=':
+            return None
+        style = 'thick' if char == '=' else 'solid'
+        end = self.scan_run(i, char)
+        run = end - i
+
+        if char == '-' and run == 1 and line.startswith('.', end):
+            dots_end = self.scan_run(end, '.')
+            dots = dots_end - end
+            if line.startswith('-', dots_end):
+                tip_at = dots_end + 1
+                tip = '>' if line.startswith('>', tip_at) else ''
+                return 'dotted', tip, dots, tip_at + len(tip)
+            if opening and dots == 1 and line[dots_end:dots_end + 1] in (' ', '\t'):
+                return 'dotted', '', 0, dots_end
+            return None
+        if run < 2:
+            return None
+
+        tip = line[end] if end < len(line) else ''
+        if tip == '>' or (tip in ('o', 'x') and (end + 1 >= len(line) or not _is_id_char(line[end + 1]))):
+            return style, tip, run - 1, end + 1
+        if run == 2:
+            if opening and tip in (' ', '\t'):
+                return style, '', 0, end
+            return None
+        return style, '', run - 2, end
+
+    def check_refs(self, node_ids) -> None:
+        for node_id in node_ids:
+            if node_id:
+                self.checked_refs.append((node_id, self.lineno))
+
+
+def parse(text: str) -> Flowchart:
+    """Parse a flowchart; raises MermaidSyntaxError if it is not well formed."""
+    return _Parser(text).parse()
+
+
+def normalize(text: str) -> str:
+    """Parse a flowchart and return it in canonical form."""
+    return parse(text).to_mermaid()
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mermiad', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagram',
+            name='language',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='diagram',
+            name='source_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='diagram',
+            name='title',
+            field=models.TextField(),
+        ),
+    ]
@@ -1,8 +1,20 @@
 from django.db import models
+from django.utils import timezone
 
 
 
 class Diagram(models.Model):
-    title = models.CharField(max_length=100)
+    # Holds the generated Mermaid code
+    title = models.TextField()
+    source_text = models.TextField(blank=True, default='')
+    language = models.CharField(max_length=20, blank=True, default='')
+    source = models.ForeignKey('sources.Source', null=True, blank=True, on_delete=models.SET_NULL,
+                               related_name='diagrams', db_index=False)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, editable=False)
+
+    class Meta:
+        # Listing by source in creation order; also serves lookups on source alone
+        indexes = [models.Index(fields=['source', 'created_at'], name='diagram_source_created_idx')]
+
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
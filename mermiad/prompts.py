@@ -0,0 +1,120 @@
+"""
+Mermaid diagram prompt templates, registered with the shared prompt registry.
+"""
+from pfe.prompts import registry
+
+DIAGRAM_PROMPTS = {
+    "arabic": """
+        أنت خبير في إنشاء مخططات Mermaid. مهمتك هي تحليل النص التالي وإنشاء مخطط Mermaid يلخص المفاهيم الرئيسية والعلاقات بينها.
+
+        النص: {input_text}
+
+        التعليمات:
+        1. تحليل النص:
+           - حدد المفاهيم الرئيسية والفرعية
+           - حدد العلاقات والتسلسلات المنطقية
+           - اكتشف التصنيفات والمجموعات الطبيعية
+
+        2. بنية المخطط:
+           - استخدم graph TD للتخطيط الهرمي من أعلى إلى أسفل
+           - حافظ على عرض المخطط 3-4 عقد لكل مستوى
+           - استخدم تسميات عربية واضحة وموجزة
+
+        3. تنسيق العقد:
+           - المفاهيم الرئيسية: استخدم الأقواس المربعة []
+           - المفاهيم الفرعية: أضف وصفاً موجزاً
+           - استخدم معرفات فريدة لكل عقدة
+
+        4. العلاقات:
+           - --> للعلاقات المباشرة
+           - --- للروابط غير المباشرة
+           - -.- للعلاقات الاختيارية
+           - === للروابط المؤكدة
+
+        5. مصادر الروابط:
+           - المواقع التعليمية الرسمية
+           - منصات التعلم العربية
+           - المصادر الأكاديمية العربية
+           - الوثائق التقنية المترجمة
+
+        يجب أن يبدأ المخطط بـ:
+        graph TD
+        
+        مثال على الصيغة المطلوبة:
+        graph TD
+            A[المفهوم الرئيسي] --> B[المفهوم الفرعي 1]
+            A --> C[المفهوم الفرعي 2]
+            B --> D[التفصيل 1]
+            C --> E[التفصيل 2]
+        """,
+    
+    "english": """
+        You are an expert Mermaid diagram creator. Your task is to analyze the text and create a valid, well-structured Mermaid diagram.
+
+        Text to analyze: {input_text}
+
+        CRITICAL REQUIREMENTS:
+        1. ALWAYS start with 'graph TD' on its own line
+        2. Use ONLY valid Mermaid syntax
+        3. Ensure all node IDs are alphanumeric (no spaces or special characters)
+        4. Test all connections for valid syntax
+        5. Keep node texts concise and clear
+        6. Limit diagram width to 3-4 nodes per level
+
+        FORMATTING RULES:
+        1. Node Structure:
+           - Main concepts: nodeId[Main Concept]
+           - Sub-concepts: subNodeId[Sub Concept]
+           - Use underscores for multi-word IDs: main_concept
+        
+        2. Connections:
+           - Basic: A --> B
+           - Dotted: A -.-> B
+           - Thick: A ==> B
+           - With text: A -->|describes| B
+        
+        3. Subgraphs (if needed):
+           subgraph title
+           node1 --> node2
+           end
+
+        4. Link URLs:
+           click nodeId "URL" "Hover text"
+           
+        Educational Sources Priority:
+        1. me-iu-dm (preferred)
+        2. Official documentation
+        3. Educational platforms
+        4. Industry resources
+        5. Research papers
+
+        Example of required format:
+        graph TD
+            A[Main Concept] --> B[First Point]
+            A --> C[Second Point]
+            B --> D[Detail 1]
+            C --> E[Detail 2]
+            
+            click A "https://me-iu-dm/topic" "Learn more"
+            click B "https://docs.example.com" "Official docs"
+        """
+}
+
+REPAIR_PROMPTS = {
+    "english": """
+    The following Mermaid flowchart is invalid.
+
+    Parser error: {errors}
+
+    Diagram:
+    {input_text}
+
+    Fix only the problem reported above and keep everything else unchanged:
+    node ids, labels (in their original language), connections and subgraphs.
+    Reply with the corrected diagram only, starting with 'graph TD' on its own
+    line, without code fences or explanations.
+    """
+}
+
+registry.register('diagram', DIAGRAM_PROMPTS)
+registry.register('diagram_repair', REPAIR_PROMPTS, defaults={'errors': ''})
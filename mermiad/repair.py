@@ -0,0 +1,181 @@
+"""
+Repair stage for generated diagrams that fail to parse.
+
+repair_locally() applies cheap deterministic fixes one at a time, in order,
+and returns as soon as the diagram parses:
+
+- strip code fences,
+- add a missing "graph TD" header,
+- drop stray "end" lines and close unclosed subgraphs,
+- balance node label brackets (closing labels before the next link),
+- sanitize node ids ("sub-topic" -> "sub_topic", "end" -> "end_").
+
+Only when that fails do the views send the model a small repair prompt
+(repair_prompt()) with just the invalid diagram and the parser error.
+"""
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple
+
+from pfe.prompts import registry
+
+from . import flowchart
+
+FENCE = re.compile(r'^\s*```')
+HEADER = re.compile(r'^\s*(graph|flowchart)\b')
+SUBGRAPH = re.compile(r'^\s*subgraph\b')
+END = re.compile(r'^\s*end\s*;?\s*$')
+# A link starting after whitespace; used to close a label left open before it
+LINK_AHEAD = re.compile(r'\s+<?(?:--|==|-\.)')
+# "-" or "." inside an id, e.g. "sub-topic" or "step.1"
+ID_PUNCTUATION = re.compile(r'(?<=\w)[-.](?=\w)')
+RESERVED_ID = re.compile(r'\bend\b')
+# Lines whose arguments are not node ids and must be left alone
+VERBATIM = re.compile(r'^\s*(style|classDef|class|linkStyle|click|direction|subgraph|%%)\b')
+
+OPENERS = {'(': ')', '[': ']', '{': '}'}
+CLOSERS = {')': '(', ']': '[', '}': '{'}
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def record(outcome: str) -> None:
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def stats() -> Dict[str, int]:
+    """How diagrams were made valid: 'valid', 'local', 'model' or 'failed'."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def strip_fences(lines: List[str]) -> List[str]:
+    return [line for line in lines if not FENCE.match(line)]
+
+
+def add_header(lines: List[str]) -> List[str]:
+    if any(HEADER.match(line) for line in lines):
+        return lines
+    return ['graph TD'] + lines
+
+
+def balance_subgraphs(lines: List[str]) -> List[str]:
+    out, depth = [], 0
+    for line in lines:
+        if SUBGRAPH.match(line):
+            depth += 1
+        elif END.match(line):
+            if not depth:
+                continue
+            depth -= 1
+        out.append(line)
+    return out + ['end'] * depth
+
+
+def _balance_line(line: str) -> str:
+    out, stack, quoted = [], [], False
+    for i, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif not quoted:
+            # ">" right after an id opens an "A>text]" label
+            if char in OPENERS or (char == '>' and i and (line[i - 1].isalnum() or line[i - 1] == '_')):
+                stack.append('[' if char == '>' else char)
+            elif char in CLOSERS:
+                if CLOSERS[char] not in stack:
+                    # Stray closer
+                    continue
+                # Close labels opened inside this one, e.g. "[text (aside]"
+                while stack[-1] != CLOSERS[char]:
+                    out.append(OPENERS[stack.pop()])
+                stack.pop()
+            elif stack and char in ' \t' and LINK_AHEAD.match(line, i):
+                out.extend(OPENERS[opener] for opener in reversed(stack))
+                stack = []
+        out.append(char)
+    if quoted:
+        out.append('"')
+    out.extend(OPENERS[opener] for opener in reversed(stack))
+    return ''.join(out)
+
+
+def balance_brackets(lines: List[str]) -> List[str]:
+    return [line if VERBATIM.match(line) else _balance_line(line) for line in lines]
+
+
+def _outside_labels(line: str, func: Callable[[str], str]) -> str:
+    """Apply func to the parts of line that are not labels or quoted text."""
+    parts, start, depth, quoted, piped = [], 0, 0, False, False
+    for i, char in enumerate(line):
+        in_label = depth or quoted or piped
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '|':
+            piped = not piped
+        elif not quoted and not piped and char in OPENERS:
+            depth += 1
+        elif not quoted and not piped and char in CLOSERS and depth:
+            depth -= 1
+        if not in_label and (depth or quoted or piped):
+            parts.append(func(line[start:i]))
+            start = i
+        elif in_label and not (depth or quoted or piped):
+            parts.append(line[start:i + 1])
+            start = i + 1
+    tail = line[start:]
+    parts.append(tail if depth or quoted or piped else func(tail))
+    return ''.join(parts)
+
+
+def _sanitize(segment: str) -> str:
+    segment = ID_PUNCTUATION.sub('_', segment)
+    return RESERVED_ID.sub('end_', segment)
+
+
+def sanitize_ids(lines: List[str]) -> List[str]:
+    return [
+        line if VERBATIM.match(line) or END.match(line) or HEADER.match(line)
+        else _outside_labels(line, _sanitize)
+        for line in lines
+    ]
+
+
+FIXES = (strip_fences, add_header, balance_subgraphs, balance_brackets, sanitize_ids)
+
+
+class Repair(NamedTuple):
+    diagram: str  # normalized if valid, else the text after the fixes
+    valid: bool
+    error: str
+    fixes: List[str]
+
+
+def repair_locally(diagram: str) -> Repair:
+    """Apply the local fixes in order until the diagram parses."""
+    lines = diagram.strip().splitlines()
+    fixes = []
+    error = ''
+    for fix in FIXES:
+        fixed = fix(lines)
+        if fixed == lines:
+            continue
+        lines = fixed
+        fixes.append(fix.__name__)
+        try:
+            return Repair(flowchart.normalize('\n'.join(lines)), True, '', fixes)
+        except flowchart.MermaidSyntaxError as e:
+            error = str(e)
+    if not fixes:
+        try:
+            return Repair(flowchart.normalize(diagram), True, '', fixes)
+        except flowchart.MermaidSyntaxError as e:
+            error = str(e)
+    return Repair('\n'.join(lines), False, error, fixes)
+
+
+def repair_prompt(diagram: str, error: str) -> str:
+    """Small prompt asking the model to fix only the reported error."""
+    return registry.build('diagram_repair', 'english', diagram.strip(), {'errors': error})
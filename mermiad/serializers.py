@@ -4,4 +4,4 @@ from .models import Diagram
 class DiagramSerializer(serializers.ModelSerializer):
     class Meta:
         model = Diagram
-        fields = ['id', 'title']
\ No newline at end of file
+        fields = ['id', 'title', 'language']
@@ -1,3 +1,102 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from mermiad import flowchart, repair, views
+from mermiad.models import Diagram
+
+
+class FlowchartTests(SimpleTestCase):
+    def test_normalize_expands_chains_and_groups(self):
+        self.assertEqual(flowchart.normalize('flowchart TD\nA-->B-->C'),
+                         'flowchart TD\n    A --> B\n    B --> C')
+        self.assertEqual(
+            flowchart.normalize('graph LR\n A[Start] --> B{Is it?} & C\n B -->|Yes| D((Done))'),
+            'graph LR\n    A[Start] --> B{Is it?}\n    A --> C\n    B -->|Yes| D((Done))',
+        )
+
+    def test_subgraphs_clicks_and_styles_are_kept(self):
+        diagram = 'graph TD\nA --> B\nsubgraph one [Group]\nB --> C\nend\nclick A "https://example.com"\nstyle C fill:#f9f'
+        self.assertEqual(
+            flowchart.normalize(diagram),
+            'graph TD\n    A --> B\n    subgraph one [Group]\n        B --> C\n    end\n'
+            '    click A "https://example.com"\n    style C fill:#f9f',
+        )
+
+    def test_labels_with_special_characters_are_quoted(self):
+        self.assertEqual(flowchart.normalize('graph TD\nA["Say (hi)"] --> B'), 'graph TD\n    A["Say (hi)"] --> B')
+
+    def test_malformed_diagrams_are_rejected(self):
+        for diagram, message in (
+            ('A --> B', 'Missing or invalid graph definition'),
+            ('graph TD\nA[Start --> B', "Unterminated label, expected ']' (line 2)"),
+            ('graph TD\nsubgraph x\nA-->B', 'Unclosed subgraph (line 2)'),
+            ('graph TD\nA -->', 'Edge without a target node (line 2)'),
+            ('graph TD\nA --> B\nend', "'end' without a subgraph (line 3)"),
+        ):
+            with self.subTest(diagram=diagram):
+                with self.assertRaisesMessage(flowchart.MermaidSyntaxError, message):
+                    flowchart.parse(diagram)
+
+    def test_style_statements_must_name_known_nodes(self):
+        with self.assertRaises(flowchart.MermaidSyntaxError):
+            flowchart.parse('graph TD\nA --> B\nstyle Z fill:#fff')
+
+
+class RepairTests(SimpleTestCase):
+    def test_local_fixes(self):
+        for diagram, fixes, expected in (
+            ('A --> B', ['add_header'], 'graph TD\n    A --> B'),
+            ('graph TD\nA[Start --> B', ['balance_brackets'], 'graph TD\n    A[Start] --> B'),
+            ('graph TD\nsubgraph x\nA-->B', ['balance_subgraphs'],
+             'graph TD\n    subgraph x\n        A --> B\n    end'),
+            ('```mermaid\ngraph TD\nsub-topic[Sub] --> end\n```', ['strip_fences', 'sanitize_ids'],
+             'graph TD\n    sub_topic[Sub] --> end_'),
+        ):
+            with self.subTest(diagram=diagram):
+                result = repair.repair_locally(diagram)
+                self.assertTrue(result.valid, result.error)
+                self.assertEqual(result.fixes, fixes)
+                self.assertEqual(result.diagram, expected)
+
+    def test_unfixable_diagram_keeps_the_parser_error(self):
+        result = repair.repair_locally('graph TD\nA -->')
+        self.assertFalse(result.valid)
+        self.assertIn('Edge without a target node', result.error)
+
+    @override_settings(DIAGRAM_REPAIR_ATTEMPTS=1)
+    def test_model_is_asked_only_when_local_fixes_fail(self):
+        with mock.patch.object(views.llm, 'generate') as generate:
+            self.assertEqual(views.repair_diagram('A --> B'), 'graph TD\n    A --> B')
+            generate.assert_not_called()
+
+            generate.return_value = SimpleNamespace(text='graph TD\nA --> B')
+            self.assertEqual(views.repair_diagram('graph TD\nA -->'), 'graph TD\n    A --> B')
+            self.assertEqual(generate.call_count, 1)
+
+    @override_settings(DIAGRAM_REPAIR_ATTEMPTS=1)
+    def test_invalid_after_every_attempt_raises(self):
+        with mock.patch.object(views.llm, 'generate', return_value=SimpleNamespace(text='graph TD\nA -->')):
+            with self.assertRaises(views.InvalidDiagramError):
+                views.repair_diagram('graph TD\nA -->')
+
+
+class AsyncViewTests(TestCase):
+    url = '/api/mermiad/create_diagram/async/'
+
+    async def test_diagram_is_repaired_and_saved(self):
+        answer = SimpleNamespace(text='```mermaid\ngraph TD\nA[Cells]-->B[Tissues]-->C[Organs]\n```')
+        with mock.patch('pfe.llm.agenerate', new=mock.AsyncMock(return_value=answer)):
+            response = await self.async_client.post(self.url, {'input_text': 'How cells form organs'},
+                                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        code = 'graph TD\n    A[Cells] --> B[Tissues]\n    B --> C[Organs]'
+        self.assertEqual(response.json()['mermaid_code'], code)
+        diagram = await Diagram.objects.select_related('source').aget()
+        self.assertEqual((diagram.title, diagram.source_text), (code, 'How cells form organs'))
+        self.assertIsNotNone(diagram.source)
+
+    async def test_input_text_is_required(self):
+        response = await self.async_client.post(self.url, {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
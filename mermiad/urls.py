@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import create_diagram 
+from .views import create_diagram , create_diagram_async
 
 
 urlpatterns = [
     path('create_diagram/', create_diagram, name='create_diagram'),
+    path('create_diagram/async/', create_diagram_async, name='create_diagram_async'),
 ]
@@ -1,150 +1,127 @@
-import google.generativeai as genai
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.conf import settings
+from . import flowchart, repair
 from .models import Diagram
 from .serializers import DiagramSerializer
-import os
-from dotenv import load_dotenv
-import re
-from typing import Dict, Tuple
+from pfe import generation_cache, llm, tracing
+from pfe.async_utils import parse_json_body
+from pfe.language import detect_language
+from pfe.prompts import registry
+from pfe.rate_limit import RateLimited
+from sources.models import Source
+from typing import Dict, Optional, Tuple
 
-# Load environment variables
-load_dotenv()
-
-# Configure the Google Generative AI model with API key
-genai.configure(api_key=os.getenv('GEMINI_API'))
-
-def detect_language(text: str) -> str:
-    """Detect the primary language of the input text."""
-    return "arabic" if any("\u0600" <= char <= "\u06FF" for char in text) else "english"
+MODEL_NAME = "gemini-1.5-pro"
 
 def validate_mermaid_syntax(diagram: str) -> Tuple[bool, str]:
     """
     Validate Mermaid diagram syntax and clean up common issues.
-    Returns (is_valid, cleaned_diagram).
+    Returns (is_valid, cleaned_diagram), or (False, error message).
+    """
+    try:
+        return True, flowchart.normalize(diagram)
+    except flowchart.MermaidSyntaxError as e:
+        return False, str(e)
+
+class InvalidDiagramError(Exception):
+    """Raised when the model fails to produce a valid diagram after retrying."""
+
+def _repair_step(code: str, attempt: int):
+    """
+    Validate code, falling back to the local fixes. Returns (valid code or
+    None, best-effort code, parser error).
     """
-    # Remove any markdown code block markers
-    diagram = re.sub(r'```mermaid\s*|```\s*$', '', diagram.strip())
-    
-    # Basic syntax validation
-    required_elements = [
-        ('graph', r'(graph|flowchart)\s+(TB|TD|BT|RL|LR)'),
-        ('nodes', r'\w+\s*(\[|\(|\{).*?(\]|\)|\})'),
-        ('connections', r'\w+\s*(-+>|\.+>|=+>)\s*\w+'),
-    ]
-    
-    for element, pattern in required_elements:
-        if not re.search(pattern, diagram):
-            return False, f"Missing or invalid {element} definition"
-    
-    # Clean up formatting
-    diagram = re.sub(r'\s+', ' ', diagram)  # Normalize whitespace
-    diagram = re.sub(r'(\[|\(|\{)\s+', r'\1', diagram)  # Remove space after brackets
-    diagram = re.sub(r'\s+(\]|\)|\})', r'\1', diagram)  # Remove space before brackets
-    
-    return True, diagram
-
-def get_prompt_template(language: str) -> str:
-    """Get the appropriate prompt template based on language."""
-    templates = {
-        "arabic": """
-        أنت خبير في إنشاء مخططات Mermaid. مهمتك هي تحليل النص التالي وإنشاء مخطط Mermaid يلخص المفاهيم الرئيسية والعلاقات بينها.
-
-        النص: {input_text}
-
-        التعليمات:
-        1. تحليل النص:
-           - حدد المفاهيم الرئيسية والفرعية
-           - حدد العلاقات والتسلسلات المنطقية
-           - اكتشف التصنيفات والمجموعات الطبيعية
-
-        2. بنية المخطط:
-           - استخدم graph TD للتخطيط الهرمي من أعلى إلى أسفل
-           - حافظ على عرض المخطط 3-4 عقد لكل مستوى
-           - استخدم تسميات عربية واضحة وموجزة
-
-        3. تنسيق العقد:
-           - المفاهيم الرئيسية: استخدم الأقواس المربعة []
-           - المفاهيم الفرعية: أضف وصفاً موجزاً
-           - استخدم معرفات فريدة لكل عقدة
-
-        4. العلاقات:
-           - --> للعلاقات المباشرة
-           - --- للروابط غير المباشرة
-           - -.- للعلاقات الاختيارية
-           - === للروابط المؤكدة
-
-        5. مصادر الروابط:
-           - المواقع التعليمية الرسمية
-           - منصات التعلم العربية
-           - المصادر الأكاديمية العربية
-           - الوثائق التقنية المترجمة
-
-        يجب أن يبدأ المخطط بـ:
-        graph TD
-        
-        مثال على الصيغة المطلوبة:
-        graph TD
-            A[المفهوم الرئيسي] --> B[المفهوم الفرعي 1]
-            A --> C[المفهوم الفرعي 2]
-            B --> D[التفصيل 1]
-            C --> E[التفصيل 2]
-        """,
-        
-        "english": """
-        You are an expert Mermaid diagram creator. Your task is to analyze the text and create a valid, well-structured Mermaid diagram.
-
-        Text to analyze: {input_text}
-
-        CRITICAL REQUIREMENTS:
-        1. ALWAYS start with 'graph TD' on its own line
-        2. Use ONLY valid Mermaid syntax
-        3. Ensure all node IDs are alphanumeric (no spaces or special characters)
-        4. Test all connections for valid syntax
-        5. Keep node texts concise and clear
-        6. Limit diagram width to 3-4 nodes per level
-
-        FORMATTING RULES:
-        1. Node Structure:
-           - Main concepts: nodeId[Main Concept]
-           - Sub-concepts: subNodeId[Sub Concept]
-           - Use underscores for multi-word IDs: main_concept
-        
-        2. Connections:
-           - Basic: A --> B
-           - Dotted: A -.-> B
-           - Thick: A ==> B
-           - With text: A -->|describes| B
-        
-        3. Subgraphs (if needed):
-           subgraph title
-           node1 --> node2
-           end
-
-        4. Link URLs:
-           click nodeId "URL" "Hover text"
-           
-        Educational Sources Priority:
-        1. me-iu-dm (preferred)
-        2. Official documentation
-        3. Educational platforms
-        4. Industry resources
-        5. Research papers
-
-        Example of required format:
-        graph TD
-            A[Main Concept] --> B[First Point]
-            A --> C[Second Point]
-            B --> D[Detail 1]
-            C --> E[Detail 2]
-            
-            click A "https://me-iu-dm/topic" "Learn more"
-            click B "https://docs.example.com" "Official docs"
-        """
-    }
-    
-    return templates.get(language, templates["english"])
+    with tracing.span('validate'):
+        is_valid, result = validate_mermaid_syntax(code)
+        if is_valid:
+            repair.record('valid' if attempt == 0 else 'model')
+            return result, code, ''
+        fixed = repair.repair_locally(code)
+    if fixed.valid:
+        repair.record('local' if attempt == 0 else 'model')
+        return fixed.diagram, code, ''
+    return None, fixed.diagram, fixed.error or result
+
+def repair_diagram(code: str) -> str:
+    """
+    Return the validated, normalized diagram. Invalid output is first fixed
+    locally; only then is DIAGRAM_REPAIR_MODEL asked, up to
+    DIAGRAM_REPAIR_ATTEMPTS times, to fix the reported parser error.
+    Raises InvalidDiagramError if the diagram still doesn't parse.
+    """
+    for attempt in range(settings.DIAGRAM_REPAIR_ATTEMPTS + 1):
+        valid, code, error = _repair_step(code, attempt)
+        if valid is not None:
+            return valid
+        if attempt < settings.DIAGRAM_REPAIR_ATTEMPTS:
+            code = llm.generate(settings.DIAGRAM_REPAIR_MODEL, repair.repair_prompt(code, error)).text
+    repair.record('failed')
+    raise InvalidDiagramError(error)
+
+async def arepair_diagram(code: str) -> str:
+    """Async variant of repair_diagram."""
+    for attempt in range(settings.DIAGRAM_REPAIR_ATTEMPTS + 1):
+        valid, code, error = _repair_step(code, attempt)
+        if valid is not None:
+            return valid
+        if attempt < settings.DIAGRAM_REPAIR_ATTEMPTS:
+            response = await llm.agenerate(settings.DIAGRAM_REPAIR_MODEL, repair.repair_prompt(code, error))
+            code = response.text
+    repair.record('failed')
+    raise InvalidDiagramError(error)
+
+def generate_diagram_code(input_text: str, language: str) -> str:
+    """
+    Generate and validate the Mermaid code for the input text, without saving.
+    Raises InvalidDiagramError if no valid diagram could be made.
+    """
+    # Reuse a previous generation for the same text
+    with tracing.span('cache'):
+        cache_key = generation_cache.make_key('diagram', MODEL_NAME, language, input_text)
+        cached = generation_cache.get(cache_key)
+    if cached is not None:
+        cleaned_code = cached['parsed']
+    else:
+        # Generate diagram using AI model
+        with tracing.span('prompt'):
+            prompt = registry.build('diagram', language, input_text)
+        response = llm.generate(MODEL_NAME, prompt)
+        raw_text = response.text
+
+        # Validate the Mermaid code, repairing it if needed
+        cleaned_code = repair_diagram(raw_text)
+
+        generation_cache.set(cache_key, raw_text, cleaned_code)
+
+    return cleaned_code
+
+def generate_diagram(input_text: str, source: Optional[Source] = None) -> Tuple[Diagram, str]:
+    """
+    Generate, validate and save a Mermaid diagram for the input text, linked
+    to source.
+    Returns (diagram, mermaid_code). Shared by the HTTP view and the
+    background job handler.
+    """
+    # Detect language and get appropriate prompt
+    with tracing.span('detect_language'):
+        language = detect_language(input_text)
+
+    cleaned_code = generate_diagram_code(input_text, language)
+
+    # Save the validated diagram
+    with tracing.span('db_write'):
+        diagram = Diagram.objects.create(
+            title=cleaned_code,
+            source_text=input_text,
+            language=language,
+            source=source
+        )
+    return diagram, cleaned_code
 
 @api_view(['POST'])
 def create_diagram(request):
@@ -154,56 +131,94 @@ def create_diagram(request):
         return Response({'error': 'Input text is required'}, status=400)
 
     try:
-        # Detect language and get appropriate prompt
-        language = detect_language(input_text)
-        prompt_template = get_prompt_template(language)
-        
-        # Generate diagram using AI model
-        model = genai.GenerativeModel("gemini-1.5-pro")
-        response = model.generate_content(prompt_template.format(input_text=input_text))
-        
-        # Extract and validate Mermaid code
-        mermaid_code = response.text.strip()
-        is_valid, cleaned_code = validate_mermaid_syntax(mermaid_code)
-        
-        if not is_valid:
-            # If invalid, try to regenerate with more explicit instructions
-            retry_prompt = f"""
-            The previous attempt produced invalid Mermaid syntax. Please create a new diagram following these strict rules:
-            1. Start with 'graph TD' on its own line
-            2. Use only basic node definitions: ID[Text]
-            3. Use only simple connections: -->
-            4. Ensure all node IDs are alphanumeric
-            5. Keep it simple and valid
-            
-            Original text: {input_text}
-            """
-            
-            retry_response = model.generate_content(retry_prompt)
-            is_valid, cleaned_code = validate_mermaid_syntax(retry_response.text.strip())
-            
-            if not is_valid:
-                return Response({
+        with tracing.span('source'):
+            source = Source.objects.for_request(request.data, input_text)
+        diagram, cleaned_code = generate_diagram(input_text, source)
+
+        with tracing.span('serialize'):
+            data = DiagramSerializer(diagram).data
+        return Response({
+            'diagram': data,
+            'mermaid_code': cleaned_code
+        }, status=status.HTTP_201_CREATED)
+
+    except InvalidDiagramError as e:
+        return Response({
+            'error': 'Unable to generate valid Mermaid diagram',
+            'details': str(e)
+        }, status=400)
+
+    except RateLimited as e:
+        return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={'Retry-After': str(e.retry_after)})
+
+    except Exception as e:
+        return Response({
+            'error': 'Failed to generate diagram',
+            'details': str(e),
+            'error_type': type(e).__name__
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@csrf_exempt
+@require_POST
+async def create_diagram_async(request):
+    """Async variant of create_diagram for ASGI deployments."""
+    data = parse_json_body(request)
+    if data is None:
+        return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+
+    input_text = data.get('input_text')
+    if not input_text:
+        return JsonResponse({'error': 'Input text is required'}, status=400)
+
+    try:
+        with tracing.span('detect_language'):
+            language = detect_language(input_text)
+        with tracing.span('cache'):
+            cache_key = generation_cache.make_key('diagram', MODEL_NAME, language, input_text)
+            cached = await generation_cache.aget(cache_key)
+        if cached is not None:
+            cleaned_code = cached['parsed']
+        else:
+            with tracing.span('prompt'):
+                prompt = registry.build('diagram', language, input_text)
+            response = await llm.agenerate(MODEL_NAME, prompt)
+            raw_text = response.text
+            try:
+                cleaned_code = await arepair_diagram(raw_text)
+            except InvalidDiagramError as e:
+                return JsonResponse({
                     'error': 'Unable to generate valid Mermaid diagram',
-                    'details': cleaned_code
+                    'details': str(e)
                 }, status=400)
 
-        # Save the validated diagram
-        diagram = Diagram.objects.create(
-            title=cleaned_code,
-            source_text=input_text,
-            language=language
-        )
+            await generation_cache.aset(cache_key, raw_text, cleaned_code)
 
-        serializer = DiagramSerializer(diagram)
-        return Response({
-            'diagram': serializer.data,
+        with tracing.span('source'):
+            source = await Source.objects.afor_text(input_text, language)
+
+        with tracing.span('db_write'):
+            diagram = await Diagram.objects.acreate(
+                title=cleaned_code,
+                source_text=input_text,
+                language=language,
+                source=source
+            )
+
+        with tracing.span('serialize'):
+            data = DiagramSerializer(diagram).data
+        return JsonResponse({
+            'diagram': data,
             'mermaid_code': cleaned_code
         }, status=status.HTTP_201_CREATED)
 
+    except RateLimited as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                            headers={'Retry-After': str(e.retry_after)})
+
     except Exception as e:
-        return Response({
+        return JsonResponse({
             'error': 'Failed to generate diagram',
             'details': str(e),
             'error_type': type(e).__name__
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class PfeConfig(AppConfig):
+    name = 'pfe'
+
+    def ready(self):
+        from . import llm
+
+        llm.configure()
@@ -3,14 +3,26 @@ ASGI config for pfe project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with an ASGI server (e.g. ``uvicorn pfe.asgi:application``) to serve
+the ``*/async/`` generation endpoints without blocking a thread per Gemini
+call.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pfe.settings')
 
 application = get_asgi_application()
+
+# Only serving processes warm the Gemini client up; management commands,
+# test runs and job workers never load this module
+from pfe import llm  # noqa: E402
+
+if settings.GEMINI_WARM_UP:
+    llm.warm_up()
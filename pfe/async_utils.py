@@ -0,0 +1,60 @@
+"""
+Helpers shared by the async (ASGI) views.
+
+Blocking calls that have no async client (e.g. YouTubeTranscriptApi) run on
+one bounded thread pool per process, sized by BLOCKING_EXECUTOR_MAX_WORKERS,
+so a traffic spike can't spawn an unbounded number of threads. Calls that
+may outlive the await (a timed-out call keeps running on its thread) get
+their own pool via make_executor, so they can't starve the shared one.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def make_executor(max_workers: int, name: str) -> ThreadPoolExecutor:
+    """Return a dedicated bounded executor for one kind of blocking call."""
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor for blocking calls."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = make_executor(getattr(settings, 'BLOCKING_EXECUTOR_MAX_WORKERS', 32), 'blocking')
+    return _executor
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking function on the bounded executor and await its result."""
+    return await run_in(get_executor(), func, *args, **kwargs)
+
+
+async def run_in(executor: ThreadPoolExecutor, func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking function on the given executor and await its result."""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (e.g. the request trace) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def parse_json_body(request) -> Optional[Dict]:
+    """
+    Decode a JSON object request body. Returns None if the body is not a JSON object.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
@@ -0,0 +1,146 @@
+"""
+Bulk persistence for generated rows.
+
+bulk_save() inserts a list of unsaved model instances with one bulk_create
+per model inside a single transaction. When BATCH_WRITES_ENABLED is set, the
+rows are instead handed to a process-wide BatchWriter, which coalesces the
+inserts of concurrent requests into shared transactions (one commit for many
+generations instead of one per request). Rows saved inside a transaction
+the caller already holds are inserted directly, so they commit with it.
+"""
+import asyncio
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import List, Sequence
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+
+def _insert(objs: Sequence) -> None:
+    # One bulk_create per model class, all in the caller's transaction
+    by_model = defaultdict(list)
+    for obj in objs:
+        by_model[type(obj)].append(obj)
+    for model, model_objs in by_model.items():
+        model.objects.bulk_create(model_objs)
+
+
+class BatchWriter:
+    """
+    Background writer that groups bulk inserts from many threads.
+
+    submit() returns a Future resolved with the same instances (primary keys
+    set where the backend returns them) once their batch has committed, or
+    with the exception that failed them. A batch is flushed when it reaches
+    max_batch_size rows or after max_delay seconds, whichever comes first.
+    """
+
+    def __init__(self, max_batch_size: int = 500, max_delay: float = 0.01):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, objs: Sequence) -> Future:
+        future = Future()
+        self._queue.put((list(objs), future))
+        self._ensure_started()
+        return future
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='batch-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            pending = [self._queue.get()]
+            count = len(pending[0][0])
+            deadline = time.monotonic() + self.max_delay
+            while count < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                count += len(item[0])
+            try:
+                self._flush(pending)
+            except Exception as e:
+                # Keep the thread alive and fail whatever the flush left unresolved
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _flush(self, pending) -> None:
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                _insert([obj for objs, _ in pending for obj in objs])
+        except Exception:
+            # Retry each submission on its own so one bad row doesn't fail the others
+            for objs, future in pending:
+                try:
+                    with transaction.atomic():
+                        _insert(objs)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(objs)
+        else:
+            for objs, future in pending:
+                future.set_result(objs)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> BatchWriter:
+    """Return the shared BatchWriter for this process."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BatchWriter(
+                    max_batch_size=getattr(settings, 'BATCH_WRITES_MAX_SIZE', 500),
+                    max_delay=getattr(settings, 'BATCH_WRITES_MAX_DELAY', 0.01),
+                )
+    return _writer
+
+
+def bulk_save(objs: Sequence) -> List:
+    """
+    Insert unsaved instances in one transaction and return them.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    if getattr(settings, 'BATCH_WRITES_ENABLED', False) and not transaction.get_connection().in_atomic_block:
+        return get_writer().submit(objs).result(timeout=getattr(settings, 'BATCH_WRITES_TIMEOUT', 30))
+    with transaction.atomic():
+        _insert(objs)
+    return objs
+
+
+async def abulk_save(objs: Sequence) -> List:
+    """Async variant of bulk_save()."""
+    objs = list(objs)
+    if not objs:
+        return objs
+    if getattr(settings, 'BATCH_WRITES_ENABLED', False):
+        return await asyncio.wait_for(asyncio.wrap_future(get_writer().submit(objs)),
+                                      getattr(settings, 'BATCH_WRITES_TIMEOUT', 30))
+    return await sync_to_async(bulk_save)(objs)
@@ -0,0 +1,134 @@
+"""
+Batch generation helpers for the /batch/ endpoints.
+
+Items are fanned out on a bounded thread pool (BATCH_MAX_WORKERS). With
+packing enabled, small items that would use the same prompt are combined
+into one model call: each item is wrapped in a "### ITEM n ###" section and
+the model is asked to answer with the same markers, so the output can be
+split back per item. Items whose section is missing from the answer are
+generated on their own; a packed call that fails fails all of its items, and
+a rate limit error fails the items of its unit that are still waiting.
+"""
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+from django.conf import settings
+
+from .long_input import estimate_tokens
+from .rate_limit import RateLimited
+
+ITEM_MARKER = re.compile(r'^[ \t*#]*#{2,}\s*ITEM\s+(\d+)\s*#{2,}[ \t*]*$', re.MULTILINE | re.IGNORECASE)
+
+PACK_INSTRUCTIONS = """
+
+        The text above contains {count} independent items, each introduced by a
+        line of the form "### ITEM n ###". Treat every item separately. Start the
+        output for each item with its own "### ITEM n ###" line, then give the
+        output for that item only, in the format described above.
+        """
+
+
+def pack_inputs(texts: Sequence[str]) -> str:
+    """Join texts into one delimited input."""
+    return '\n\n'.join(f'### ITEM {i} ###\n{text.strip()}' for i, text in enumerate(texts, 1))
+
+
+def pack_instructions(count: int) -> str:
+    return PACK_INSTRUCTIONS.format(count=count)
+
+
+def unpack_output(content: str, count: int) -> List[Optional[str]]:
+    """
+    Split a packed model answer back into per-item sections. Returns one
+    entry per item, None where the model skipped the item.
+    """
+    sections: List[Optional[str]] = [None] * count
+    matches = list(ITEM_MARKER.finditer(content))
+    for match, following in zip(matches, matches[1:] + [None]):
+        index = int(match.group(1)) - 1
+        end = following.start() if following else len(content)
+        if 0 <= index < count and sections[index] is None:
+            sections[index] = content[match.end():end].strip()
+    return sections
+
+
+def plan_units(items: Sequence[Dict], group_key: Callable[[Dict], Hashable], pack: bool) -> List[List[int]]:
+    """
+    Group item indices into units of work. Without packing every item is its
+    own unit; with packing, small items sharing a group_key are combined up
+    to BATCH_PACK_MAX_ITEMS items / BATCH_PACK_MAX_TOKENS tokens.
+    """
+    if not pack:
+        return [[i] for i in range(len(items))]
+
+    units, open_packs = [], {}
+    for i, item in enumerate(items):
+        tokens = estimate_tokens(item['input_text'])
+        if tokens > settings.BATCH_PACK_MAX_ITEM_TOKENS:
+            units.append([i])
+            continue
+        key = group_key(item)
+        pack_indices, pack_tokens = open_packs.get(key, (None, 0))
+        if (pack_indices is None
+                or len(pack_indices) >= settings.BATCH_PACK_MAX_ITEMS
+                or pack_tokens + tokens > settings.BATCH_PACK_MAX_TOKENS):
+            pack_indices, pack_tokens = [], 0
+            units.append(pack_indices)
+        pack_indices.append(i)
+        open_packs[key] = (pack_indices, pack_tokens + tokens)
+    return units
+
+
+def run_batch(items: Sequence[Dict],
+              generate_one: Callable[[Dict], List[Any]],
+              generate_pack: Callable[[List[Dict]], List[Optional[List[Any]]]],
+              group_key: Callable[[Dict], Hashable],
+              pack: bool = False,
+              max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    Generate results for every item. Returns one dict per item, either
+    {'items': [...]} or {'error': '...'}, in input order.
+    """
+    results: List[Optional[Dict]] = [None] * len(items)
+
+    def fail(indices: Sequence[int], error: Exception) -> None:
+        for i in indices:
+            results[i] = {'error': str(error), 'error_type': type(error).__name__}
+
+    def run_unit(indices: List[int]) -> None:
+        pending = indices
+        if len(indices) > 1:
+            try:
+                packed = generate_pack([items[i] for i in indices])
+            except Exception as e:
+                # Retrying each item on its own would multiply the calls
+                # against an exhausted quota or an overloaded model
+                fail(indices, e)
+                return
+            pending = []
+            for i, parsed in zip(indices, packed):
+                if parsed:
+                    results[i] = {'items': parsed}
+                else:
+                    pending.append(i)
+        # Unpacked items, and items the packed answer skipped
+        for position, i in enumerate(pending):
+            try:
+                results[i] = {'items': generate_one(items[i])}
+            except RateLimited as e:
+                fail(pending[position:], e)
+                return
+            except Exception as e:
+                fail([i], e)
+
+    units = plan_units(items, group_key, pack)
+    max_workers = max_workers or settings.BATCH_MAX_WORKERS
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(units)) or 1,
+                            thread_name_prefix='batch') as executor:
+        # Each unit runs in a copy of the caller's context, so its spans join the request trace
+        futures = [executor.submit(contextvars.copy_context().run, run_unit, unit) for unit in units]
+        for future in futures:
+            future.result()
+    return results
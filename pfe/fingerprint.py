@@ -0,0 +1,242 @@
+"""
+Near-duplicate detection for generated cards and quizzes.
+
+Questions are compared as sets of character trigrams of their normalized
+text; two questions are near-duplicates when the Jaccard similarity of
+these sets is at least DEDUP_MIN_SIMILARITY. Each row stores a MinHash
+signature of its trigrams folded into BANDS band hashes (ROWS_PER_BAND
+minhashes each), one indexed integer column per band. Rows sharing any band
+are candidates (probability 1 - (1 - s**3)**6, ~0.99 at s = 0.8), so the
+band indexes act as an LSH index: looking up a batch of new rows is one
+indexed query followed by an exact similarity check on the few candidates.
+
+save_unique() is used instead of bulk_save() by the generation code. With
+DEDUP_MODE = 'merge' a near-duplicate of a stored row, or of an earlier row
+of the same batch, is replaced by that row, with 'skip' it is dropped, and
+with 'off' everything is inserted (the band hashes are still stored).
+`python manage.py dedupe` cleans up existing tables.
+"""
+import hashlib
+import random
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+
+from .batch_writer import bulk_save
+from .long_input import NON_WORD
+
+SHINGLE_SIZE = 3
+BANDS = 6
+ROWS_PER_BAND = 3
+BAND_FIELDS = tuple(f'fp_band{i}' for i in range(BANDS))
+LOOKUP_CHUNK_SIZE = 500
+
+# Fixed universal hash functions (a * x + b) mod p, one per minhash
+_PRIME = (1 << 61) - 1
+_random = random.Random(20241017)
+_HASHES = [(_random.randrange(1, _PRIME), _random.randrange(_PRIME)) for _ in range(BANDS * ROWS_PER_BAND)]
+
+
+class Fingerprinted(models.Model):
+    """Abstract base for models deduplicated on FINGERPRINT_FIELD."""
+
+    FINGERPRINT_FIELD = 'question'
+
+    fp_band0 = models.IntegerField(null=True, blank=True, editable=False, db_index=True)
+    fp_band1 = models.IntegerField(null=True, blank=True, editable=False, db_index=True)
+    fp_band2 = models.IntegerField(null=True, blank=True, editable=False, db_index=True)
+    fp_band3 = models.IntegerField(null=True, blank=True, editable=False, db_index=True)
+    fp_band4 = models.IntegerField(null=True, blank=True, editable=False, db_index=True)
+    fp_band5 = models.IntegerField(null=True, blank=True, editable=False, db_index=True)
+
+    class Meta:
+        abstract = True
+
+    def fingerprint_text(self) -> str:
+        return getattr(self, self.FINGERPRINT_FIELD) or ''
+
+    def set_fingerprint(self) -> FrozenSet[str]:
+        """Store the band hashes; returns the trigram set for comparisons."""
+        grams = shingles(self.fingerprint_text())
+        for name, value in zip(BAND_FIELDS, band_hashes(grams)):
+            setattr(self, name, value)
+        return grams
+
+    def save(self, *args, **kwargs):
+        self.set_fingerprint()
+        super().save(*args, **kwargs)
+
+
+def normalize(text: str) -> str:
+    return ' '.join(NON_WORD.sub(' ', text.casefold()).split())
+
+
+def shingles(text: str) -> FrozenSet[str]:
+    text = normalize(text)
+    return frozenset(text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1)))
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two trigram sets."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def band_hashes(grams: FrozenSet[str]) -> List[int]:
+    """MinHash signature of the trigrams folded into BANDS signed 32-bit ints."""
+    values = [int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), 'big') for gram in grams]
+    signature = [min((a * x + b) % _PRIME for x in values) if values else 0 for a, b in _HASHES]
+    result = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=4).digest()
+        result.append(int.from_bytes(digest, 'big', signed=True))
+    return result
+
+
+class LSHIndex:
+    """In-memory band index for finding near-duplicate texts."""
+
+    def __init__(self, min_similarity: float):
+        self.min_similarity = min_similarity
+        self._buckets = defaultdict(list)
+        self._count = 0
+
+    def add(self, grams: FrozenSet[str], bands: Sequence[int], item) -> None:
+        entry = (self._count, grams, item)
+        self._count += 1
+        for key in enumerate(bands):
+            self._buckets[key].append(entry)
+
+    def query(self, grams: FrozenSet[str], bands: Sequence[int]):
+        """Return the earliest added item similar enough to grams, or None."""
+        best = None
+        for key in enumerate(bands):
+            for entry in self._buckets.get(key, ()):
+                if (best is None or entry[0] < best[0]) and similarity(grams, entry[1]) >= self.min_similarity:
+                    best = entry
+        return best[2] if best else None
+
+
+def _bands(obj: Fingerprinted) -> List[int]:
+    return [getattr(obj, name) for name in BAND_FIELDS]
+
+
+def find_matches(model, objs: Sequence[Fingerprinted], grams: Sequence[FrozenSet[str]],
+                 min_similarity: float) -> Dict[int, models.Model]:
+    """
+    Map the position of each fingerprinted obj to the oldest stored row of
+    model that is a near-duplicate of it, when there is one.
+    """
+    matches = {}
+    # Chunked to stay under the database's query parameter limit
+    for start in range(0, len(objs), LOOKUP_CHUNK_SIZE):
+        chunk = range(start, min(start + LOOKUP_CHUNK_SIZE, len(objs)))
+        query = Q()
+        for name in BAND_FIELDS:
+            query |= Q(**{f'{name}__in': {getattr(objs[j], name) for j in chunk}})
+
+        index = LSHIndex(min_similarity)
+        for row in model.objects.filter(query).order_by('pk'):
+            index.add(shingles(row.fingerprint_text()), _bands(row), row)
+        for j in chunk:
+            row = index.query(grams[j], _bands(objs[j]))
+            if row is not None:
+                matches[j] = row
+    return matches
+
+
+def resolve_duplicates(objs: Iterable, mode: Optional[str] = None) -> List[Optional[models.Model]]:
+    """
+    Fingerprint unsaved instances and resolve near-duplicates. Returns a list
+    aligned with objs: the instance itself if it should be inserted, the
+    stored row or earlier instance it was merged into, or None if it was
+    dropped.
+    """
+    objs = list(objs)
+    mode = mode or getattr(settings, 'DEDUP_MODE', 'merge')
+    min_similarity = getattr(settings, 'DEDUP_MIN_SIMILARITY', 0.8)
+    resolved: List[Optional[models.Model]] = list(objs)
+
+    by_model = defaultdict(list)
+    for index, obj in enumerate(objs):
+        if isinstance(obj, Fingerprinted):
+            by_model[type(obj)].append((index, obj, obj.set_fingerprint()))
+
+    if mode == 'off':
+        return resolved
+
+    for model, entries in by_model.items():
+        # Near-duplicates within the batch itself
+        batch, kept, followers = LSHIndex(min_similarity), [], defaultdict(list)
+        for index, obj, grams in entries:
+            first = batch.query(grams, _bands(obj))
+            if first is not None:
+                resolved[index] = first[1] if mode == 'merge' else None
+                followers[first[0]].append(index)
+            else:
+                batch.add(grams, _bands(obj), (index, obj))
+                kept.append((index, obj, grams))
+
+        if not kept:
+            continue
+        matches = find_matches(model, [obj for _, obj, _ in kept], [grams for _, _, grams in kept], min_similarity)
+        for position, (index, _, _) in enumerate(kept):
+            row = matches.get(position)
+            if row is None:
+                continue
+            # The batch duplicates of the instance follow it
+            for duplicate in [index, *followers[index]]:
+                resolved[duplicate] = row if mode == 'merge' else None
+    return resolved
+
+
+def _unique(objs: Iterable) -> List:
+    # Drop repeats of the same instance or stored row, keeping the first
+    seen, result = set(), []
+    for obj in objs:
+        key = (type(obj), obj.pk) if obj.pk is not None else id(obj)
+        if key not in seen:
+            seen.add(key)
+            result.append(obj)
+    return result
+
+
+def save_unique(objs: Iterable) -> List[models.Model]:
+    """
+    bulk_save() the instances that aren't near-duplicates. Returns the saved
+    and merged rows in input order; dropped duplicates are left out.
+    """
+    return save_unique_groups([list(objs)])[0]
+
+
+def resolve_groups(groups: Sequence[Sequence]) -> List[List[models.Model]]:
+    """
+    resolve_duplicates() for several groups of rows with one lookup. Returns
+    per group the rows to insert (pk None) and the rows they were merged
+    into, in input order and each once; dropped duplicates are left out. A
+    row merged into from several groups is in each of them.
+    """
+    resolved = resolve_duplicates(obj for group in groups for obj in group)
+    result, start = [], 0
+    for group in groups:
+        result.append(_unique(obj for obj in resolved[start:start + len(group)] if obj is not None))
+        start += len(group)
+    return result
+
+
+def save_unique_groups(groups: Sequence[Sequence]) -> List[List[models.Model]]:
+    """save_unique() for several groups of rows with one lookup and one bulk insert."""
+    result = resolve_groups(groups)
+    bulk_save(_unique(obj for group in result for obj in group if obj.pk is None))
+    return result
+
+
+async def asave_unique(objs: Iterable) -> List[models.Model]:
+    """Async variant of save_unique()."""
+    return await sync_to_async(save_unique)(list(objs))
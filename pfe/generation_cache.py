@@ -0,0 +1,111 @@
+"""
+Content-addressed cache for model generations.
+
+Entries are keyed on a hash of (endpoint, model name, language, normalized
+input text, customizations) and hold both the raw model response and the
+parsed result, so a repeated submission skips the Gemini round trip.
+
+The cache lives in the Django cache named by ``GENERATION_CACHE_ALIAS``
+(see ``CACHES`` in settings), which controls the backend, TTL and
+entry-count eviction.
+"""
+import hashlib
+import json
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0, 'sets': 0, 'skipped': 0}
+
+
+def _cache():
+    return caches[getattr(settings, 'GENERATION_CACHE_ALIAS', 'generation')]
+
+
+def _incr(name: str) -> None:
+    with _lock:
+        _counters[name] += 1
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse whitespace so trivially different submissions share a key. Case
+    is kept: it can change what the model writes (e.g. acronyms).
+    """
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def make_key(endpoint: str, model_name: str, language: str,
+             input_text: str, customizations: Optional[Dict] = None) -> str:
+    """
+    Build the cache key for a generation request.
+    """
+    payload = json.dumps(
+        [endpoint, model_name, language, normalize_text(input_text), customizations or {}],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return 'gen:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached entry ({'raw': ..., 'parsed': ...}) or None on a miss.
+    """
+    entry = _cache().get(key)
+    _incr('hits' if entry is not None else 'misses')
+    return entry
+
+
+def set(key: str, raw: str, parsed: Any) -> None:
+    """
+    Store a generation. Entries larger than GENERATION_CACHE_MAX_ITEM_BYTES
+    are not cached so one huge response can't evict many small ones.
+    """
+    max_bytes = getattr(settings, 'GENERATION_CACHE_MAX_ITEM_BYTES', 512 * 1024)
+    if len(raw.encode('utf-8')) > max_bytes:
+        _incr('skipped')
+        return
+    _cache().set(key, {'raw': raw, 'parsed': parsed})
+    _incr('sets')
+
+
+def stats() -> Dict[str, float]:
+    """
+    Return hit/miss counters for this process.
+    """
+    with _lock:
+        counters = dict(_counters)
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_ratio'] = counters['hits'] / lookups if lookups else 0.0
+    return counters
+
+
+def clear() -> None:
+    """Drop every cached generation and reset the counters."""
+    _cache().clear()
+    with _lock:
+        for name in _counters:
+            _counters[name] = 0
+
+
+async def aget(key: str) -> Optional[Dict[str, Any]]:
+    """Async variant of get()."""
+    entry = await _cache().aget(key)
+    _incr('hits' if entry is not None else 'misses')
+    return entry
+
+
+async def aset(key: str, raw: str, parsed: Any) -> None:
+    """Async variant of set()."""
+    max_bytes = getattr(settings, 'GENERATION_CACHE_MAX_ITEM_BYTES', 512 * 1024)
+    if len(raw.encode('utf-8')) > max_bytes:
+        _incr('skipped')
+        return
+    await _cache().aset(key, {'raw': raw, 'parsed': parsed})
+    _incr('sets')
@@ -0,0 +1,119 @@
+"""
+Script-based language detection shared by the generation apps.
+
+One precompiled regex matches runs of letters from each supported script,
+so the text is scanned once, a run at a time, in C. Inputs longer than
+SAMPLE_CHARS are sampled at evenly spaced windows. The winning script's
+share of all letters is the confidence, so a mostly English transcript
+that quotes one Arabic word is still detected as English. Results are
+cached per input digest in a small LRU.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict
+
+SCRIPT_RUNS = re.compile(
+    r'(?P<arabic>[\u0600-\u06ff\u0750-\u077f\u08a0-\u08ff\ufb50-\ufdff\ufe70-\ufeff]+)'
+    r'|(?P<han>[\u4e00-\u9fff\u3400-\u4dbf\uf900-\ufaff]+)'
+    r'|(?P<kana>[\u3040-\u30ff]+)'
+    r'|(?P<hangul>[\uac00-\ud7af\u1100-\u11ff]+)'
+    r'|(?P<cyrillic>[\u0400-\u04ff]+)'
+    r'|(?P<hebrew>[\u0590-\u05ff]+)'
+    r'|(?P<greek>[\u0370-\u03ff]+)'
+    r'|(?P<devanagari>[\u0900-\u097f]+)'
+    r'|(?P<latin>[A-Za-z\u00c0-\u024f]+)'
+)
+
+# Language reported for each script
+SCRIPT_LANGUAGES = {
+    'arabic': 'arabic',
+    'han': 'chinese',
+    'kana': 'japanese',
+    'hangul': 'korean',
+    'cyrillic': 'russian',
+    'hebrew': 'hebrew',
+    'greek': 'greek',
+    'devanagari': 'hindi',
+    'latin': 'english',
+}
+
+DEFAULT_LANGUAGE = 'english'
+SAMPLE_CHARS = 64 * 1024
+SAMPLE_WINDOWS = 16
+# Below this many letters the confidence is scaled down
+MIN_LETTERS = 20
+CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class LanguageResult:
+    language: str
+    confidence: float
+    ratios: Dict[str, float] = field(default_factory=dict)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _sample(text: str) -> str:
+    if len(text) <= SAMPLE_CHARS:
+        return text
+    window = SAMPLE_CHARS // SAMPLE_WINDOWS
+    step = len(text) // SAMPLE_WINDOWS
+    return ' '.join(text[i * step:i * step + window] for i in range(SAMPLE_WINDOWS))
+
+
+def _detect(text: str) -> LanguageResult:
+    counts = dict.fromkeys(SCRIPT_LANGUAGES, 0)
+    for match in SCRIPT_RUNS.finditer(_sample(text)):
+        counts[match.lastgroup] += match.end() - match.start()
+
+    total = sum(counts.values())
+    if not total:
+        return LanguageResult(DEFAULT_LANGUAGE, 0.0, {})
+
+    ratios = {script: count / total for script, count in counts.items() if count}
+    script = max(ratios, key=ratios.get)
+    # Japanese mixes kanji with kana; any real share of kana means Japanese
+    if script == 'han' and ratios.get('kana', 0) >= 0.1:
+        script = 'kana'
+
+    share = ratios[script]
+    if script == 'kana':
+        share += ratios.get('han', 0)
+    confidence = share * min(1.0, total / MIN_LETTERS)
+    return LanguageResult(SCRIPT_LANGUAGES[script], round(confidence, 4), ratios)
+
+
+def detect(text: str) -> LanguageResult:
+    """
+    Detect the dominant language of the text with per-script ratios and a
+    confidence score in [0, 1].
+    """
+    # A digest rather than hash(text), so two texts can't share an entry;
+    # keying on the text itself would keep up to CACHE_SIZE inputs alive
+    key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+            return result
+
+    result = _detect(text)
+    with _cache_lock:
+        _cache[key] = result
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def detect_language(text: str) -> str:
+    """
+    Detect the primary language of the input text.
+    Falls back to English when the text has no letters.
+    """
+    return detect(text).language
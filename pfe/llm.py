@@ -0,0 +1,253 @@
+"""
+Shared Gemini client layer.
+
+Every model call in the project goes through generate() / agenerate():
+- the API key is configured once per process,
+- GenerativeModel instances are built once per model name and reused (the
+  underlying gRPC channels are shared by the google client),
+- each call gets the GEMINI_TIMEOUT deadline,
+- calls go through the rate limiter (pfe/rate_limit.py): they queue for a
+  token and a concurrency slot, and 429s are retried with backoff until the
+  queue deadline, after which RateLimited is raised; a stream keeps its
+  slot until it is exhausted, fails or is cancelled, and a 429 raised
+  before its first chunk is retried like any other,
+- calls are counted and timed per model, with retries and token usage
+  (stats()), and timed as the 'model' stage of the request (pfe/tracing.py);
+  a stream is counted when it ends, with the token usage of its last chunk.
+
+warm_up() opens the connection in the background at startup so the first
+request doesn't pay for channel setup; it is called from pfe/wsgi.py and
+pfe/asgi.py.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from typing import Dict, Iterable, Iterator, Optional
+
+import google.generativeai as genai
+from django.conf import settings
+from dotenv import load_dotenv
+
+from . import tracing
+from .rate_limit import RateLimited, get_limiter, is_rate_limit_error
+
+logger = logging.getLogger(__name__)
+
+_configured = False
+_models: Dict[str, genai.GenerativeModel] = {}
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {'calls': 0, 'errors': 0, 'retries': 0, 'prompt_tokens': 0, 'output_tokens': 0,
+                              'seconds': 0.0})
+
+
+def configure() -> None:
+    """Load the API key from the environment and configure the client once."""
+    global _configured
+    if _configured:
+        return
+    with _lock:
+        if not _configured:
+            load_dotenv()
+            genai.configure(api_key=os.getenv('GEMINI_API'))
+            _configured = True
+
+
+def get_model(model_name: str) -> genai.GenerativeModel:
+    """Return the process-wide model instance for model_name."""
+    model = _models.get(model_name)
+    if model is None:
+        configure()
+        with _lock:
+            model = _models.get(model_name)
+            if model is None:
+                model = _models[model_name] = genai.GenerativeModel(model_name)
+    return model
+
+
+def _request_options(timeout: Optional[float]) -> Dict:
+    return {'timeout': timeout if timeout is not None else settings.GEMINI_TIMEOUT}
+
+
+def _record(model_name: str, start: float, failed: bool, usage=None) -> None:
+    with _lock:
+        entry = _stats[model_name]
+        entry['calls'] += 1
+        entry['errors'] += int(failed)
+        entry['seconds'] += time.perf_counter() - start
+        if usage is not None:
+            entry['prompt_tokens'] += getattr(usage, 'prompt_token_count', 0) or 0
+            entry['output_tokens'] += getattr(usage, 'candidates_token_count', 0) or 0
+
+
+def _record_retry(model_name: str) -> None:
+    with _lock:
+        _stats[model_name]['retries'] += 1
+
+
+class Stream:
+    """
+    Chunks of a streamed response. Holds the limiter slot of the call until
+    the chunks are exhausted, iteration fails or the stream is cancelled (or
+    the iterator is closed or garbage collected); the call is recorded then,
+    with the usage metadata of the last chunk that had any.
+    """
+
+    _END = object()
+
+    def __init__(self, response, chunks: Iterator, first, slot: ExitStack, model_name: str, start: float):
+        self._response = response
+        self._chunks = chunks
+        self._first = first
+        self._slot = slot
+        self._model_name = model_name
+        self._start = start
+        self._usage = None
+        self._recorded = False
+
+    def __iter__(self):
+        failed = False
+        try:
+            if self._first is self._END:
+                return
+            for chunk in itertools.chain([self._first], self._chunks):
+                self._usage = getattr(chunk, 'usage_metadata', None) or self._usage
+                yield chunk
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.close(failed)
+
+    def cancel(self) -> None:
+        cancel_stream(self._response)
+        self.close()
+
+    def close(self, failed: bool = False) -> None:
+        if not self._recorded:
+            self._recorded = True
+            _record(self._model_name, self._start, failed, self._usage)
+        self._slot.close()
+
+    __del__ = close
+
+
+def generate(model_name: str, prompt, stream: bool = False, timeout: Optional[float] = None, **kwargs):
+    """
+    Call generate_content on the shared model. With stream=True the
+    response is a Stream of chunks, which can be cancelled with
+    cancel_stream().
+    """
+    with tracing.span('model'):
+        return _generate(model_name, prompt, stream, timeout, **kwargs)
+
+
+def _generate(model_name: str, prompt, stream: bool, timeout: Optional[float], **kwargs):
+    limiter = get_limiter()
+    deadline = limiter.deadline()
+    attempt = 0
+    while True:
+        with ExitStack() as slot:
+            slot.enter_context(limiter.slot(deadline))
+            start = time.perf_counter()
+            try:
+                response = get_model(model_name).generate_content(
+                    prompt, stream=stream, request_options=_request_options(timeout), **kwargs
+                )
+                if stream:
+                    # Errors the model reports before producing output surface
+                    # on the first chunk; they are retried like the others
+                    chunks = iter(response)
+                    first = next(chunks, Stream._END)
+            except Exception as e:
+                _record(model_name, start, failed=True)
+                if not is_rate_limit_error(e):
+                    raise
+                delay = limiter.backoff(e, attempt)
+                if time.monotonic() + delay > deadline:
+                    raise RateLimited(delay) from e
+                _record_retry(model_name)
+            else:
+                limiter.success()
+                if not stream:
+                    _record(model_name, start, failed=False, usage=getattr(response, 'usage_metadata', None))
+                    return response
+                # The stream takes over the slot and is recorded when it ends
+                return Stream(response, chunks, first, slot.pop_all(), model_name, start)
+        attempt += 1
+
+
+async def agenerate(model_name: str, prompt, timeout: Optional[float] = None, **kwargs):
+    """Async variant of generate() using the google client's async transport."""
+    with tracing.span('model'):
+        return await _agenerate(model_name, prompt, timeout, **kwargs)
+
+
+async def _agenerate(model_name: str, prompt, timeout: Optional[float], **kwargs):
+    limiter = get_limiter()
+    deadline = limiter.deadline()
+    attempt = 0
+    while True:
+        async with limiter.aslot(deadline):
+            start = time.perf_counter()
+            try:
+                response = await get_model(model_name).generate_content_async(
+                    prompt, request_options=_request_options(timeout), **kwargs
+                )
+            except Exception as e:
+                _record(model_name, start, failed=True)
+                if not is_rate_limit_error(e):
+                    raise
+                delay = limiter.backoff(e, attempt)
+                if time.monotonic() + delay > deadline:
+                    raise RateLimited(delay) from e
+                _record_retry(model_name)
+            else:
+                _record(model_name, start, failed=False, usage=getattr(response, 'usage_metadata', None))
+                limiter.success()
+                return response
+        attempt += 1
+
+
+def cancel_stream(response) -> None:
+    """
+    Cancel a streamed generation that is no longer needed, so the model stops
+    producing output tokens. Streams without a cancel() are left to finish.
+    """
+    if isinstance(response, Stream):
+        response.cancel()
+        return
+    cancel = getattr(getattr(response, '_iterator', response), 'cancel', None)
+    if callable(cancel):
+        cancel()
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    """Per-model calls, errors, retries, token counts and total seconds for this process."""
+    with _lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
+
+
+def warm_up(model_names: Optional[Iterable[str]] = None) -> threading.Thread:
+    """
+    Build the model instances and open the connection in a background thread.
+    Failures are only logged: a cold first request is still served.
+    """
+    names = list(model_names or settings.GEMINI_MODELS)
+
+    def run():
+        try:
+            for name in names:
+                model = get_model(name)
+            # One cheap call to establish the shared channel
+            if names and os.getenv('GEMINI_API'):
+                model.count_tokens('ping', request_options=_request_options(settings.GEMINI_WARM_UP_TIMEOUT))
+        except Exception as e:
+            logger.info('Gemini warm-up failed: %s', e)
+
+    thread = threading.Thread(target=run, name='gemini-warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,145 @@
+"""
+Map-reduce generation for long inputs such as YouTube transcripts.
+
+Text over LONG_INPUT_THRESHOLD_TOKENS is split into sentence-aligned chunks
+of at most LONG_INPUT_CHUNK_TOKENS, each chunk is sent to the model in
+parallel (LONG_INPUT_MAX_WORKERS at a time), and the per-chunk results are
+merged with near-identical questions removed.
+"""
+import asyncio
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+# Sentence ends: Latin/Arabic punctuation followed by whitespace, or CJK
+# full stops, which are usually not followed by a space
+SENTENCE_END = re.compile(r'(?<=[.!?\u061f])\s+|(?<=[\u3002\uff01\uff1f])')
+CJK_CHAR = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+NON_WORD = re.compile(r'[\W_]+')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count: one per CJK character, about four characters per
+    token for everything else.
+    """
+    cjk = len(CJK_CHAR.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_END.split(text) if s and s.strip()]
+
+
+def _split_long(sentence: str, max_tokens: int) -> List[str]:
+    # Fallback for a single "sentence" over budget (transcripts often have no
+    # punctuation at all): cut on word boundaries, or characters for CJK
+    pieces = sentence.split() if ' ' in sentence else list(sentence)
+    joiner = ' ' if ' ' in sentence else ''
+    parts, current, current_tokens = [], [], 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        if current and current_tokens + tokens > max_tokens:
+            parts.append(joiner.join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        parts.append(joiner.join(current))
+    return parts
+
+
+def chunk_text(text: str, max_tokens: Optional[int] = None) -> List[str]:
+    """
+    Split text into chunks of whole sentences within the token budget.
+    """
+    max_tokens = max_tokens or settings.LONG_INPUT_CHUNK_TOKENS
+    chunks, current, current_tokens = [], [], 0
+    for sentence in split_sentences(text):
+        tokens = estimate_tokens(sentence)
+        pieces = _split_long(sentence, max_tokens) if tokens > max_tokens else [sentence]
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def is_long(text: str) -> bool:
+    return estimate_tokens(text) > settings.LONG_INPUT_THRESHOLD_TOKENS
+
+
+def question_key(item: Dict[str, str]) -> str:
+    """Normalized question text used to drop duplicates across chunks."""
+    return NON_WORD.sub(' ', item['question'].casefold()).strip()
+
+
+def map_reduce(text: str, generate: Callable[[str], List[Dict]],
+               max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    Run generate() on every chunk of text in parallel and merge the results
+    in chunk order, keeping the first occurrence of each question.
+    """
+    chunks = chunk_text(text)
+    max_workers = max_workers or settings.LONG_INPUT_MAX_WORKERS
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)) or 1,
+                            thread_name_prefix='chunk') as executor:
+        # Each chunk runs in a copy of the caller's context, so its spans join the request trace
+        futures = [executor.submit(contextvars.copy_context().run, generate, chunk) for chunk in chunks]
+        results = [future.result() for future in futures]
+    return merge_results(results)
+
+
+async def amap_reduce(text: str, agenerate: Callable[[str], Awaitable[List[Dict]]],
+                      max_workers: Optional[int] = None) -> List[Dict]:
+    """Async variant of map_reduce(): at most max_workers chunks are awaited at a time."""
+    semaphore = asyncio.Semaphore(max_workers or settings.LONG_INPUT_MAX_WORKERS)
+
+    async def run(chunk):
+        async with semaphore:
+            return await agenerate(chunk)
+
+    return merge_results(await asyncio.gather(*(run(chunk) for chunk in chunk_text(text))))
+
+
+def merge_results(results: List[List[Dict]]) -> List[Dict]:
+    """Concatenate per-chunk results, keeping the first occurrence of each question."""
+    merged, seen = [], set()
+    for items in results:
+        for item in items:
+            key = question_key(item)
+            if key and key not in seen:
+                seen.add(key)
+                merged.append(item)
+    return merged
+
+
+def resolve_input_text(data) -> str:
+    """
+    Return the request's input_text, or the stored transcript text when a
+    transcript_id is given instead. Raises ValueError for an id that is not
+    an integer and Youtube.DoesNotExist for an unknown one.
+    """
+    transcript_id = data.get('transcript_id')
+    if transcript_id and not data.get('input_text'):
+        from youtube.models import Youtube
+        try:
+            transcript_id = int(transcript_id)
+        except (TypeError, ValueError):
+            raise ValueError('transcript_id must be an integer')
+        return Youtube.objects.values_list('text', flat=True).get(pk=transcript_id)
+    return data.get('input_text')
+
+
+async def aresolve_input_text(data) -> str:
+    """Async variant of resolve_input_text()."""
+    return await sync_to_async(resolve_input_text)(data)
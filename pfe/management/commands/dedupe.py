@@ -0,0 +1,110 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from pfe.fingerprint import BAND_FIELDS, Fingerprinted, LSHIndex, shingles
+
+
+class Command(BaseCommand):
+    help = ('Fingerprint stored cards and quizzes and delete near-duplicate questions, '
+            'keeping the oldest row of each group. Deck and quiz set memberships of '
+            'deleted rows move to the kept row.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*',
+                            help='Models to process as app_label.Model (default: cards.Card and quiz.Quiz).')
+        parser.add_argument('--similarity', type=float, default=getattr(settings, 'DEDUP_MIN_SIMILARITY', 0.8),
+                            help='Minimum trigram similarity (0-1) for two questions to be duplicates.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the duplicates without deleting them.')
+
+    def handle(self, *args, **options):
+        for model in self.get_models(options['models']):
+            label = model._meta.label
+            filled = self.backfill(model, options['batch_size'])
+            duplicates = self.find_duplicates(model, options['similarity'], options['batch_size'])
+            if not options['dry_run']:
+                self.delete(model, duplicates, options['batch_size'])
+            action = 'would delete' if options['dry_run'] else 'deleted'
+            self.stdout.write(f'{label}: fingerprinted {filled} row(s), {action} {len(duplicates)} duplicate(s)')
+
+    def get_models(self, labels):
+        if not labels:
+            return [m for m in apps.get_models() if issubclass(m, Fingerprinted)]
+        models = []
+        for label in labels:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError(f'Unknown model {label!r}')
+            if not issubclass(model, Fingerprinted):
+                raise CommandError(f'{label} has no fingerprints')
+            models.append(model)
+        return models
+
+    def backfill(self, model, batch_size):
+        """Compute fingerprints for rows stored before they existed."""
+        filled = 0
+        while True:
+            rows = list(model.objects.filter(fp_band0=None).order_by('pk')[:batch_size])
+            if not rows:
+                return filled
+            for row in rows:
+                row.set_fingerprint()
+            model.objects.bulk_update(rows, BAND_FIELDS)
+            filled += len(rows)
+
+    def find_duplicates(self, model, min_similarity, batch_size):
+        """Map the pk of each duplicate to the pk of the row it duplicates."""
+        index = LSHIndex(min_similarity)
+        duplicates = {}
+        rows = model.objects.order_by('pk').values_list('pk', model.FINGERPRINT_FIELD, *BAND_FIELDS)
+        for pk, text, *bands in rows.iterator(chunk_size=batch_size):
+            grams = shingles(text or '')
+            keeper = index.query(grams, bands)
+            if keeper is not None:
+                duplicates[pk] = keeper
+            else:
+                index.add(grams, bands, pk)
+        return duplicates
+
+    def delete(self, model, duplicates, batch_size):
+        pks = list(duplicates)
+        for start in range(0, len(pks), batch_size):
+            batch = {pk: duplicates[pk] for pk in pks[start:start + batch_size]}
+            with transaction.atomic():
+                self.move_memberships(model, batch)
+                model.objects.filter(pk__in=batch).delete()
+
+    def move_memberships(self, model, keepers):
+        """
+        Point the many-to-many links of duplicates (deck cards, quiz set
+        questions) at their kept rows. A link the kept row already has is
+        deleted instead.
+        """
+        for relation in model._meta.related_objects:
+            if not relation.many_to_many:
+                continue
+            through = relation.through
+            member = through._meta.get_field(relation.field.m2m_reverse_field_name()).attname
+            owner = through._meta.get_field(relation.field.m2m_field_name()).attname
+            links = list(through.objects
+                         .filter(**{f'{member}__in': [*keepers, *set(keepers.values())]})
+                         .order_by('pk')
+                         .values_list('pk', owner, member))
+            existing = {(owner_id, member_id) for _, owner_id, member_id in links if member_id not in keepers}
+            moved, redundant = {}, []
+            for pk, owner_id, member_id in links:
+                if member_id not in keepers:
+                    continue
+                target = (owner_id, keepers[member_id])
+                if target in existing:
+                    redundant.append(pk)
+                else:
+                    existing.add(target)
+                    moved.setdefault(keepers[member_id], []).append(pk)
+            through.objects.filter(pk__in=redundant).delete()
+            for keeper, link_pks in moved.items():
+                through.objects.filter(pk__in=link_pks).update(**{member: keeper})
@@ -0,0 +1,101 @@
+"""
+Prompt template registry.
+
+Templates are registered once at import time (see cards/prompts.py,
+quiz/prompts.py and mermiad/prompts.py). Rendering a template fills in the
+customization placeholders in a single regex pass and splits the result
+around {input_text}; the rendered prefix/suffix pair is memoized per
+(template, language, customizations) in an LRU cache. The user's text is
+then joined in by concatenation, so braces in it (or in customization
+values) are never interpreted as placeholders.
+"""
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+INPUT_FIELD = 'input_text'
+
+
+class RenderedPrompt(NamedTuple):
+    head: str
+    tail: str
+
+    def build(self, input_text: str) -> str:
+        return self.head + input_text + self.tail
+
+
+class PromptRegistry:
+    def __init__(self, cache_size: int = 256):
+        self._templates: Dict[str, Dict[str, str]] = {}
+        self._defaults: Dict[str, Dict[str, str]] = {}
+        self._fallbacks: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._render_count = 0
+        self._render_seconds = 0.0
+        self._render_cached = lru_cache(maxsize=cache_size)(self._render)
+
+    def register(self, name: str, templates: Dict[str, str], defaults: Optional[Dict] = None,
+                 fallback_language: str = 'english') -> None:
+        """
+        Register the per-language templates for a prompt. Languages without a
+        template use fallback_language.
+        """
+        if fallback_language not in templates:
+            raise ValueError(f'{name}: no template for fallback language {fallback_language!r}')
+        self._templates[name] = dict(templates)
+        self._defaults[name] = {k: str(v) for k, v in (defaults or {}).items()}
+        self._fallbacks[name] = fallback_language
+        self._render_cached.cache_clear()
+
+    def render(self, name: str, language: str, customizations: Optional[Dict] = None) -> RenderedPrompt:
+        """
+        Return the template with customizations applied, split around {input_text}.
+        """
+        templates = self._templates[name]
+        if language not in templates:
+            language = self._fallbacks[name]
+        # str() matches what str.format would have produced and makes values hashable
+        options = tuple(sorted((k, str(v)) for k, v in (customizations or {}).items() if v is not None))
+        return self._render_cached(name, language, options)
+
+    def build(self, name: str, language: str, input_text: str, customizations: Optional[Dict] = None) -> str:
+        """Return the complete prompt for the input text."""
+        return self.render(name, language, customizations).build(input_text)
+
+    def _render(self, name: str, language: str, options) -> RenderedPrompt:
+        start = time.perf_counter()
+        values = {**self._defaults[name], **dict(options)}
+        template = self._templates[name][language]
+
+        def substitute(match):
+            field = match.group(1)
+            if field == INPUT_FIELD:
+                return match.group(0)
+            return values.get(field, match.group(0))
+
+        # Split first so a customization value can't introduce a second {input_text}
+        head, _, tail = template.partition('{' + INPUT_FIELD + '}')
+        head = PLACEHOLDER.sub(substitute, head)
+        tail = PLACEHOLDER.sub(substitute, tail)
+        with self._lock:
+            self._render_count += 1
+            self._render_seconds += time.perf_counter() - start
+        return RenderedPrompt(head, tail)
+
+    def stats(self) -> Dict[str, float]:
+        """Render counters: cache hits/misses and total time spent rendering."""
+        info = self._render_cached.cache_info()
+        with self._lock:
+            return {
+                'hits': info.hits,
+                'misses': info.misses,
+                'cached': info.currsize,
+                'renders': self._render_count,
+                'render_seconds': self._render_seconds,
+            }
+
+
+registry = PromptRegistry()
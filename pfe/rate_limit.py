@@ -0,0 +1,234 @@
+"""
+Rate limiting for upstream model calls (used by pfe/llm.py).
+
+Limiter combines:
+- a token bucket refilled at GEMINI_RATE_LIMIT calls/second, holding up to
+  GEMINI_RATE_BURST tokens,
+- a semaphore bounding in-flight calls per process (GEMINI_MAX_CONCURRENCY),
+- adaptive backoff: a 429 halves the bucket's rate and pauses every caller
+  for the server's retry delay; each success recovers the rate a little.
+
+Callers wait in line until a deadline (GEMINI_QUEUE_TIMEOUT) instead of
+failing; RateLimited is raised once the deadline can't be met, so views can
+answer 429 with Retry-After instead of a generic 500.
+
+Bucket state is per process by default. With GEMINI_RATE_LIMIT_BACKEND =
+'file' it lives in a small JSON file guarded by flock
+(GEMINI_RATE_LIMIT_FILE), so every worker process on the host shares one
+budget and one backoff. The concurrency limit always stays per process.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+
+# Gemini puts the suggested delay in the error details, e.g. "retry_delay { seconds: 17 }"
+RETRY_DELAY = re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)')
+# Fraction of the configured rate recovered per successful call
+RECOVERY_STEP = 0.05
+MIN_RATE_FRACTION = 0.05
+
+
+class RateLimited(Exception):
+    """The call could not be made before its deadline."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f'Model rate limit reached, retry in {self.retry_after}s')
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for quota errors (HTTP 429 / RESOURCE_EXHAUSTED) from the google client."""
+    return getattr(error, 'code', None) == 429
+
+
+class LocalState:
+    """Bucket state shared by the threads of one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Dict = {}
+
+    def update(self, func: Callable[[Dict], float]) -> float:
+        with self._lock:
+            return func(self._state)
+
+
+class FileState:
+    """Bucket state shared by every process on the host through a locked file."""
+
+    def __init__(self, path: str):
+        import fcntl
+        self._fcntl = fcntl
+        self._path = path
+        self._lock = threading.Lock()
+
+    def update(self, func: Callable[[Dict], float]) -> float:
+        with self._lock, open(self._path, 'a+') as f:
+            self._fcntl.flock(f, self._fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = {}
+                result = func(state)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                return result
+            finally:
+                self._fcntl.flock(f, self._fcntl.LOCK_UN)
+
+
+class Limiter:
+    def __init__(self, rate: float, burst: int, concurrency: int, queue_timeout: float,
+                 backoff_base: float, backoff_max: float, state=None):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.queue_timeout = queue_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._state = state or LocalState()
+        self._slots = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+
+    def deadline(self, timeout: Optional[float] = None) -> float:
+        return time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+
+    # Bucket
+
+    def _init(self, state: Dict, now: float) -> None:
+        if 'updated' not in state:
+            state.update(tokens=float(self.burst), updated=now, rate=self.rate, paused_until=0.0)
+
+    def _take(self, state: Dict) -> float:
+        """Take a token; returns 0, or how long to wait before trying again."""
+        now = time.time()
+        self._init(state, now)
+        if now < state['paused_until']:
+            return state['paused_until'] - now
+        if self.rate <= 0:
+            return 0.0
+        rate = state['rate']
+        tokens = min(self.burst, state['tokens'] + (now - state['updated']) * rate)
+        state['updated'] = now
+        if tokens >= 1:
+            state['tokens'] = tokens - 1
+            return 0.0
+        state['tokens'] = tokens
+        return (1 - tokens) / rate
+
+    def try_take(self) -> float:
+        return self._state.update(self._take)
+
+    def success(self) -> None:
+        """Recover part of the rate after a successful call."""
+        if self.rate <= 0:
+            return
+
+        def recover(state):
+            self._init(state, time.time())
+            state['rate'] = min(self.rate, state['rate'] + self.rate * RECOVERY_STEP)
+            return 0.0
+
+        self._state.update(recover)
+
+    def backoff(self, error: Exception, attempt: int) -> float:
+        """
+        Halve the rate and pause all callers after a 429. Returns the pause
+        in seconds: the server's retry delay if given, else exponential.
+        """
+        match = RETRY_DELAY.search(str(error))
+        if match:
+            delay = float(match.group(1))
+        else:
+            delay = self.backoff_base * 2 ** attempt
+        delay = min(delay, self.backoff_max)
+
+        def slow_down(state):
+            now = time.time()
+            self._init(state, now)
+            state['rate'] = max(self.rate * MIN_RATE_FRACTION, state['rate'] / 2)
+            state['tokens'] = min(state['tokens'], 0.0)
+            state['paused_until'] = max(state['paused_until'], now + delay)
+            # No refill while paused
+            state['updated'] = max(state['updated'], state['paused_until'])
+            return delay
+
+        return self._state.update(slow_down)
+
+    # Waiting
+
+    @contextmanager
+    def slot(self, deadline: float):
+        """Wait for a token and a free concurrency slot, or raise RateLimited."""
+        while True:
+            wait = self.try_take()
+            if not wait:
+                break
+            if time.monotonic() + wait > deadline:
+                raise RateLimited(wait)
+            time.sleep(wait)
+
+        if self._slots is not None:
+            if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise RateLimited(1)
+        try:
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    @asynccontextmanager
+    async def aslot(self, deadline: float):
+        """Async variant of slot(); waits without blocking the event loop."""
+        while True:
+            wait = self.try_take()
+            if not wait:
+                break
+            if time.monotonic() + wait > deadline:
+                raise RateLimited(wait)
+            await asyncio.sleep(wait)
+
+        if self._slots is not None:
+            poll = 0.005
+            while not self._slots.acquire(blocking=False):
+                if time.monotonic() + poll > deadline:
+                    raise RateLimited(1)
+                await asyncio.sleep(poll)
+                poll = min(poll * 2, 0.1)
+        try:
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> Limiter:
+    """Return the process-wide limiter configured from settings."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                state = None
+                if settings.GEMINI_RATE_LIMIT_BACKEND == 'file':
+                    state = FileState(settings.GEMINI_RATE_LIMIT_FILE)
+                _limiter = Limiter(
+                    rate=settings.GEMINI_RATE_LIMIT,
+                    burst=settings.GEMINI_RATE_BURST,
+                    concurrency=settings.GEMINI_MAX_CONCURRENCY,
+                    queue_timeout=settings.GEMINI_QUEUE_TIMEOUT,
+                    backoff_base=settings.GEMINI_BACKOFF_BASE,
+                    backoff_max=settings.GEMINI_BACKOFF_MAX,
+                    state=state,
+                )
+    return _limiter
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,11 +32,16 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'pfe',
     'rest_framework',
     'cards',
     'quiz',
     'mermiad',
     'youtube',
+    'jobs',
+    'search',
+    'sources',
+    'study',
     'corsheaders',
     'django.contrib.admin',
     'django.contrib.auth',
@@ -46,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'pfe.tracing.TracingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -75,17 +82,226 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'pfe.wsgi.application'
+ASGI_APPLICATION = 'pfe.asgi.application'
+
+# Threads available to async views for blocking calls (see pfe/async_utils.py)
+BLOCKING_EXECUTOR_MAX_WORKERS = int(os.getenv('BLOCKING_EXECUTOR_MAX_WORKERS', 32))
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+#
+# DB_ENGINE selects 'sqlite' (default) or 'postgresql' (needs psycopg 3).
+# SQLite runs in WAL mode so readers don't block the writer, starts write
+# transactions with BEGIN IMMEDIATE so concurrent writers queue on
+# DB_BUSY_TIMEOUT instead of failing with "database is locked", and syncs
+# to disk at checkpoints only (synchronous=NORMAL, safe in WAL mode).
+# DB_SQLITE_JOURNAL_MODE, DB_SQLITE_SYNCHRONOUS and DB_SQLITE_TRANSACTION_MODE
+# override these. PostgreSQL connections are kept for DB_CONN_MAX_AGE seconds
+# and checked before reuse (DB_CONN_HEALTH_CHECKS), or taken from a psycopg
+# pool with DB_POOL=1.
+
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DB_POOL = os.getenv('DB_POOL', '') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'pfe'),
+            'USER': os.getenv('DB_USER', 'pfe'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # Pooled connections are returned to the pool after each request
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1',
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 20)),
+                    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'timeout': float(os.getenv('DB_BUSY_TIMEOUT', 20)),
+                'transaction_mode': os.getenv('DB_SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+                'init_command': (f"PRAGMA journal_mode={os.getenv('DB_SQLITE_JOURNAL_MODE', 'WAL')}; "
+                                 f"PRAGMA synchronous={os.getenv('DB_SQLITE_SYNCHRONOUS', 'NORMAL')}"),
+            },
+        }
+    }
 
-DATABASES = {
+
+# Gemini client (pfe/llm.py)
+
+GEMINI_MODELS = os.getenv('GEMINI_MODELS', 'gemini-1.5-flash,gemini-1.5-pro').split(',')
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', 60))
+# Warm-up runs when pfe/wsgi.py or pfe/asgi.py is loaded (runserver included)
+GEMINI_WARM_UP = os.getenv('GEMINI_WARM_UP', '1') == '1'
+GEMINI_WARM_UP_TIMEOUT = float(os.getenv('GEMINI_WARM_UP_TIMEOUT', 10))
+# Ask for JSON output with a response schema for cards and quizzes
+# (pfe/structured.py); the text parsers remain the fallback
+STRUCTURED_OUTPUT = os.getenv('STRUCTURED_OUTPUT', '1') == '1'
+
+# Per-stage request timing (pfe/tracing.py): spans feed the Server-Timing
+# header and the histograms on /metrics. The counters on /metrics are kept
+# either way.
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', '') == '1'
+
+# Upstream rate limiting (pfe/rate_limit.py). GEMINI_RATE_LIMIT is in calls
+# per second (0 disables the bucket); callers queue for up to
+# GEMINI_QUEUE_TIMEOUT seconds. Set GEMINI_RATE_LIMIT_BACKEND to 'file' to
+# share the budget between the worker processes of one host.
+GEMINI_RATE_LIMIT = float(os.getenv('GEMINI_RATE_LIMIT', 5))
+GEMINI_RATE_BURST = int(os.getenv('GEMINI_RATE_BURST', 10))
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', 8))
+GEMINI_QUEUE_TIMEOUT = float(os.getenv('GEMINI_QUEUE_TIMEOUT', 30))
+GEMINI_BACKOFF_BASE = float(os.getenv('GEMINI_BACKOFF_BASE', 1.0))
+GEMINI_BACKOFF_MAX = float(os.getenv('GEMINI_BACKOFF_MAX', 60.0))
+GEMINI_RATE_LIMIT_BACKEND = os.getenv('GEMINI_RATE_LIMIT_BACKEND', 'local')
+GEMINI_RATE_LIMIT_FILE = os.getenv('GEMINI_RATE_LIMIT_FILE', str(BASE_DIR / '.gemini_rate_limit.json'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# The 'generation' cache stores model outputs keyed on a hash of the request
+# (see pfe/generation_cache.py). Point GENERATION_CACHE_BACKEND at Redis or
+# Memcached to share it between processes.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'generation': {
+        'BACKEND': os.getenv('GENERATION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('GENERATION_CACHE_LOCATION', 'generation'),
+        'TIMEOUT': int(os.getenv('GENERATION_CACHE_TTL', 60 * 60 * 24)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('GENERATION_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+}
+
+GENERATION_CACHE_ALIAS = 'generation'
+GENERATION_CACHE_MAX_ITEM_BYTES = int(os.getenv('GENERATION_CACHE_MAX_ITEM_BYTES', 512 * 1024))
+
+
+# Generated rows are bulk inserted (pfe/batch_writer.py). With
+# BATCH_WRITES_ENABLED, concurrent requests share one writer thread that
+# commits their inserts together; a request waits at most
+# BATCH_WRITES_TIMEOUT seconds for its batch to commit.
+
+BATCH_WRITES_ENABLED = os.getenv('BATCH_WRITES_ENABLED', '') == '1'
+BATCH_WRITES_MAX_SIZE = int(os.getenv('BATCH_WRITES_MAX_SIZE', 500))
+BATCH_WRITES_MAX_DELAY = float(os.getenv('BATCH_WRITES_MAX_DELAY', 0.01))
+BATCH_WRITES_TIMEOUT = float(os.getenv('BATCH_WRITES_TIMEOUT', 30))
+
+
+# Long inputs (pfe/long_input.py): texts over the threshold are split into
+# sentence-aligned chunks that are generated in parallel and merged.
+
+LONG_INPUT_THRESHOLD_TOKENS = int(os.getenv('LONG_INPUT_THRESHOLD_TOKENS', 6000))
+LONG_INPUT_CHUNK_TOKENS = int(os.getenv('LONG_INPUT_CHUNK_TOKENS', 3000))
+LONG_INPUT_MAX_WORKERS = int(os.getenv('LONG_INPUT_MAX_WORKERS', 4))
+
+
+# Batch endpoints (pfe/batching.py). With packing, short items are combined
+# into one model call of at most BATCH_PACK_MAX_ITEMS items / tokens.
+
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 500))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', 8))
+BATCH_PACK_MAX_ITEMS = int(os.getenv('BATCH_PACK_MAX_ITEMS', 10))
+BATCH_PACK_MAX_TOKENS = int(os.getenv('BATCH_PACK_MAX_TOKENS', 4000))
+BATCH_PACK_MAX_ITEM_TOKENS = int(os.getenv('BATCH_PACK_MAX_ITEM_TOKENS', 1000))
+
+
+# Near-duplicate questions (pfe/fingerprint.py): 'merge' returns the stored
+# row instead of inserting a new one, 'skip' drops the new row, 'off' keeps
+# both. Similarity is the Jaccard index of the questions' trigrams.
+DEDUP_MODE = os.getenv('DEDUP_MODE', 'merge')
+DEDUP_MIN_SIMILARITY = float(os.getenv('DEDUP_MIN_SIMILARITY', 0.8))
+
+
+# Stored YouTube transcripts are reused for this many seconds before being
+# fetched again (0 = never refetch)
+
+YOUTUBE_TRANSCRIPT_MAX_AGE = int(os.getenv('YOUTUBE_TRANSCRIPT_MAX_AGE', 7 * 24 * 60 * 60)) or None
+
+# Transcript languages tried in order when a request doesn't name any
+YOUTUBE_TRANSCRIPT_LANGUAGES = os.getenv('YOUTUBE_TRANSCRIPT_LANGUAGES', 'en').split(',')
+
+
+# Bulk captions (youtube.views.get_captions_bulk): transcripts are fetched
+# YOUTUBE_BULK_CONCURRENCY at a time, each given up after
+# YOUTUBE_BULK_TIMEOUT seconds. A timed-out fetch keeps running on its
+# thread (the transcript client has no HTTP timeout), so the fetches get their
+# own pool of YOUTUBE_BULK_MAX_WORKERS threads. Playlists are listed with the
+# YouTube Data API, which needs YOUTUBE_API_KEY.
+YOUTUBE_BULK_MAX_VIDEOS = int(os.getenv('YOUTUBE_BULK_MAX_VIDEOS', 200))
+YOUTUBE_BULK_CONCURRENCY = int(os.getenv('YOUTUBE_BULK_CONCURRENCY', 8))
+YOUTUBE_BULK_TIMEOUT = float(os.getenv('YOUTUBE_BULK_TIMEOUT', 20))
+YOUTUBE_BULK_MAX_WORKERS = int(os.getenv('YOUTUBE_BULK_MAX_WORKERS', 32))
+YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY', '')
+
+
+# Quiz listing (quiz.views.get_quizes): pages of QUIZ_PAGE_SIZE rows when a
+# cursor or limit is given, otherwise every row, streamed
+
+QUIZ_PAGE_SIZE = int(os.getenv('QUIZ_PAGE_SIZE', 100))
+QUIZ_MAX_PAGE_SIZE = int(os.getenv('QUIZ_MAX_PAGE_SIZE', 1000))
+QUIZ_STREAM_CHUNK_SIZE = int(os.getenv('QUIZ_STREAM_CHUNK_SIZE', 2000))
+
+# Largest question count a client can ask quiz.views.create_quizes_stream for
+QUIZ_MAX_COUNT = int(os.getenv('QUIZ_MAX_COUNT', 30))
+
+
+# Diagrams that fail to parse are fixed locally first (mermiad/repair.py),
+# then sent back to the cheaper model at most this many times
+DIAGRAM_REPAIR_MODEL = os.getenv('DIAGRAM_REPAIR_MODEL', 'gemini-1.5-flash')
+DIAGRAM_REPAIR_ATTEMPTS = int(os.getenv('DIAGRAM_REPAIR_ATTEMPTS', 2))
+
+
+# Study packs (study app): cards, quiz and diagram from one model call. The
+# default is the flash model of the cards and quiz endpoints; set
+# gemini-1.5-pro to trade latency and cost for better diagrams.
+STUDY_PACK_MODEL = os.getenv('STUDY_PACK_MODEL', 'gemini-1.5-flash')
+
+
+# Full-text search (search app). SEARCH_BACKEND is a dotted path; empty
+# picks the FTS5 index on SQLite and unindexed filtering elsewhere. Queries
+# matching more than SEARCH_RANK_LIMIT rows are returned newest first
+# instead of ranked, to keep them fast.
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', '')
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 20))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv('SEARCH_MAX_PAGE_SIZE', 100))
+SEARCH_RANK_LIMIT = int(os.getenv('SEARCH_RANK_LIMIT', 5000))
+
+
+# Background jobs (jobs app). Run workers with `python manage.py run_jobs`.
+# JOBS_CONCURRENCY is the number of threads per job kind, as
+# "kind=count,kind=count". Every JOBS_REQUEUE_INTERVAL seconds a worker
+# requeues jobs left running for longer than JOBS_STALE_AFTER, so
+# JOBS_STALE_AFTER must exceed the longest job.
+
+JOBS_BACKEND = os.getenv('JOBS_BACKEND', 'jobs.backends.DatabaseBackend')
+JOBS_CONCURRENCY = {
+    kind.strip(): int(count)
+    for kind, count in (pair.split('=') for pair in
+                        os.getenv('JOBS_CONCURRENCY', 'cards=4,quiz=4,diagram=2,captions=8').split(','))
 }
+JOBS_RETRY_BASE_DELAY = float(os.getenv('JOBS_RETRY_BASE_DELAY', 5))
+JOBS_RETRY_MAX_DELAY = float(os.getenv('JOBS_RETRY_MAX_DELAY', 300))
+JOBS_STALE_AFTER = float(os.getenv('JOBS_STALE_AFTER', 900))
+JOBS_REQUEUE_INTERVAL = float(os.getenv('JOBS_REQUEUE_INTERVAL', 60))
 
 
 # Password validation
@@ -0,0 +1,139 @@
+"""
+JSON output mode for card and quiz generation (STRUCTURED_OUTPUT).
+
+generate_items() asks Gemini for application/json matching a response
+schema (an array of objects whose fields are all strings), decodes the
+answer with the C json decoder and keeps the items that have every field as
+a non-empty string. If the answer isn't JSON the caller's text parser is
+run on it instead, so the free-text formats keep working as a fallback; a
+JSON answer in which no item validates gives no items. With
+STRUCTURED_OUTPUT off the text parser is used directly.
+"""
+import json
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from . import llm, tracing
+
+JSON_INSTRUCTIONS = """
+
+        Ignore the output format described above. Answer with a JSON array
+        with one object per item, each object having exactly these string
+        fields: {fields}. Do not add markdown or any other text.
+        """
+
+Items = List[Dict[str, str]]
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _record(**counts) -> None:
+    with _stats_lock:
+        _stats.update(counts)
+
+
+def stats() -> Dict[str, int]:
+    """
+    Responses parsed as JSON / by the text fallback, and items kept / dropped
+    from JSON answers ('items', 'dropped') and by the text parsers
+    ('text_items', 'text_dropped').
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def record_text_items(kept: int, dropped: int) -> None:
+    """Count the items a text parser kept and the blocks it dropped."""
+    _record(text_items=kept, text_dropped=dropped)
+
+
+def response_schema(fields: Sequence[str]) -> Dict:
+    return {
+        'type': 'array',
+        'items': {
+            'type': 'object',
+            'properties': {name: {'type': 'string'} for name in fields},
+            'required': list(fields),
+        },
+    }
+
+
+def generation_config(fields: Sequence[str]) -> Dict:
+    return {'response_mime_type': 'application/json', 'response_schema': response_schema(fields)}
+
+
+def json_instructions(fields: Sequence[str]) -> str:
+    return JSON_INSTRUCTIONS.format(fields=', '.join(fields))
+
+
+def parse_items(text: str, fields: Sequence[str]) -> Optional[Items]:
+    """
+    Decode a JSON answer into validated items. Returns None if the text is
+    not JSON, and no items if it is JSON but not an array (or an object
+    wrapping one).
+    """
+    text = text.strip()
+    if text.startswith('```'):
+        # Some answers still come fenced
+        text = text.strip('`').removeprefix('json').strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        # e.g. {"cards": [...]}
+        lists = [value for value in data.values() if isinstance(value, list)]
+        data = lists[0] if len(lists) == 1 else None
+    if not isinstance(data, list):
+        _record(dropped=1)
+        return []
+
+    items = []
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        values = {name: entry.get(name) for name in fields}
+        if all(isinstance(value, str) and value.strip() for value in values.values()):
+            items.append({name: value.strip() for name, value in values.items()})
+    _record(items=len(items), dropped=len(data) - len(items))
+    return items
+
+
+def _parse(text: str, fields: Sequence[str], parse_text: Callable[[str], Items]) -> Items:
+    with tracing.span('parse'):
+        items = parse_items(text, fields)
+        if items is not None:
+            _record(json=1)
+            return items
+        # Only free text goes to the text parser: run on JSON it would make
+        # items out of the brackets
+        _record(text=1)
+        return parse_text(text)
+
+
+def generate_items(model_name: str, prompt: str, fields: Sequence[str],
+                   parse_text: Callable[[str], Items]) -> Tuple[str, Items]:
+    """Generate and parse items for prompt. Returns (raw text, items)."""
+    if not settings.STRUCTURED_OUTPUT:
+        response = llm.generate(model_name, prompt)
+        with tracing.span('parse'):
+            return response.text, parse_text(response.text)
+    response = llm.generate(model_name, prompt + json_instructions(fields),
+                            generation_config=generation_config(fields))
+    return response.text, _parse(response.text, fields, parse_text)
+
+
+async def agenerate_items(model_name: str, prompt: str, fields: Sequence[str],
+                          parse_text: Callable[[str], Items]) -> Tuple[str, Items]:
+    """Async variant of generate_items()."""
+    if not settings.STRUCTURED_OUTPUT:
+        response = await llm.agenerate(model_name, prompt)
+        with tracing.span('parse'):
+            return response.text, parse_text(response.text)
+    response = await llm.agenerate(model_name, prompt + json_instructions(fields),
+                                   generation_config=generation_config(fields))
+    return response.text, _parse(response.text, fields, parse_text)
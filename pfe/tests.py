@@ -0,0 +1,618 @@
+import io
+import os
+import runpy
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+from unittest import mock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from google.api_core import exceptions
+
+import cards.prompts, mermiad.prompts, quiz.prompts, study.prompts  # noqa: F401 (register the templates)
+from cards.models import Card, Deck
+from pfe import (batch_writer, batching, fingerprint, generation_cache, language, llm, long_input, prompts,
+                 structured, tracing)
+from pfe.rate_limit import FileState, Limiter, RateLimited
+from pfe.single_flight import SingleFlight
+from sources.models import Source
+
+
+class LanguageDetectionTests(SimpleTestCase):
+    def test_scripts(self):
+        self.assertEqual(language.detect_language('The cell membrane controls transport.'), 'english')
+        self.assertEqual(language.detect_language('تتحكم الخلية في نقل الجزيئات عبر الغشاء'), 'arabic')
+        self.assertEqual(language.detect_language('细胞膜控制分子的运输和信号传递'), 'chinese')
+        self.assertEqual(language.detect_language('細胞膜は分子の輸送を制御します'), 'japanese')
+        self.assertEqual(language.detect_language('세포막은 분자의 수송을 조절합니다'), 'korean')
+
+    def test_no_letters_falls_back_to_english(self):
+        result = language.detect('12345 !!! ...')
+        self.assertEqual(result.language, language.DEFAULT_LANGUAGE)
+        self.assertEqual(result.confidence, 0.0)
+
+    def test_dominant_script_wins_with_its_share_as_confidence(self):
+        result = language.detect('The transport protein is called ' + 'ناقل' + ' in Arabic and it moves ions')
+        self.assertEqual(result.language, 'english')
+        self.assertLess(result.confidence, 1.0)
+        self.assertGreater(result.confidence, 0.8)
+
+    def test_short_text_has_lower_confidence(self):
+        self.assertLess(language.detect('cell').confidence, language.detect('cell membrane protein energy').confidence)
+
+    def test_long_text_is_sampled(self):
+        text = 'membrane ' * (language.SAMPLE_CHARS // 4)
+        self.assertEqual(language.detect_language(text), 'english')
+
+    def test_cache_is_keyed_on_content(self):
+        english, arabic = 'osmosis and diffusion', 'التناضح والانتشار'
+        self.assertEqual(language.detect_language(english), 'english')
+        self.assertEqual(language.detect_language(arabic), 'arabic')
+        # Cached results still belong to their own text
+        self.assertEqual(language.detect_language(english), 'english')
+        self.assertEqual(language.detect_language(arabic), 'arabic')
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight, release, calls = SingleFlight(), threading.Event(), []
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do_shared('key', work))) for _ in range(4)]
+        threads[0].start()
+        time.sleep(0.05)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('result', False)] + [('result', True)] * 3)
+
+    def test_exception_is_shared_and_key_released(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: 'again'), 'again')
+
+
+class BatchingTests(SimpleTestCase):
+    def test_unpack_output_round_trip(self):
+        packed = batching.pack_inputs(['first text', 'second text', 'third text'])
+        self.assertEqual(batching.unpack_output(packed, 3), ['first text', 'second text', 'third text'])
+
+    def test_unpack_output_tolerates_markdown_and_skipped_items(self):
+        content = '**### ITEM 2 ###**\nsecond\n\n## item 1 ##\nfirst\n### ITEM 1 ###\nrepeated\n### ITEM 9 ###\nextra'
+        self.assertEqual(batching.unpack_output(content, 3), ['first', 'second', None])
+
+    @override_settings(BATCH_PACK_MAX_ITEMS=2, BATCH_PACK_MAX_TOKENS=4000, BATCH_PACK_MAX_ITEM_TOKENS=1000)
+    def test_plan_units_packs_small_items_per_group(self):
+        items = [
+            {'input_text': 'short a', 'group': 'x'},
+            {'input_text': 'short b', 'group': 'y'},
+            {'input_text': 'short c', 'group': 'x'},
+            {'input_text': 'word ' * 5000, 'group': 'x'},
+            {'input_text': 'short d', 'group': 'x'},
+        ]
+        group_key = lambda item: item['group']
+        self.assertEqual(batching.plan_units(items, group_key, pack=False), [[0], [1], [2], [3], [4]])
+        self.assertEqual(batching.plan_units(items, group_key, pack=True), [[0, 2], [1], [3], [4]])
+
+    def run_packed(self, generate_pack, generate_one):
+        items = [{'input_text': f'text {i}'} for i in range(3)]
+        return batching.run_batch(items, generate_one, generate_pack, group_key=lambda item: 0, pack=True)
+
+    def test_items_the_packed_answer_skipped_are_generated_alone(self):
+        calls = []
+
+        def generate_one(item):
+            calls.append(item['input_text'])
+            return ['alone']
+
+        results = self.run_packed(lambda pack: [['a'], None, ['c']], generate_one)
+        self.assertEqual(results, [{'items': ['a']}, {'items': ['alone']}, {'items': ['c']}])
+        self.assertEqual(calls, ['text 1'])
+
+    def test_failed_packed_call_fails_every_item_without_retrying_alone(self):
+        def generate_pack(pack):
+            raise RateLimited(5)
+
+        results = self.run_packed(generate_pack, lambda item: self.fail('generate_one was called'))
+        self.assertEqual([result['error_type'] for result in results], ['RateLimited'] * 3)
+
+    def test_rate_limit_stops_the_remaining_items_of_a_unit(self):
+        calls = []
+
+        def generate_one(item):
+            calls.append(item['input_text'])
+            raise RateLimited(5)
+
+        results = self.run_packed(lambda pack: [None, None, None], generate_one)
+        self.assertEqual(calls, ['text 0'])
+        self.assertEqual([result['error_type'] for result in results], ['RateLimited'] * 3)
+
+
+class WarmUpTests(SimpleTestCase):
+    @override_settings(GEMINI_WARM_UP=True)
+    def test_app_ready_does_not_call_the_model(self):
+        with mock.patch.object(llm, 'warm_up') as warm_up:
+            apps.get_app_config('pfe').ready()
+        warm_up.assert_not_called()
+
+
+def make_limiter(**kwargs):
+    options = dict(rate=0, burst=1, concurrency=1, queue_timeout=0.2, backoff_base=0.0, backoff_max=60.0)
+    return Limiter(**{**options, **kwargs})
+
+
+class LimiterTests(SimpleTestCase):
+    def test_token_bucket_allows_a_burst_then_waits(self):
+        limiter = make_limiter(rate=1, burst=2)
+        self.assertEqual(limiter.try_take(), 0)
+        self.assertEqual(limiter.try_take(), 0)
+        self.assertAlmostEqual(limiter.try_take(), 1.0, places=1)
+
+    def test_backoff_uses_the_server_delay_and_pauses_callers(self):
+        limiter = make_limiter(rate=10, burst=10, backoff_max=30.0)
+        delay = limiter.backoff(exceptions.ResourceExhausted('quota, retry_delay { seconds: 17 }'), attempt=0)
+        self.assertEqual(delay, 17)
+        self.assertGreater(limiter.try_take(), 16)
+
+    def test_file_state_is_shared_between_limiters(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'limit.json')
+            first = make_limiter(rate=1, burst=2, state=FileState(path))
+            second = make_limiter(rate=1, burst=2, state=FileState(path))
+            self.assertEqual(first.try_take(), 0)
+            self.assertEqual(second.try_take(), 0)
+            self.assertGreater(first.try_take(), 0)
+
+    def test_slot_raises_rate_limited_at_the_deadline(self):
+        limiter = make_limiter()
+        with limiter.slot(limiter.deadline()):
+            with self.assertRaises(RateLimited):
+                with limiter.slot(limiter.deadline(0.05)):
+                    pass
+
+
+class FakeModel:
+    """Answers each generate_content call with the next of answers: an exception, or chunks."""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception) and not stream:
+            raise answer
+
+        def chunks():
+            if isinstance(answer, Exception):
+                raise answer
+            for chunk in answer:
+                yield SimpleNamespace(text=chunk, usage_metadata=None) if isinstance(chunk, str) else chunk
+
+        return chunks()
+
+
+class StreamTests(SimpleTestCase):
+    def generate(self, limiter, answers):
+        with mock.patch.object(llm, 'get_limiter', return_value=limiter), \
+                mock.patch.object(llm, 'get_model', return_value=FakeModel(answers)):
+            return llm.generate('test-model', 'prompt', stream=True)
+
+    def slot_is_free(self, limiter):
+        if limiter._slots.acquire(blocking=False):
+            limiter._slots.release()
+            return True
+        return False
+
+    def test_stream_holds_its_slot_until_exhausted(self):
+        limiter = make_limiter()
+        response = self.generate(limiter, [['a', 'b']])
+        self.assertFalse(self.slot_is_free(limiter))
+        self.assertEqual([chunk.text for chunk in response], ['a', 'b'])
+        self.assertTrue(self.slot_is_free(limiter))
+
+    def test_cancel_releases_the_slot(self):
+        limiter = make_limiter()
+        response = self.generate(limiter, [['a', 'b']])
+        next(iter(response))
+        llm.cancel_stream(response)
+        self.assertTrue(self.slot_is_free(limiter))
+
+    def test_rate_limit_before_the_first_chunk_is_retried(self):
+        limiter = make_limiter()
+        retries = llm.stats().get('test-model', {}).get('retries', 0)
+        response = self.generate(limiter, [exceptions.ResourceExhausted('quota'), ['a']])
+        self.assertEqual([chunk.text for chunk in response], ['a'])
+        self.assertEqual(llm.stats()['test-model']['retries'], retries + 1)
+
+    def test_usage_of_the_last_chunk_is_recorded_when_the_stream_ends(self):
+        before = llm.stats().get('test-model', {})
+        usage = SimpleNamespace(prompt_token_count=120, candidates_token_count=30)
+        response = self.generate(make_limiter(), [['a', SimpleNamespace(text='b', usage_metadata=usage)]])
+        self.assertEqual(llm.stats().get('test-model', {}).get('calls', 0), before.get('calls', 0))
+        list(response)
+        after = llm.stats()['test-model']
+        self.assertEqual(after['calls'], before.get('calls', 0) + 1)
+        self.assertEqual(after['prompt_tokens'], before.get('prompt_tokens', 0) + 120)
+        self.assertEqual(after['output_tokens'], before.get('output_tokens', 0) + 30)
+
+    def test_other_errors_release_the_slot(self):
+        limiter = make_limiter()
+        with self.assertRaises(exceptions.ServiceUnavailable):
+            self.generate(limiter, [exceptions.ServiceUnavailable('overloaded')])
+        self.assertTrue(self.slot_is_free(limiter))
+
+
+class FingerprintTests(TestCase):
+    def test_similarity_ignores_case_and_punctuation(self):
+        a = fingerprint.shingles('What is osmosis in plant cells?')
+        b = fingerprint.shingles('what is OSMOSIS, in plant cells')
+        c = fingerprint.shingles('Which enzyme copies DNA during replication?')
+        self.assertEqual(fingerprint.similarity(a, b), 1.0)
+        self.assertLess(fingerprint.similarity(a, c), 0.3)
+        self.assertEqual(fingerprint.band_hashes(a), fingerprint.band_hashes(b))
+
+    def test_near_duplicate_of_a_stored_row_is_merged(self):
+        stored = Card.objects.create(question='What is osmosis in plant cells?', answer='Water movement')
+        saved = fingerprint.save_unique([
+            Card(question='what is osmosis in plant cells', answer='Diffusion of water'),
+            Card(question='Which enzyme copies DNA during replication?', answer='DNA polymerase'),
+        ])
+        self.assertEqual(saved[0].pk, stored.pk)
+        self.assertEqual(saved[1].question, 'Which enzyme copies DNA during replication?')
+        self.assertIsNotNone(saved[1].pk)
+        self.assertEqual(Card.objects.count(), 2)
+
+    def test_near_duplicates_within_a_batch_are_merged(self):
+        saved = fingerprint.save_unique([
+            Card(question='What is osmosis in plant cells?', answer='a'),
+            Card(question='What is osmosis in plant cells ?', answer='b'),
+        ])
+        self.assertEqual([card.answer for card in saved], ['a'])
+        self.assertEqual(Card.objects.count(), 1)
+
+    def test_batch_duplicates_across_groups_are_kept_in_each_group(self):
+        stored = Card.objects.create(question='Which enzyme copies DNA during replication?', answer='stored')
+        first, second = fingerprint.save_unique_groups([
+            [Card(question='What is osmosis in plant cells?', answer='a'),
+             Card(question='Which enzyme copies DNA during replication', answer='b')],
+            [Card(question='what is osmosis in plant cells', answer='c'),
+             Card(question='Which enzyme copies DNA during replication?!', answer='d')],
+        ])
+        self.assertEqual([card.answer for card in first], ['a', 'stored'])
+        self.assertEqual([card.pk for card in second], [first[0].pk, stored.pk])
+        self.assertEqual(Card.objects.count(), 2)
+
+    def test_skip_drops_batch_duplicates_and_off_keeps_them(self):
+        groups = lambda: [[Card(question='What is osmosis in plant cells?', answer='a')],
+                          [Card(question='What is osmosis in plant cells', answer='b')]]
+        with override_settings(DEDUP_MODE='skip'):
+            self.assertEqual([len(group) for group in fingerprint.save_unique_groups(groups())], [1, 0])
+        Card.objects.all().delete()
+        with override_settings(DEDUP_MODE='off'):
+            self.assertEqual([len(group) for group in fingerprint.save_unique_groups(groups())], [1, 1])
+        self.assertEqual(Card.objects.count(), 2)
+
+    def test_modes(self):
+        Card.objects.create(question='What is osmosis in plant cells?', answer='a')
+        with override_settings(DEDUP_MODE='skip'):
+            self.assertEqual(fingerprint.save_unique([Card(question='What is osmosis in plant cells', answer='b')]), [])
+        with override_settings(DEDUP_MODE='off'):
+            self.assertEqual(len(fingerprint.save_unique([Card(question='What is osmosis in plant cells', answer='c')])), 1)
+        self.assertEqual(Card.objects.count(), 2)
+
+
+class DedupeCommandTests(TestCase):
+    def test_group_memberships_move_to_the_kept_row(self):
+        source = Source.objects.for_text('Plant cells and water')
+        other_source = Source.objects.for_text('Cell biology')
+        kept = Card.objects.create(question='What is osmosis in plant cells?', answer='a')
+        duplicate = Card.objects.create(question='what is osmosis in plant cells', answer='b')
+        unrelated = Card.objects.create(question='Which enzyme copies DNA during replication?', answer='c')
+        both = Deck.objects.create(source=source, options_hash='x')
+        both.cards.set([kept, duplicate])
+        only_duplicate = Deck.objects.create(source=other_source, options_hash='x')
+        only_duplicate.cards.set([duplicate, unrelated])
+
+        call_command('dedupe', 'cards.Card', stdout=io.StringIO())
+
+        self.assertFalse(Card.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(set(both.cards.all()), {kept})
+        self.assertEqual(set(only_duplicate.cards.all()), {kept, unrelated})
+
+    def test_dry_run_deletes_nothing(self):
+        Card.objects.create(question='What is osmosis in plant cells?', answer='a')
+        Card.objects.create(question='what is osmosis in plant cells', answer='b')
+        out = io.StringIO()
+        call_command('dedupe', 'cards.Card', '--dry-run', stdout=out)
+        self.assertIn('would delete 1 duplicate(s)', out.getvalue())
+        self.assertEqual(Card.objects.count(), 2)
+
+
+class MetricsTests(SimpleTestCase):
+    def test_parse_counters_are_exported_per_format(self):
+        structured.record_text_items(3, 1)
+        text = tracing.collect()
+        self.assertIn('pfe_parse_items_total{format="text"}', text)
+        self.assertIn('pfe_parse_dropped_total{format="text"}', text)
+        self.assertIn('pfe_parse_dropped_total{format="json"}', text)
+
+
+class StructuredOutputTests(SimpleTestCase):
+    fields = ['question', 'answer']
+
+    def parse_text(self, text):
+        return [{'question': line, 'answer': '?'} for line in text.splitlines() if line.strip()]
+
+    def test_parse_items_validates_every_field(self):
+        text = '```json\n[{"question": " Q1 ", "answer": "A1"}, {"question": "Q2"}, "x", {"question": "", "answer": "A"}]\n```'
+        self.assertEqual(structured.parse_items(text, self.fields), [{'question': 'Q1', 'answer': 'A1'}])
+        self.assertEqual(structured.parse_items('{"cards": [{"question": "Q", "answer": "A"}]}', self.fields),
+                         [{'question': 'Q', 'answer': 'A'}])
+
+    def test_parse_items_tells_free_text_from_json(self):
+        self.assertIsNone(structured.parse_items('Q1\nA1', self.fields))
+        self.assertEqual(structured.parse_items('{"cards": 1}', self.fields), [])
+
+    def test_text_parser_runs_only_on_free_text(self):
+        self.assertEqual(structured._parse('Q1\nQ2', self.fields, self.parse_text),
+                         [{'question': 'Q1', 'answer': '?'}, {'question': 'Q2', 'answer': '?'}])
+        # Valid JSON with the wrong field names gives no items, not cards like "["
+        wrong_fields = '[\n{"front": "Q", "back": "A"}\n]'
+        self.assertEqual(structured._parse(wrong_fields, self.fields, self.parse_text), [])
+
+    def test_generate_items_asks_for_json_only_when_enabled(self):
+        answer = SimpleNamespace(text='[{"question": "Q", "answer": "A"}]')
+        with mock.patch.object(llm, 'generate', return_value=answer) as generate:
+            with override_settings(STRUCTURED_OUTPUT=True):
+                raw, items = structured.generate_items('model', 'prompt', self.fields, self.parse_text)
+            self.assertEqual((raw, items), (answer.text, [{'question': 'Q', 'answer': 'A'}]))
+            self.assertEqual(generate.call_args.kwargs['generation_config'],
+                             structured.generation_config(self.fields))
+            self.assertIn('question, answer', generate.call_args.args[1])
+
+            with override_settings(STRUCTURED_OUTPUT=False):
+                _, items = structured.generate_items('model', 'prompt', self.fields, self.parse_text)
+            self.assertEqual(generate.call_args.args, ('model', 'prompt'))
+            self.assertEqual(items, [{'question': answer.text, 'answer': '?'}])
+
+
+class BatchWriterTests(TransactionTestCase):
+    def setUp(self):
+        self.writer = batch_writer.BatchWriter(max_delay=0.2)
+
+    def test_concurrent_submissions_share_one_insert(self):
+        with mock.patch.object(batch_writer, '_insert', wraps=batch_writer._insert) as insert:
+            first = self.writer.submit([Card(question='Q1', answer='A1')])
+            second = self.writer.submit([Card(question='Q2', answer='A2'), Card(question='Q3', answer='A3')])
+            self.assertEqual(len(first.result(5)), 1)
+            self.assertEqual(len(second.result(5)), 2)
+        self.assertEqual(insert.call_count, 1)
+        self.assertEqual(Card.objects.count(), 3)
+
+    def test_a_bad_row_only_fails_its_own_submission(self):
+        good = self.writer.submit([Card(question='Q1', answer='A1')])
+        bad = self.writer.submit([Card(question=None, answer='A2')])
+        self.assertEqual(good.result(5)[0].question, 'Q1')
+        with self.assertRaises(Exception):
+            bad.result(5)
+        self.assertEqual(list(Card.objects.values_list('question', flat=True)), ['Q1'])
+
+    def test_a_failed_flush_fails_every_submission_and_the_writer_keeps_going(self):
+        with mock.patch.object(batch_writer, 'close_old_connections', side_effect=RuntimeError('no database')):
+            futures = [self.writer.submit([Card(question=f'Q{i}', answer='A')]) for i in range(2)]
+            for future in futures:
+                with self.assertRaisesMessage(RuntimeError, 'no database'):
+                    future.result(5)
+        self.assertEqual(len(self.writer.submit([Card(question='Q', answer='A')]).result(5)), 1)
+
+    @override_settings(BATCH_WRITES_ENABLED=True, BATCH_WRITES_TIMEOUT=0.05)
+    def test_bulk_save_stops_waiting_after_the_timeout(self):
+        stuck = SimpleNamespace(submit=lambda objs: Future())
+        with mock.patch.object(batch_writer, 'get_writer', return_value=stuck):
+            with self.assertRaises(TimeoutError):
+                batch_writer.bulk_save([Card(question='Q', answer='A')])
+
+
+class PromptRegistryTests(SimpleTestCase):
+    input_text = 'f(x) = {x: 1} and {input_text} and {max_cards} {'
+
+    def test_braces_in_input_and_customizations_are_kept_verbatim(self):
+        registry = prompts.registry
+        for name, templates in registry._templates.items():
+            for language, template in templates.items():
+                fields = set(prompts.PLACEHOLDER.findall(template)) - {prompts.INPUT_FIELD}
+                customizations = {field: f'{{{field}}} {{input_text}} }}{{' for field in fields}
+                with self.subTest(template=name, language=language):
+                    if '{input_text}' in template:
+                        prompt = registry.build(name, language, self.input_text, customizations)
+                    else:
+                        # Section templates are joined by the caller
+                        prompt = registry.render(name, language, customizations).head
+                    # One pass over the template: inserted values are never substituted again
+                    expected = prompts.PLACEHOLDER.sub(
+                        lambda match: self.input_text if match.group(1) == prompts.INPUT_FIELD
+                        else customizations[match.group(1)], template)
+                    self.assertEqual(prompt, expected)
+
+    def test_renders_are_memoized_per_template_language_and_options(self):
+        registry = prompts.PromptRegistry()
+        registry.register('greeting', {'english': 'Hello {name}: {input_text}', 'french': 'Bonjour {name}: {input_text}'},
+                          defaults={'name': 'you'})
+        self.assertEqual(registry.build('greeting', 'english', 'a'), 'Hello you: a')
+        self.assertEqual(registry.build('greeting', 'english', 'b'), 'Hello you: b')
+        self.assertEqual(registry.build('greeting', 'german', 'c'), 'Hello you: c')
+        self.assertEqual(registry.build('greeting', 'french', 'd', {'name': 'Ada'}), 'Bonjour Ada: d')
+        self.assertEqual(registry.build('greeting', 'english', 'e', {'name': None}), 'Hello you: e')
+        stats = registry.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['renders']), (3, 2, 2))
+
+        registry.register('greeting', {'english': 'Hi {name}: {input_text}'})
+        self.assertEqual(registry.build('greeting', 'english', 'f'), 'Hi {name}: f')
+        self.assertEqual(registry.stats()['cached'], 1)
+
+
+class GenerationCacheTests(SimpleTestCase):
+    def setUp(self):
+        generation_cache.clear()
+        self.addCleanup(generation_cache.clear)
+
+    def test_key_ignores_whitespace_but_not_case(self):
+        key = generation_cache.make_key('cards', 'model', 'english', 'What is  DNA?\n', {'max_cards': 5})
+        self.assertEqual(key, generation_cache.make_key('cards', 'model', 'english', ' What is\tDNA? ', {'max_cards': 5}))
+        self.assertNotEqual(key, generation_cache.make_key('cards', 'model', 'english', 'what is dna?', {'max_cards': 5}))
+
+    def test_key_separates_endpoint_model_language_and_customizations(self):
+        args = ('cards', 'model', 'english', 'text', {'max_cards': 5})
+        key = generation_cache.make_key(*args)
+        for position, value in [(0, 'quiz'), (1, 'other-model'), (2, 'arabic'), (4, {'max_cards': 6})]:
+            changed = list(args)
+            changed[position] = value
+            self.assertNotEqual(key, generation_cache.make_key(*changed))
+        self.assertEqual(generation_cache.make_key('cards', 'model', 'english', 'text'),
+                         generation_cache.make_key('cards', 'model', 'english', 'text', {}))
+
+    @override_settings(GENERATION_CACHE_MAX_ITEM_BYTES=8)
+    def test_oversized_entries_are_not_stored(self):
+        generation_cache.set('small', 'short', ['a'])
+        generation_cache.set('large', 'far too long', ['b'])
+        self.assertEqual(generation_cache.get('small'), {'raw': 'short', 'parsed': ['a']})
+        self.assertIsNone(generation_cache.get('large'))
+        self.assertEqual(generation_cache.stats()['skipped'], 1)
+
+    def test_counters(self):
+        generation_cache.set('key', 'raw', [])
+        generation_cache.get('key')
+        generation_cache.get('key')
+        generation_cache.get('missing')
+        stats = generation_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['sets']), (2, 1, 1))
+        self.assertAlmostEqual(stats['hit_ratio'], 2 / 3)
+
+
+class LongInputTests(SimpleTestCase):
+    def test_chunks_are_whole_sentences_within_the_budget(self):
+        sentences = [f'Sentence number {i} talks about {"cells " * (i % 4)}and more.' for i in range(40)]
+        chunks = long_input.chunk_text(' '.join(sentences), max_tokens=40)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(sum(map(long_input.estimate_tokens, long_input.split_sentences(chunk))), 40)
+        # Every sentence is in exactly one chunk, in order: no overlap, nothing lost
+        self.assertEqual([s for chunk in chunks for s in long_input.split_sentences(chunk)], sentences)
+
+    def test_sentences_over_the_budget_are_cut_on_words_or_characters(self):
+        words = ' '.join(f'word{i}' for i in range(100))
+        chunks = long_input.chunk_text(words, max_tokens=20)
+        self.assertEqual(' '.join(chunks), words)
+        self.assertTrue(all(long_input.estimate_tokens(chunk) <= 21 for chunk in chunks))
+
+        cjk = '细胞' * 30 + '。' + '膜' * 10 + '。'
+        chunks = long_input.chunk_text(cjk, max_tokens=25)
+        self.assertEqual(''.join(chunks).replace(' ', ''), cjk)
+        self.assertTrue(all(long_input.estimate_tokens(chunk) <= 26 for chunk in chunks))
+
+    @override_settings(LONG_INPUT_CHUNK_TOKENS=10)
+    def test_map_reduce_merges_in_chunk_order_without_duplicate_questions(self):
+        text = 'Alpha beta gamma delta epsilon. Zeta eta theta iota kappa. Lambda mu nu xi omicron.'
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def generate(chunk):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            first = chunk.split()[0]
+            return [{'question': f'What is {first}?'}, {'question': 'what is  SHARED'}, {'question': '?!'}]
+
+        merged = long_input.map_reduce(text, generate, max_workers=2)
+        self.assertEqual([item['question'] for item in merged],
+                         ['What is Alpha?', 'what is  SHARED', 'What is Zeta?', 'What is Lambda?'])
+        self.assertEqual(peak[0], 2)
+
+
+@override_settings(TRACING_ENABLED=True)
+class WorkerTraceTests(SimpleTestCase):
+    def traced(self, func):
+        token = tracing._trace.set([])
+        try:
+            func()
+            return [name for name, _ in tracing._trace.get()]
+        finally:
+            tracing._trace.reset(token)
+
+    def generate(self, text):
+        with tracing.span('model'):
+            return [{'question': text}]
+
+    def test_chunk_spans_join_the_request_trace(self):
+        text = 'First sentence here. Second sentence here. Third sentence here.'
+        with override_settings(LONG_INPUT_CHUNK_TOKENS=6):
+            names = self.traced(lambda: long_input.map_reduce(text, self.generate))
+        self.assertEqual(names, ['model'] * len(long_input.chunk_text(text, 6)))
+
+    def test_batch_spans_join_the_request_trace(self):
+        items = [{'text': f'item {i}'} for i in range(3)]
+        names = self.traced(lambda: batching.run_batch(items, lambda item: self.generate(item['text']),
+                                                       None, lambda item: item['text']))
+        self.assertEqual(names, ['model'] * 3)
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    def test_connections_use_wal_normal_sync_busy_timeout_and_immediate_transactions(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        # The test database is in memory, where WAL doesn't apply: open the configured settings on a file
+        wrapper = DatabaseWrapper({**connections.settings['default'], 'NAME': os.path.join(directory, 'db.sqlite3')},
+                                  alias='pragmas')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            pragmas = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                       for name in ('journal_mode', 'synchronous', 'busy_timeout')}
+        # synchronous 1 is NORMAL
+        timeout = connections.settings['default']['OPTIONS']['timeout']
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': int(timeout * 1000)})
+        self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+
+    def load_settings(self, **env):
+        with mock.patch.dict(os.environ, env):
+            return runpy.run_path(os.path.join(settings.BASE_DIR, 'pfe', 'settings.py'))['DATABASES']['default']
+
+    def test_postgresql_keeps_checked_connections_or_uses_a_pool(self):
+        persistent = self.load_settings(DB_ENGINE='postgresql', DB_POOL='', DB_CONN_MAX_AGE='120')
+        self.assertEqual(persistent['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((persistent['CONN_MAX_AGE'], persistent['CONN_HEALTH_CHECKS']), (120, True))
+        self.assertEqual(persistent['OPTIONS'], {})
+
+        pooled = self.load_settings(DB_ENGINE='postgresql', DB_POOL='1', DB_POOL_MAX_SIZE='50')
+        self.assertEqual(pooled['CONN_MAX_AGE'], 0)
+        self.assertEqual(pooled['OPTIONS']['pool'], {'min_size': 2, 'max_size': 50, 'timeout': 10.0})
+
+    def test_sqlite_options_come_from_the_environment(self):
+        options = self.load_settings(DB_ENGINE='sqlite', DB_SQLITE_JOURNAL_MODE='DELETE',
+                                     DB_SQLITE_SYNCHRONOUS='FULL', DB_BUSY_TIMEOUT='5')['OPTIONS']
+        self.assertEqual(options, {'timeout': 5.0, 'transaction_mode': 'IMMEDIATE',
+                                   'init_command': 'PRAGMA journal_mode=DELETE; PRAGMA synchronous=FULL'})
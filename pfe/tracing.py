@@ -0,0 +1,222 @@
+"""
+Per-stage request timing and the Prometheus /metrics endpoint.
+
+The views wrap each stage of a request in span(name): 'detect_language',
+'prompt', 'cache', 'model', 'parse', 'validate', 'transcript', 'source',
+'db_write', 'serialize'. With TRACING_ENABLED, a span adds its duration to the
+pfe_stage_seconds histogram and to the trace of the current request, which
+TracingMiddleware turns into a Server-Timing header and a
+pfe_request_seconds observation per view. With tracing off, span() returns
+a shared no-op context manager and the middleware passes requests through.
+
+The counters on /metrics (model calls, tokens, retries, parse drops, cache
+hits, diagram repairs) are read at scrape time from the stats() functions
+the modules already keep, so they cost nothing extra per request. All
+values are per process.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (stage name, seconds) pairs of the request being handled
+_trace: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar('trace', default=None)
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram keyed on a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...], buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: Tuple[str, ...], value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = _labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_labels(zip(self.labels, label_values), le=bound)} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(zip(self.labels, label_values), le="+Inf")} {count}')
+            lines.append(f'{self.name}_sum{labels} {total:.6f}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+stage_seconds = Histogram('pfe_stage_seconds', 'Time spent in each stage of a request.', ('stage',))
+request_seconds = Histogram('pfe_request_seconds', 'Request duration per view.', ('view', 'method', 'status'))
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        stage_seconds.observe((self.name,), elapsed)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((self.name, elapsed))
+        return False
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def span(name: str):
+    """Time the enclosed stage when TRACING_ENABLED; a no-op otherwise."""
+    if not settings.TRACING_ENABLED:
+        return _NOOP
+    return _Span(name)
+
+
+def server_timing(trace: Iterable[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value, summing repeated stages."""
+    durations = defaultdict(float)
+    for name, seconds in trace:
+        durations[name] += seconds
+    durations['total'] = total
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in durations.items())
+
+
+class TracingMiddleware:
+    """Collect the spans of each request and time the request per view."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.TRACING_ENABLED:
+            return self.get_response(request)
+        token, start = _trace.set([]), time.perf_counter()
+        try:
+            response = self.get_response(request)
+            self.finish(request, response, start)
+        finally:
+            _trace.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.TRACING_ENABLED:
+            return await self.get_response(request)
+        token, start = _trace.set([]), time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            self.finish(request, response, start)
+        finally:
+            _trace.reset(token)
+        return response
+
+    def finish(self, request, response, start: float) -> None:
+        # Streamed bodies are produced after this point; only the time to the
+        # first byte is measured for them
+        total = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        request_seconds.observe((view, request.method, str(response.status_code)), total)
+        response['Server-Timing'] = server_timing(_trace.get() or (), total)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs: Iterable[Tuple[str, object]], **extra) -> str:
+    items = [*pairs, *extra.items()]
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+
+def _metric(lines: List[str], name: str, kind: str, help_text: str, samples: Iterable[Tuple[Dict, float]]) -> None:
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    for labels, value in samples:
+        lines.append(f'{name}{_labels(labels.items())} {value}')
+
+
+def collect() -> str:
+    """Render every metric in the Prometheus text exposition format."""
+    from mermiad import repair
+
+    from . import generation_cache, llm, structured
+
+    lines: List[str] = []
+    models = llm.stats()
+    for key, name, help_text in (
+        ('calls', 'pfe_model_calls_total', 'Model calls, including retried attempts.'),
+        ('errors', 'pfe_model_errors_total', 'Model calls that raised.'),
+        ('retries', 'pfe_model_retries_total', 'Model calls retried after a rate limit error.'),
+        ('prompt_tokens', 'pfe_model_prompt_tokens_total', 'Prompt tokens reported by the model.'),
+        ('output_tokens', 'pfe_model_output_tokens_total', 'Output tokens reported by the model.'),
+        ('seconds', 'pfe_model_seconds_total', 'Time spent waiting for the model.'),
+    ):
+        _metric(lines, name, 'counter', help_text,
+                (({'model': model}, entry.get(key, 0)) for model, entry in sorted(models.items())))
+
+    parsed = structured.stats()
+    _metric(lines, 'pfe_parse_responses_total', 'counter', 'Model answers parsed, by format.',
+            (({'format': name}, parsed.get(name, 0)) for name in ('json', 'text')))
+    _metric(lines, 'pfe_parse_items_total', 'counter', 'Items kept from model answers, by format.',
+            (({'format': name}, parsed.get(key, 0)) for name, key in (('json', 'items'), ('text', 'text_items'))))
+    _metric(lines, 'pfe_parse_dropped_total', 'counter', 'Items dropped from model answers as invalid, by format.',
+            (({'format': name}, parsed.get(key, 0)) for name, key in (('json', 'dropped'), ('text', 'text_dropped'))))
+
+    cache = generation_cache.stats()
+    _metric(lines, 'pfe_generation_cache_lookups_total', 'counter', 'Generation cache lookups, by result.',
+            (({'result': name}, cache[key]) for name, key in (('hit', 'hits'), ('miss', 'misses'))))
+
+    _metric(lines, 'pfe_diagram_repairs_total', 'counter', 'Generated diagrams by how they were made valid.',
+            (({'outcome': outcome}, count) for outcome, count in sorted(repair.stats().items())))
+
+    lines.extend(stage_seconds.render())
+    lines.extend(request_seconds.render())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    """Prometheus scrape endpoint."""
+    return HttpResponse(collect(), content_type='text/plain; version=0.0.4; charset=utf-8')
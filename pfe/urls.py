@@ -16,11 +16,16 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path , include
+from pfe import tracing
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', tracing.metrics, name='metrics'),
     path('api/cards/', include('cards.urls')),
     path('api/quizes/', include('quiz.urls')),
     path('api/mermiad/', include('mermiad.urls')),
     path('api/youtube/', include('youtube.urls')),
+    path('api/jobs/', include('jobs.urls')),
+    path('api/search/', include('search.urls')),
+    path('api/study/', include('study.urls')),
 ]
@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pfe.settings')
 
 application = get_wsgi_application()
+
+# Only serving processes warm the Gemini client up; management commands,
+# test runs and job workers never load this module
+from pfe import llm  # noqa: E402
+
+if settings.GEMINI_WARM_UP:
+    llm.warm_up()
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-18 07:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0003_source_created_at'),
+        ('sources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('quizzes', models.ManyToManyField(related_name='quiz_sets', to='quiz.quiz')),
+                ('source', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_set', to='sources.source')),
+            ],
+        ),
+    ]
@@ -1,11 +1,33 @@
 from django.db import models
+from django.utils import timezone
 
-class Quiz(models.Model):
+from pfe.fingerprint import Fingerprinted
+
+class Quiz(Fingerprinted):
     question = models.CharField(max_length=200)
     answer1 = models.CharField(max_length=500)
     answer2 = models.CharField(max_length=500)
     answer3 = models.CharField(max_length=500)
     answer4 = models.CharField(max_length=500)
+    source = models.ForeignKey('sources.Source', null=True, blank=True, on_delete=models.SET_NULL,
+                               related_name='quizzes', db_index=False)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, editable=False)
+
+    class Meta:
+        # Listing by source in creation order; also serves lookups on source alone
+        indexes = [models.Index(fields=['source', 'created_at'], name='quiz_source_created_idx')]
     
     def __str__(self):
-        return self.question
\ No newline at end of file
+        return self.question
+
+
+class QuizSet(models.Model):
+    """The quiz questions generated from one source."""
+
+    source = models.OneToOneField('sources.Source', on_delete=models.CASCADE, related_name='quiz_set')
+    # Many-to-many since near-duplicate merging can share a question between sets
+    quizzes = models.ManyToManyField(Quiz, related_name='quiz_sets')
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    def __str__(self):
+        return f'Quiz set {self.pk} of {self.source}'
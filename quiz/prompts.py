@@ -0,0 +1,42 @@
+"""
+Quiz prompt template, registered with the shared prompt registry.
+"""
+from pfe.prompts import registry
+
+QUIZ_PROMPTS = {
+    "english": """
+    You are an AI quiz creator. Given the input text below, create multiple challenging multiple-choice quiz questions. Follow these guidelines:
+
+    1. **Content Analysis:** Analyze the input text to identify key concepts, facts, definitions, or important ideas.
+    2. **Question Generation:**
+        - Generate {min_questions} to {max_questions} questions based on the input content.
+        - Each question should test comprehension and understanding of the input text.
+        - Ensure the questions are varied, including conceptual, factual, and applied knowledge.
+    3. **Answer Structure:**
+        - Provide one correct answer and three plausible incorrect answers for each question.
+        - The incorrect answers should not be random, but reasonably related to the correct answer.
+    4. **Formatting:**
+        - Present each question followed by the four multiple-choice answers in this exact format:
+        Question: [Question text here]
+        a) [First answer]
+        b) [Second answer]
+        c) [Third answer]
+        d) [Fourth answer]
+
+    5. **Additional Clarifications:**
+        - Use proper grammar and punctuation.
+        - Ensure no ambiguity in questions and answers.
+        - Start each new question with "Question:" on a new line
+        - Use exactly a), b), c), d) for answer choices
+
+    Input text:
+    {input_text}
+    """
+}
+
+DEFAULT_CUSTOMIZATIONS = {
+    'min_questions': 4,
+    'max_questions': 10,
+}
+
+registry.register('quiz', QUIZ_PROMPTS, defaults=DEFAULT_CUSTOMIZATIONS)
@@ -1,7 +1,17 @@
 from rest_framework import serializers
-from .models import Quiz
+from .models import Quiz, QuizSet
 
 class QuizSerializer(serializers.ModelSerializer):
     class Meta:
         model = Quiz
-        fields = ['id', 'question', 'answer1', 'answer2', 'answer3', 'answer4']
\ No newline at end of file
+        fields = ['id', 'question', 'answer1', 'answer2', 'answer3', 'answer4']
+
+class QuizSetSerializer(serializers.ModelSerializer):
+    source = serializers.SlugRelatedField(slug_field='text_hash', read_only=True)
+    language = serializers.CharField(source='source.language', read_only=True)
+    origin_url = serializers.CharField(source='source.origin_url', read_only=True)
+    quizzes = QuizSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = QuizSet
+        fields = ['id', 'source', 'language', 'origin_url', 'created_at', 'quizzes']
@@ -1,3 +1,205 @@
-from django.test import TestCase
+import json
+import random
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from pfe import fingerprint, generation_cache, long_input, structured
+from quiz.models import Quiz, QuizSet
+from quiz.views import QuizStreamParser, parse_quiz_blocks
+from youtube.models import Youtube
+
+
+class TranscriptIdTests(TestCase):
+    def test_non_integer_transcript_id_is_rejected(self):
+        response = self.client.post('/api/quizes/create/', {'transcript_id': 'abc'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'transcript_id must be an integer'})
+
+
+QUIZ_TEXT = (
+    'Here are your questions:\n'
+    'Question: What is osmosis?\na) Water movement\nb) Heat\nc) Light\nd) Sound\n'
+    'Question: Missing answers?\na) One\nb) Two\n'
+    'Question: What is diffusion?\na) Spreading\nb) Binding\nc) Folding\nd) Cutting'
+)
+
+
+class ParserTests(SimpleTestCase):
+    def test_only_questions_with_four_answers_are_kept_and_drops_are_counted(self):
+        before = structured.stats()
+        questions = parse_quiz_blocks(QUIZ_TEXT)
+        self.assertEqual([question['question'] for question in questions], ['What is osmosis?', 'What is diffusion?'])
+        self.assertEqual(questions[0]['answer4'], 'Sound')
+        after = structured.stats()
+        self.assertEqual(after['text_items'] - before.get('text_items', 0), 2)
+        self.assertEqual(after['text_dropped'] - before.get('text_dropped', 0), 2)
+
+    def test_stream_parser_matches_the_batch_parser_under_any_chunking(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            parser, questions, start = QuizStreamParser(), [], 0
+            while start < len(QUIZ_TEXT):
+                size = rng.randint(1, 40)
+                questions.extend(parser.feed(QUIZ_TEXT[start:start + size]))
+                start += size
+            questions.extend(parser.close())
+            self.assertEqual(questions, parse_quiz_blocks(QUIZ_TEXT))
+
+    def test_stream_parser_emits_a_question_once_its_last_answer_line_ends(self):
+        parser = QuizStreamParser()
+        self.assertEqual(parser.feed('Question: What is osmosis?\na) Water\nb) Heat\nc) Light\nd) Sou'), [])
+        self.assertEqual([question['answer4'] for question in parser.feed('nd\n')], ['Sound'])
+
+
+class QuizStreamTests(TestCase):
+    def stream(self, data):
+        response = self.client.post('/api/quizes/create/stream/', {'format': 'ndjson', **data},
+                                    content_type='application/json')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def patch_model(self):
+        chunks = [SimpleNamespace(text=QUIZ_TEXT[i:i + 25]) for i in range(0, len(QUIZ_TEXT), 25)]
+        return mock.patch('quiz.views.llm.generate', side_effect=lambda *args, **kwargs: iter(chunks))
+
+    def test_stream_cut_short_by_count_saves_its_questions_without_a_set(self):
+        with self.patch_model(), mock.patch('quiz.views.fingerprint.save_unique',
+                                            wraps=fingerprint.save_unique) as save_unique:
+            events = self.stream({'input_text': 'Cell transport', 'persist': True, 'count': 1})
+        self.assertEqual(save_unique.call_count, 1)
+        self.assertEqual([event['event'] for event in events], ['quiz', 'done'])
+        done = events[-1]['data']
+        self.assertEqual(done['count'], 1)
+        self.assertNotIn('quiz_set', done)
+        self.assertEqual(done['quizzes'], list(Quiz.objects.values_list('pk', flat=True)))
+        self.assertFalse(QuizSet.objects.exists())
+
+    def test_persisted_questions_are_saved_before_they_are_sent(self):
+        with self.patch_model():
+            response = self.client.post('/api/quizes/create/stream/',
+                                        {'format': 'ndjson', 'input_text': 'Membranes', 'persist': True},
+                                        content_type='application/json')
+            first = json.loads(next(iter(response.streaming_content)))
+            # The client leaves after the first question
+            response.close()
+        self.assertEqual(first['event'], 'quiz')
+        self.assertEqual(Quiz.objects.get().pk, first['data']['id'])
+        self.assertFalse(QuizSet.objects.exists())
+
+    def test_complete_stream_is_grouped_and_replayed(self):
+        with self.patch_model() as generate:
+            events = self.stream({'input_text': 'Cell transport', 'persist': True})
+            replayed = self.stream({'input_text': 'Cell transport', 'persist': True})
+        self.assertEqual(generate.call_count, 1)
+        quiz_set = QuizSet.objects.get()
+        ids = list(quiz_set.quizzes.values_list('pk', flat=True))
+        self.assertEqual(events[-1]['data'], {'count': 2, 'quiz_set': quiz_set.pk, 'quizzes': ids})
+        self.assertEqual([event['data']['id'] for event in events[:-1]], ids)
+        self.assertEqual(replayed[-1]['data'], {'count': 2, 'quiz_set': quiz_set.pk})
+        self.assertEqual([event['data']['question'] for event in replayed[:-1]],
+                         ['What is osmosis?', 'What is diffusion?'])
+
+
+class ListQuizzesTests(TestCase):
+    url = '/api/quizes/show/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quizzes = Quiz.objects.bulk_create(
+            Quiz(question=f'Question {i} about {"cells" if i % 2 else "atoms"}',
+                 answer1='a', answer2='b', answer3='c', answer4='d')
+            for i in range(5)
+        )
+
+    def rows(self, response):
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return json.loads(content)
+
+    def test_without_cursor_or_limit_every_row_is_returned(self):
+        with self.settings(QUIZ_PAGE_SIZE=2):
+            response = self.client.get(self.url)
+        self.assertEqual([row['id'] for row in self.rows(response)], [quiz.pk for quiz in self.quizzes])
+        self.assertNotIn('X-Next-Cursor', response)
+
+    def test_pages_follow_the_cursor(self):
+        ids, params = [], {'limit': 2}
+        while True:
+            response = self.client.get(self.url, params)
+            ids.extend(row['id'] for row in self.rows(response))
+            if 'X-Next-Cursor' not in response:
+                break
+            params = {'limit': 2, 'cursor': response['X-Next-Cursor']}
+        self.assertEqual(ids, [quiz.pk for quiz in self.quizzes])
+
+    def test_cursor_alone_uses_the_default_page_size(self):
+        with self.settings(QUIZ_PAGE_SIZE=2):
+            response = self.client.get(self.url, {'cursor': self.quizzes[0].pk})
+        self.assertEqual([row['id'] for row in self.rows(response)], [quiz.pk for quiz in self.quizzes[1:3]])
+        self.assertEqual(response['X-Next-Cursor'], str(self.quizzes[2].pk))
+
+    def test_fields_and_q_filter_the_rows(self):
+        response = self.client.get(self.url, {'limit': 10, 'fields': 'id,question', 'q': 'CELLS'})
+        self.assertEqual(self.rows(response), [
+            {'id': quiz.pk, 'question': quiz.question} for quiz in self.quizzes if 'cells' in quiz.question
+        ])
+        self.assertEqual(self.client.get(self.url, {'fields': 'secret'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'limit': 'all'}).status_code, 400)
+
+    def test_stream_returns_every_row_after_the_cursor(self):
+        response = self.client.get(self.url, {'stream': '1', 'cursor': self.quizzes[2].pk, 'limit': 1})
+        self.assertTrue(response.streaming)
+        self.assertEqual([row['id'] for row in self.rows(response)], [quiz.pk for quiz in self.quizzes[3:]])
+
+
+def fake_quiz(model_name, prompt, **kwargs):
+    # One question per prompt, about the first topic of its chunk
+    topic = next(word for word in prompt.split() if word in ('osmosis', 'mitochondria', 'ribosomes', 'enzymes'))
+    return SimpleNamespace(text=json.dumps([{'question': topic, 'answer1': 'a', 'answer2': 'b',
+                                             'answer3': 'c', 'answer4': 'd'}]))
+
+
+@override_settings(LONG_INPUT_THRESHOLD_TOKENS=20, LONG_INPUT_CHUNK_TOKENS=12, STRUCTURED_OUTPUT=True)
+class AsyncViewTests(TestCase):
+    url = '/api/quizes/create/async/'
+
+    async def post(self, data):
+        return await self.async_client.post(self.url, data, content_type='application/json')
+
+    async def test_transcript_is_generated_chunk_by_chunk_and_reused(self):
+        text = ' '.join(f'{topic} matter to every living cell.' for topic in
+                        ('osmosis', 'mitochondria', 'ribosomes', 'enzymes'))
+        transcript = await Youtube.objects.acreate(video_id='abcdefghijk', url='https://youtu.be/abcdefghijk', text=text)
+        with mock.patch('pfe.llm.agenerate', new=mock.AsyncMock(side_effect=fake_quiz)) as agenerate:
+            response = await self.post({'transcript_id': transcript.pk})
+            again = await self.post({'transcript_id': transcript.pk})
+
+        self.assertEqual(agenerate.await_count, len(long_input.chunk_text(text)))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([quiz['question'] for quiz in response.json()],
+                         ['osmosis', 'mitochondria', 'ribosomes', 'enzymes'])
+        quiz_set = await QuizSet.objects.select_related('source').aget()
+        self.assertEqual(response['X-Quiz-Set-Id'], str(quiz_set.pk))
+        self.assertEqual(quiz_set.source.transcript_id, transcript.pk)
+        self.assertEqual((again.status_code, again.json()), (200, response.json()))
+
+    async def test_transcript_id_errors_match_the_sync_view(self):
+        self.assertEqual((await self.post({'transcript_id': 'abc'})).status_code, 400)
+        self.assertEqual((await self.post({'transcript_id': 12345})).status_code, 404)
+        self.assertEqual((await self.post({})).status_code, 400)
+
+
+@override_settings(LONG_INPUT_THRESHOLD_TOKENS=20, LONG_INPUT_CHUNK_TOKENS=12, STRUCTURED_OUTPUT=True)
+class BatchTests(TestCase):
+    def setUp(self):
+        generation_cache.clear()
+
+    def test_long_items_are_generated_chunk_by_chunk(self):
+        topics = ('osmosis', 'mitochondria', 'ribosomes', 'enzymes')
+        long_text = ' '.join(f'{topic} matter to every living cell.' for topic in topics)
+        with mock.patch('pfe.llm.generate', side_effect=fake_quiz) as generate:
+            response = self.client.post('/api/quizes/batch/', {'items': [{'input_text': long_text}]},
+                                        content_type='application/json')
+        self.assertEqual(generate.call_count, len(long_input.chunk_text(long_text)))
+        result = response.json()['results'][0]
+        self.assertEqual([quiz['question'] for quiz in result['questions']], list(topics))
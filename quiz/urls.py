@@ -1,7 +1,13 @@
 from django.urls import path , include
-from .views import create_quizes , get_quizes
+from .views import (create_quizes , create_quizes_async , create_quizes_batch , create_quizes_stream , get_quizes ,
+                    get_quiz_set , list_quiz_sets)
 
 urlpatterns = [
     path('create/', create_quizes, name='create_quizes'),
-    path('show/' , get_quizes , name='get_quizes')
+    path('create/async/', create_quizes_async, name='create_quizes_async'),
+    path('create/stream/', create_quizes_stream, name='create_quizes_stream'),
+    path('batch/', create_quizes_batch, name='create_quizes_batch'),
+    path('show/' , get_quizes , name='get_quizes'),
+    path('sets/', list_quiz_sets, name='list_quiz_sets'),
+    path('sets/<int:set_id>/', get_quiz_set, name='get_quiz_set'),
 ]
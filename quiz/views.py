@@ -1,90 +1,245 @@
-import google.generativeai as genai
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import Quiz
-from .serializers import QuizSerializer
-import os
-from dotenv import load_dotenv
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .models import Quiz, QuizSet
+from .serializers import QuizSerializer, QuizSetSerializer
+from sources.models import Source, filter_by_source
+from youtube.models import Youtube
+from pfe import batching, fingerprint, generation_cache, llm, long_input, structured, tracing
+from pfe.async_utils import parse_json_body
+from pfe.language import detect_language
+from pfe.prompts import registry
+from pfe.rate_limit import RateLimited
+import json
+from typing import Dict, List, Optional, Tuple
 import re
 
-load_dotenv()
-genai.configure(api_key=os.getenv('GEMINI_API'))
+MODEL_NAME = "gemini-1.5-flash"
+
+# Fields requested from the model in JSON output mode
+QUIZ_FIELDS = ('question', 'answer1', 'answer2', 'answer3', 'answer4')
+
+QUESTION_START = re.compile(r'\n(?=Question:)')
+ANSWER_LINE = re.compile(r'^\s*[a-d]\)', re.MULTILINE)
+
+def parse_quiz_blocks(content: str) -> List[Dict[str, str]]:
+    """
+    Parse the AI response into question dicts with exactly four answers.
+    """
+    # Split content into individual questions using regex
+    question_blocks = QUESTION_START.split(content.strip())
+
+    parsed, blocks = [], 0
+    for block in question_blocks:
+        if not block.strip():
+            continue
+        blocks += 1
+
+        # Parse question and answers
+        lines = [line.strip() for line in block.split('\n') if line.strip()]
+
+        # Extract question (remove "Question:" prefix if present)
+        question = lines[0]
+        if question.startswith('Question:'):
+            question = question[9:].strip()
+
+        # Extract answers
+        answers = []
+        for line in lines[1:]:
+            # Match answer pattern (a), b), c), d))
+            if re.match(r'^[a-d]\)', line):
+                answer = line[2:].strip()  # Remove the prefix (e.g., "a)")
+                answers.append(answer)
+
+        # Only keep the question if it has exactly 4 answers
+        if len(answers) == 4:
+            parsed.append({
+                'question': question,
+                'answer1': answers[0],
+                'answer2': answers[1],
+                'answer3': answers[2],
+                'answer4': answers[3],
+            })
+
+    structured.record_text_items(len(parsed), blocks - len(parsed))
+    return parsed
+
+class QuizStreamParser:
+    """
+    Incremental parser for streamed model output.
+    feed() returns the questions whose block is complete: its d) line has
+    ended, or the next "Question:" has started. close() parses whatever is
+    left once the stream ends.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, text: str) -> List[Dict[str, str]]:
+        self._buffer += text
+        blocks = QUESTION_START.split(self._buffer)
+        # The last block may still be growing
+        self._buffer = blocks.pop()
+        questions = [question for block in blocks for question in parse_quiz_blocks(block)]
+
+        # Don't wait for the next question once all four answer lines are in
+        head, newline, tail = self._buffer.rpartition('\n')
+        if newline and len(ANSWER_LINE.findall(head)) >= 4:
+            questions.extend(parse_quiz_blocks(head))
+            self._buffer = tail
+        return questions
+
+    def close(self) -> List[Dict[str, str]]:
+        questions = parse_quiz_blocks(self._buffer)
+        self._buffer = ''
+        return questions
+
+def generate_quiz_data(input_text: str) -> List[Dict[str, str]]:
+    """
+    Generate and parse quiz questions for one prompt-sized text, without saving.
+    """
+    # Reuse a previous generation for the same text
+    with tracing.span('cache'):
+        cache_key = generation_cache.make_key('quiz', MODEL_NAME, 'auto', input_text)
+        cached = generation_cache.get(cache_key)
+
+    if cached is not None:
+        parsed_questions = cached['parsed']
+    else:
+        with tracing.span('prompt'):
+            prompt = registry.build('quiz', 'english', input_text)
+        raw_text, parsed_questions = structured.generate_items(MODEL_NAME, prompt, QUIZ_FIELDS, parse_quiz_blocks)
+        if parsed_questions:
+            generation_cache.set(cache_key, raw_text, parsed_questions)
+
+    return parsed_questions
+
+async def agenerate_quiz_data(input_text: str) -> List[Dict[str, str]]:
+    """Async variant of generate_quiz_data()."""
+    with tracing.span('cache'):
+        cache_key = generation_cache.make_key('quiz', MODEL_NAME, 'auto', input_text)
+        cached = await generation_cache.aget(cache_key)
+
+    if cached is not None:
+        return cached['parsed']
+    with tracing.span('prompt'):
+        prompt = registry.build('quiz', 'english', input_text)
+    raw_text, parsed_questions = await structured.agenerate_items(MODEL_NAME, prompt, QUIZ_FIELDS, parse_quiz_blocks)
+    if parsed_questions:
+        await generation_cache.aset(cache_key, raw_text, parsed_questions)
+    return parsed_questions
+
+def generate_quiz_data_packed(texts: List[str]) -> List[Optional[List[Dict[str, str]]]]:
+    """
+    Generate quiz questions for several short texts with one model call.
+    Returns the parsed questions per text, None for texts the model skipped.
+    """
+    keys = [generation_cache.make_key('quiz', MODEL_NAME, 'auto', text) for text in texts]
+    results, missing = [], []
+    for i, key in enumerate(keys):
+        cached = generation_cache.get(key)
+        results.append(cached['parsed'] if cached is not None else None)
+        if cached is None:
+            missing.append(i)
+
+    if missing:
+        prompt = (registry.build('quiz', 'english', batching.pack_inputs([texts[i] for i in missing]))
+                  + batching.pack_instructions(len(missing)))
+        response = llm.generate(MODEL_NAME, prompt)
+        sections = batching.unpack_output(response.text, len(missing))
+        for i, section in zip(missing, sections):
+            parsed_questions = parse_quiz_blocks(section) if section else []
+            if parsed_questions:
+                generation_cache.set(keys[i], section, parsed_questions)
+                results[i] = parsed_questions
+    return results
+
+def generate_quiz_items(input_text: str) -> List[Dict[str, str]]:
+    """
+    Generate and parse quiz questions for a text of any length, without saving.
+    """
+    if long_input.is_long(input_text):
+        # Long inputs are generated chunk by chunk in parallel, then merged
+        return long_input.map_reduce(input_text, generate_quiz_data)
+    return generate_quiz_data(input_text)
+
+def generate_quizzes(input_text: str, source: Optional[Source] = None) -> List[Quiz]:
+    """
+    Generate quiz questions for the input text and save them, linked to source.
+    Shared by the HTTP view and the background job handler.
+    """
+    parsed_questions = generate_quiz_items(input_text)
+
+    # Save all questions in a single bulk insert, merging near-duplicates
+    with tracing.span('db_write'):
+        return fingerprint.save_unique(Quiz(**question_data, source=source) for question_data in parsed_questions)
+
+def quiz_set_queryset():
+    """Quiz sets with their source, and their questions in one prefetch query."""
+    return QuizSet.objects.select_related('source').prefetch_related(
+        Prefetch('quizzes', queryset=Quiz.objects.order_by('pk'))
+    )
+
+def save_quiz_set(source: Source, quizzes: List[Quiz]) -> Tuple[QuizSet, List[Quiz]]:
+    """
+    Group freshly saved questions into the set for source. If a concurrent
+    request stored that set first, it is returned with its questions.
+    """
+    with transaction.atomic():
+        quiz_set, created = QuizSet.objects.get_or_create(source=source)
+        if created:
+            quiz_set.quizzes.set(quizzes)
+            return quiz_set, quizzes
+    return quiz_set, list(quiz_set.quizzes.order_by('pk'))
+
+def generate_quiz_set(input_text: str, source: Source) -> Tuple[Optional[QuizSet], List[Quiz], bool]:
+    """
+    Return (quiz_set, quizzes, generated) for the source, reusing the stored
+    set when there is one. Empty generations aren't kept as a set.
+    """
+    with tracing.span('source'):
+        quiz_set = quiz_set_queryset().filter(source=source).first()
+    if quiz_set is not None:
+        return quiz_set, list(quiz_set.quizzes.all()), False
+
+    quizzes = generate_quizzes(input_text, source)
+    if not quizzes:
+        return None, quizzes, True
+    with tracing.span('db_write'):
+        quiz_set, quizzes = save_quiz_set(source, quizzes)
+    return quiz_set, quizzes, True
+
+def _quiz_set_headers(quiz_set: Optional[QuizSet]) -> Dict[str, str]:
+    return {'X-Quiz-Set-Id': str(quiz_set.pk)} if quiz_set is not None else {}
 
 @api_view(['POST'])
 def create_quizes(request):
-    input_text = request.data.get('input_text')
+    """
+    Create quiz questions from input text, or from a stored transcript given
+    by transcript_id. The questions are grouped in a quiz set whose id is
+    sent in the X-Quiz-Set-Id header; submitting the same text again returns
+    that set (status 200) without calling the model.
+    """
+    try:
+        input_text = long_input.resolve_input_text(request.data)
+    except Youtube.DoesNotExist:
+        return Response({'error': 'Transcript not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     if not input_text:
         return Response({'error': 'Input text is required'}, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        prompt = f"""
-        You are an AI quiz creator. Given the input text below, create multiple challenging multiple-choice quiz questions. Follow these guidelines:
-
-        1. **Content Analysis:** Analyze the input text to identify key concepts, facts, definitions, or important ideas.
-        2. **Question Generation:**
-            - Generate 4 to 10 questions based on the input content.
-            - Each question should test comprehension and understanding of the input text.
-            - Ensure the questions are varied, including conceptual, factual, and applied knowledge.
-        3. **Answer Structure:**
-            - Provide one correct answer and three plausible incorrect answers for each question.
-            - The incorrect answers should not be random, but reasonably related to the correct answer.
-        4. **Formatting:**
-            - Present each question followed by the four multiple-choice answers in this exact format:
-            Question: [Question text here]
-            a) [First answer]
-            b) [Second answer]
-            c) [Third answer]
-            d) [Fourth answer]
-
-        5. **Additional Clarifications:**
-            - Use proper grammar and punctuation.
-            - Ensure no ambiguity in questions and answers.
-            - Start each new question with "Question:" on a new line
-            - Use exactly a), b), c), d) for answer choices
-
-        Input text:
-        {input_text}
-        """
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        content = response.text.strip()
-
-        # Split content into individual questions using regex
-        question_blocks = re.split(r'\n(?=Question:)', content)
-        
-        quizzes = []
-        for block in question_blocks:
-            if not block.strip():
-                continue
-                
-            # Parse question and answers
-            lines = [line.strip() for line in block.split('\n') if line.strip()]
-            
-            # Extract question (remove "Question:" prefix if present)
-            question = lines[0]
-            if question.startswith('Question:'):
-                question = question[9:].strip()
-            
-            # Extract answers
-            answers = []
-            for line in lines[1:]:
-                # Match answer pattern (a), b), c), d))
-                if re.match(r'^[a-d]\)', line):
-                    answer = line[2:].strip()  # Remove the prefix (e.g., "a)")
-                    answers.append(answer)
-            
-            # Only create quiz if we have a question and exactly 4 answers
-            if len(answers) == 4:
-                quiz = Quiz(
-                    question=question,
-                    answer1=answers[0],
-                    answer2=answers[1],
-                    answer3=answers[2],
-                    answer4=answers[3]
-                )
-                quiz.save()
-                quizzes.append(quiz)
+        with tracing.span('source'):
+            source = Source.objects.for_request(request.data, input_text)
+        quiz_set, quizzes, generated = generate_quiz_set(input_text, source)
 
         if not quizzes:
             return Response(
@@ -92,17 +247,363 @@ def create_quizes(request):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        serializer = QuizSerializer(quizzes, many=True)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        with tracing.span('serialize'):
+            data = QuizSerializer(quizzes, many=True).data
+        return Response(data, status=status.HTTP_201_CREATED if generated else status.HTTP_200_OK,
+                        headers=_quiz_set_headers(quiz_set))
     
+    except RateLimited as e:
+        return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={'Retry-After': str(e.retry_after)})
+
     except Exception as e:
         return Response(
             {'error': f'An error occurred: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['POST'])
+def create_quizes_batch(request):
+    """
+    Create quiz questions for many texts in one request.
+    Body: {"items": [{"input_text": ...}, ...], "pack": bool}
+    With "pack", small items are sent to the model together. All questions
+    are saved in one transaction and the response has one result per item,
+    in input order.
+    """
+    items = request.data.get('items')
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'items must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        return Response({'error': f'At most {settings.BATCH_MAX_ITEMS} items are allowed'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        results = [None] * len(items)
+        prepared = []
+        for index, item in enumerate(items):
+            input_text = item.get('input_text') if isinstance(item, dict) else None
+            if not input_text:
+                results[index] = {'index': index, 'status': 'error', 'error': 'Input text is required'}
+                continue
+            prepared.append({'index': index, 'input_text': input_text})
+
+        generated = batching.run_batch(
+            prepared,
+            generate_one=lambda item: generate_quiz_items(item['input_text']),
+            generate_pack=lambda pack: generate_quiz_data_packed([item['input_text'] for item in pack]),
+            group_key=lambda item: 'quiz',
+            pack=bool(request.data.get('pack', False)),
+        )
+
+        # Save the questions of every item in a single bulk insert
+        quizzes_per_item = fingerprint.save_unique_groups([
+            [Quiz(**question_data) for question_data in outcome.get('items', [])]
+            for outcome in generated
+        ])
+
+        for item, outcome, quizzes in zip(prepared, generated, quizzes_per_item):
+            if 'error' in outcome:
+                results[item['index']] = {'index': item['index'], 'status': 'error', **outcome}
+            elif not quizzes:
+                results[item['index']] = {'index': item['index'], 'status': 'error',
+                                          'error': 'No valid questions were generated'}
+            else:
+                results[item['index']] = {
+                    'index': item['index'],
+                    'status': 'ok',
+                    'questions': QuizSerializer(quizzes, many=True).data,
+                }
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response(
+            {'error': f'An error occurred: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@csrf_exempt
+@require_POST
+async def create_quizes_async(request):
+    """
+    Async variant of create_quizes for ASGI deployments, taking the same
+    body (input_text or transcript_id).
+    """
+    data = parse_json_body(request)
+    if data is None:
+        return JsonResponse({'error': 'Request body must be a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        input_text = await long_input.aresolve_input_text(data)
+    except Youtube.DoesNotExist:
+        return JsonResponse({'error': 'Transcript not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not input_text:
+        return JsonResponse({'error': 'Input text is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        with tracing.span('source'):
+            source = await Source.objects.afor_request(data, input_text)
+            quiz_set = await quiz_set_queryset().filter(source=source).afirst()
+        if quiz_set is not None:
+            with tracing.span('serialize'):
+                data = QuizSerializer(quiz_set.quizzes.all(), many=True).data
+            return JsonResponse(data, status=status.HTTP_200_OK, safe=False, headers=_quiz_set_headers(quiz_set))
+
+        if long_input.is_long(input_text):
+            # Long inputs are generated chunk by chunk concurrently, then merged
+            parsed_questions = await long_input.amap_reduce(input_text, agenerate_quiz_data)
+        else:
+            parsed_questions = await agenerate_quiz_data(input_text)
+
+        with tracing.span('db_write'):
+            quizzes = await fingerprint.asave_unique(
+                Quiz(**question_data, source=source) for question_data in parsed_questions
+            )
+            if quizzes:
+                quiz_set, quizzes = await sync_to_async(save_quiz_set)(source, quizzes)
+
+        if not quizzes:
+            return JsonResponse(
+                {'error': 'No valid questions were generated'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        with tracing.span('serialize'):
+            data = QuizSerializer(quizzes, many=True).data
+        return JsonResponse(data, status=status.HTTP_201_CREATED, safe=False, headers=_quiz_set_headers(quiz_set))
+
+    except RateLimited as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                            headers={'Retry-After': str(e.retry_after)})
+
+    except Exception as e:
+        return JsonResponse(
+            {'error': f'An error occurred: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+def _sse(event: str, data) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _ndjson(event: str, data) -> str:
+    """Format one event as a line of newline-delimited JSON."""
+    return json.dumps({'event': event, 'data': data}, ensure_ascii=False) + '\n'
+
+# format -> (event formatter, content type)
+STREAM_FORMATS = {
+    'sse': (_sse, 'text/event-stream'),
+    'ndjson': (_ndjson, 'application/x-ndjson'),
+}
+
+def _stream_quizzes(input_text: str, count: Optional[int], source: Optional[Source], emit):
+    """
+    Generate quiz questions with Gemini's streaming API and emit each one as
+    soon as its block is complete. The model call is cancelled once count
+    questions have been sent. With a source, each batch of questions from
+    the parser is saved before it is emitted (so the events carry ids and a
+    client that leaves early keeps what it got) and, unless count limited
+    the stream, the questions are grouped in the source's quiz set at the
+    end; a stored set is replayed instead.
+    """
+    sent = 0
+    try:
+        quiz_set = quiz_set_queryset().filter(source=source).first() if source is not None else None
+        if quiz_set is not None:
+            # Generated before: replay the stored set without calling the model
+            for quiz in list(quiz_set.quizzes.all())[:count]:
+                sent += 1
+                yield emit('quiz', QuizSerializer(quiz).data)
+            yield emit('done', {'count': sent, 'quiz_set': quiz_set.pk})
+            return
+
+        customizations = {'min_questions': count, 'max_questions': count} if count else {}
+        cache_key = generation_cache.make_key('quiz', MODEL_NAME, 'auto', input_text, customizations)
+        cached = generation_cache.get(cache_key)
+
+        response, raw_chunks = None, []
+        if cached is not None:
+            batches = [cached['parsed']]
+        else:
+            prompt = registry.build('quiz', 'english', input_text, customizations)
+            response = llm.generate(MODEL_NAME, prompt, stream=True)
+            batches = _parse_stream(response, raw_chunks)
+
+        parsed_questions, saved = [], []
+        for batch in batches:
+            if count:
+                batch = batch[:count - sent]
+            if not batch:
+                continue
+            parsed_questions.extend(batch)
+            if source is not None:
+                with tracing.span('db_write'):
+                    rows = fingerprint.save_unique(Quiz(**question_data, source=source) for question_data in batch)
+                # A stored question merged into twice is sent once
+                seen = {quiz.pk for quiz in saved}
+                rows = [quiz for quiz in rows if quiz.pk not in seen]
+                saved.extend(rows)
+                batch = QuizSerializer(rows, many=True).data
+            for question_data in batch:
+                sent += 1
+                yield emit('quiz', question_data)
+            if sent == count:
+                # Stop the model instead of paying for questions nobody reads
+                if response is not None:
+                    llm.cancel_stream(response)
+                break
+
+        if response is not None and parsed_questions:
+            generation_cache.set(cache_key, ''.join(raw_chunks), parsed_questions)
+
+        done = {'count': sent}
+        if source is not None and parsed_questions:
+            # A set made for count questions would be reused as the source's
+            # full set, so only complete streams are grouped
+            if saved and not count:
+                quiz_set, _ = save_quiz_set(source, saved)
+                done['quiz_set'] = quiz_set.pk
+            done['quizzes'] = [quiz.pk for quiz in saved]
+        yield emit('done', done)
+
+    except Exception as e:
+        yield emit('error', {'error': str(e), 'error_type': type(e).__name__, 'count': sent})
+
+def _parse_stream(response, raw_chunks: List[str]):
+    # Feed streamed chunks to the incremental parser, keeping the raw text for the cache
+    parser = QuizStreamParser()
+    for chunk in response:
+        raw_chunks.append(chunk.text)
+        yield parser.feed(chunk.text)
+    yield parser.close()
+
+@api_view(['POST'])
+def create_quizes_stream(request):
+    """
+    Stream quiz questions while the model is still generating.
+    Emits one "quiz" event per question, then "done" (or "error"), as
+    Server-Sent Events or, with "format": "ndjson", as one
+    {"event": ..., "data": ...} JSON object per line.
+    Pass "count" to ask for that many questions and stop the model once they
+    have been sent, and "persist": true to save the questions as they
+    complete; the "quiz" events then have their ids, and the "done" event
+    the ids of all of them and of the quiz set they were grouped in when no
+    count was given. A text whose quiz set is
+    already stored is replayed from it.
+    """
+    input_text = request.data.get('input_text')
+    if not input_text:
+        return Response({'error': 'Input text is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    stream_format = request.data.get('format', 'sse')
+    if stream_format not in STREAM_FORMATS:
+        return Response({'error': f"format must be one of {', '.join(STREAM_FORMATS)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    count = request.data.get('count')
+    if count is not None:
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            count = 0
+        if not 1 <= count <= settings.QUIZ_MAX_COUNT:
+            return Response({'error': f'count must be an integer from 1 to {settings.QUIZ_MAX_COUNT}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    persist = bool(request.data.get('persist', False))
+    source = Source.objects.for_request(request.data, input_text) if persist else None
+    emit, content_type = STREAM_FORMATS[stream_format]
+    response = StreamingHttpResponse(_stream_quizzes(input_text, count, source, emit), content_type=content_type)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _parse_fields(raw: str) -> List[str]:
+    """
+    Validate a comma-separated field selection against the serializer fields.
+    """
+    allowed = QuizSerializer.Meta.fields
+    if not raw:
+        return list(allowed)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    # The cursor is the id, so always return it
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+def _stream_rows(queryset, chunk_size: int):
+    # Emit a JSON array one row at a time so memory stays flat
+    yield '['
+    for i, row in enumerate(queryset.iterator(chunk_size=chunk_size)):
+        yield (',' if i else '') + json.dumps(row, ensure_ascii=False)
+    yield ']'
+
 @api_view(['GET'])
 def get_quizes(request):
-    quizes = Quiz.objects.all()
-    serializer = QuizSerializer(quizes, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    """
+    List quizzes ordered by id, using keyset pagination.
+
+    Query parameters:
+        cursor -- only return quizzes with an id greater than this
+        limit  -- page size (default QUIZ_PAGE_SIZE, at most QUIZ_MAX_PAGE_SIZE)
+        fields -- comma-separated subset of the serializer fields
+        q      -- only return questions containing this text
+        stream -- "1" streams every row after the cursor as one JSON array
+
+    The response body is a JSON list. Without cursor or limit every row is
+    returned, streamed as with stream=1. With either, one page is returned;
+    the cursor for the next page is sent in the X-Next-Cursor header and is
+    absent on the last page.
+    """
+    try:
+        fields = _parse_fields(request.query_params.get('fields', ''))
+        cursor = int(request.query_params.get('cursor', 0))
+        limit = int(request.query_params.get('limit', settings.QUIZ_PAGE_SIZE))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, settings.QUIZ_MAX_PAGE_SIZE))
+
+    quizes = Quiz.objects.filter(id__gt=cursor).order_by('id')
+    query = request.query_params.get('q')
+    if query:
+        quizes = quizes.filter(question__icontains=query)
+    rows = quizes.values(*fields)
+
+    paginated = 'cursor' in request.query_params or 'limit' in request.query_params
+    if request.query_params.get('stream') == '1' or not paginated:
+        return StreamingHttpResponse(
+            _stream_rows(rows, settings.QUIZ_STREAM_CHUNK_SIZE),
+            content_type='application/json'
+        )
+
+    page = list(rows[:limit + 1])
+    response = Response(page[:limit])
+    if len(page) > limit:
+        response['X-Next-Cursor'] = str(page[limit - 1]['id'])
+    return response
+
+@api_view(['GET'])
+def list_quiz_sets(request):
+    """
+    List the quiz sets generated from one text, with their questions.
+    Query parameters: source (the text hash) or transcript_id.
+    """
+    try:
+        quiz_sets = filter_by_source(quiz_set_queryset(), request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    quiz_sets = quiz_sets.order_by('-created_at', '-pk')
+    return Response(QuizSetSerializer(quiz_sets, many=True).data)
+
+@api_view(['GET'])
+def get_quiz_set(request, set_id):
+    """Return a quiz set and all of its questions."""
+    quiz_set = quiz_set_queryset().filter(pk=set_id).first()
+    if quiz_set is None:
+        return Response({'error': 'Quiz set not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(QuizSetSerializer(quiz_set).data)
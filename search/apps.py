@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'search'
+
+    def ready(self):
+        # Recreate the FTS triggers dropped when SQLite rebuilds a table
+        from .triggers import ensure_triggers
+        post_migrate.connect(ensure_triggers, sender=self, dispatch_uid='search.ensure_triggers')
@@ -0,0 +1,163 @@
+"""
+Search backends.
+
+The backend is chosen with the SEARCH_BACKEND setting (a dotted path). By
+default SQLiteFTSBackend is used on SQLite and DatabaseBackend elsewhere;
+another backend (e.g. PostgreSQL full-text search) only has to implement
+BaseBackend.
+
+Results are dicts with the kind ('card', 'quiz', 'diagram' or
+'transcript'), the object id, highlighted title and snippet texts, and a
+score (higher is better, null when the backend didn't rank them).
+"""
+import re
+from typing import Dict, List, Optional, Sequence
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+# kind: (model, title field, body fields); mirrored in migrations/0001_fts.py
+SOURCES = {
+    'card': ('cards.Card', 'question', ['answer']),
+    'quiz': ('quiz.Quiz', 'question', ['answer1', 'answer2', 'answer3', 'answer4']),
+    'diagram': ('mermiad.Diagram', 'title', ['source_text']),
+    'transcript': ('youtube.Youtube', 'url', ['text']),
+}
+KINDS = tuple(SOURCES)
+
+TOKEN = re.compile(r'\w+')
+MAX_TERMS = 16
+# Shorter last terms are matched whole: "a*" would expand to most of the vocabulary
+MIN_PREFIX_LENGTH = 3
+HIGHLIGHT = ('<mark>', '</mark>')
+ELLIPSIS = '…'
+SNIPPET_CHARS = 160
+
+Result = Dict[str, object]
+
+
+def terms(query: str) -> List[str]:
+    return TOKEN.findall(query)[:MAX_TERMS]
+
+
+class BaseBackend:
+    def search(self, query: str, kinds: Sequence[str] = KINDS, limit: int = 20, offset: int = 0) -> List[Result]:
+        """Return matches of every term in query, best first."""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseBackend):
+    """
+    Queries the FTS5 table created by search/migrations/0001_fts.py, which
+    triggers keep up to date. Results are ranked with BM25, question and
+    title matches weighing twice as much as body matches.
+
+    Ranking costs time per matching row, so queries matching more than
+    SEARCH_RANK_LIMIT rows (e.g. a short prefix) return the newest matches
+    unranked, with a null score, instead.
+    """
+    title_weight = 2.0
+    body_weight = 1.0
+
+    def match_expression(self, query: str) -> str:
+        words = terms(query)
+        if not words:
+            return ''
+        # Quoted so FTS5 operators in the input are taken literally
+        phrases = [f'"{word}"' for word in words]
+        if len(words[-1]) >= MIN_PREFIX_LENGTH:
+            # Match words being typed
+            phrases[-1] += '*'
+        return ' '.join(phrases)
+
+    def search(self, query, kinds=KINDS, limit=20, offset=0):
+        expression = self.match_expression(query)
+        if not expression or not kinds:
+            return []
+        where, params = 'search_fts MATCH %s', [expression]
+        if set(kinds) != set(KINDS):
+            where += f' AND kind IN ({", ".join(["%s"] * len(kinds))})'
+            params.extend(kinds)
+
+        rank_limit = getattr(settings, 'SEARCH_RANK_LIMIT', 5000)
+        start, end = HIGHLIGHT
+        with connection.cursor() as cursor:
+            # Bounded count: stops after rank_limit + 1 matches
+            cursor.execute(f'SELECT count(*) FROM (SELECT 1 FROM search_fts WHERE {where} LIMIT %s)',
+                           params + [rank_limit + 1])
+            ranked = cursor.fetchone()[0] <= rank_limit
+            score = 'bm25(search_fts, 0, 0, %s, %s)' if ranked else 'NULL'
+            order = 'score' if ranked else 'rowid DESC'
+            sql = (
+                'SELECT kind, object_id, '
+                'snippet(search_fts, 2, %s, %s, %s, 12), '
+                'snippet(search_fts, 3, %s, %s, %s, 24), '
+                f'{score} AS score '
+                f'FROM search_fts WHERE {where} ORDER BY {order} LIMIT %s OFFSET %s'
+            )
+            weights = [self.title_weight, self.body_weight] if ranked else []
+            cursor.execute(sql, [start, end, ELLIPSIS, start, end, ELLIPSIS, *weights, *params, limit, offset])
+            return [
+                {'kind': kind, 'id': object_id, 'title': title, 'snippet': body,
+                 'score': None if score is None else round(-score, 6)}
+                for kind, object_id, title, body, score in cursor.fetchall()
+            ]
+
+
+class DatabaseBackend(BaseBackend):
+    """
+    Portable fallback without an index: icontains filters on every model,
+    scored by the number of term occurrences. Fine for small tables only.
+    """
+
+    def search(self, query, kinds=KINDS, limit=20, offset=0):
+        words = terms(query)
+        if not words:
+            return []
+        pattern = re.compile('|'.join(re.escape(word) for word in words), re.IGNORECASE)
+        results = []
+        for kind in kinds:
+            label, title_field, body_fields = SOURCES[kind]
+            fields = [title_field] + body_fields
+            filters = Q()
+            for word in words:
+                filters &= Q(*[Q(**{f'{name}__icontains': word}) for name in fields], _connector=Q.OR)
+            rows = apps.get_model(label).objects.filter(filters).values_list('pk', *fields)
+            for pk, title, *body in rows.order_by('pk')[:offset + limit]:
+                body = ' '.join(text or '' for text in body)
+                results.append({
+                    'kind': kind,
+                    'id': pk,
+                    'title': highlight(title or '', pattern),
+                    'snippet': highlight(body, pattern),
+                    'score': 2 * len(pattern.findall(title or '')) + len(pattern.findall(body)),
+                })
+        results.sort(key=lambda result: -result['score'])
+        return results[offset:offset + limit]
+
+
+def highlight(text: str, pattern: re.Pattern) -> str:
+    """Cut text around the first match and mark every match."""
+    match = pattern.search(text)
+    begin = max(0, match.start() - SNIPPET_CHARS // 4) if match else 0
+    part = text[begin:begin + SNIPPET_CHARS]
+    start, end = HIGHLIGHT
+    part = pattern.sub(lambda m: f'{start}{m.group()}{end}', part)
+    return (ELLIPSIS if begin else '') + part + (ELLIPSIS if begin + SNIPPET_CHARS < len(text) else '')
+
+
+_backend: Optional[BaseBackend] = None
+
+
+def get_backend() -> BaseBackend:
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', '') or (
+            'search.backends.SQLiteFTSBackend' if connection.vendor == 'sqlite'
+            else 'search.backends.DatabaseBackend'
+        )
+        _backend = import_string(path)()
+    return _backend
@@ -0,0 +1,73 @@
+"""
+Full-text index for SQLite (search.backends.SQLiteFTSBackend).
+
+One FTS5 table indexes every searchable model. Triggers keep it in sync on
+insert, update and delete, which also covers bulk_create() and
+QuerySet.update(), and the existing rows are indexed here. The triggers
+are recreated after later migrations by search.triggers. On other
+databases this migration does nothing.
+"""
+from django.db import migrations
+
+# kind: (table, code, title column, body columns). The index rowid is
+# object id * 8 + code, so it is unique and derivable in the triggers.
+SOURCES = {
+    'card': ('cards_card', 1, 'question', ['answer']),
+    'quiz': ('quiz_quiz', 2, 'question', ['answer1', 'answer2', 'answer3', 'answer4']),
+    'diagram': ('mermiad_diagram', 3, 'title', ['source_text']),
+    'transcript': ('youtube_youtube', 4, 'url', ['text']),
+}
+
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE search_fts USING fts5(
+    kind UNINDEXED, object_id UNINDEXED, title, body,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '3'
+)
+"""
+
+
+def _values(kind, code, title, body, row):
+    body = " || ' ' || ".join(f"coalesce({row}{column}, '')" for column in body)
+    return f"{row}id * 8 + {code}, '{kind}', {row}id, coalesce({row}{title}, ''), {body}"
+
+
+def statements():
+    yield CREATE_TABLE
+    for kind, (table, code, title, body) in SOURCES.items():
+        insert = f'INSERT INTO search_fts (rowid, kind, object_id, title, body) VALUES ({_values(kind, code, title, body, "new.")});'
+        delete = f'DELETE FROM search_fts WHERE rowid = old.id * 8 + {code};'
+        yield f'CREATE TRIGGER search_{table}_ai AFTER INSERT ON {table} BEGIN {insert} END'
+        yield f'CREATE TRIGGER search_{table}_ad AFTER DELETE ON {table} BEGIN {delete} END'
+        columns = ', '.join(['id', title] + body)
+        yield f'CREATE TRIGGER search_{table}_au AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} END'
+        yield f'INSERT INTO search_fts (rowid, kind, object_id, title, body) SELECT {_values(kind, code, title, body, "")} FROM {table}'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in statements():
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, *_ in SOURCES.values():
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS search_{table}_{suffix}')
+    schema_editor.execute('DROP TABLE IF EXISTS search_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0002_fingerprint'),
+        ('quiz', '0002_fingerprint'),
+        ('mermiad', '0002_source_text'),
+        ('youtube', '0003_video_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
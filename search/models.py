@@ -0,0 +1,2 @@
+# The index is an FTS5 virtual table created by migrations/0001_fts.py, not
+# a Django model; this module lets the app receive post_migrate.
@@ -0,0 +1,63 @@
+from django.test import TestCase
+
+from cards.models import Card
+from quiz.models import Quiz
+from search.backends import DatabaseBackend, SQLiteFTSBackend
+
+
+class IndexTriggerTests(TestCase):
+    backend = SQLiteFTSBackend()
+
+    def ids(self, query, **kwargs):
+        return [(result['kind'], result['id']) for result in self.backend.search(query, **kwargs)]
+
+    def test_rows_are_indexed_on_insert_update_and_delete(self):
+        card = Card.objects.create(question='What is osmosis?', answer='Water crossing a membrane')
+        self.assertEqual(self.ids('osmosis'), [('card', card.pk)])
+
+        card.question = 'What is diffusion?'
+        card.save()
+        self.assertEqual(self.ids('osmosis'), [])
+        self.assertEqual(self.ids('diffusion'), [('card', card.pk)])
+
+        card.delete()
+        self.assertEqual(self.ids('diffusion'), [])
+
+    def test_question_matches_rank_above_answer_matches(self):
+        in_answer = Card.objects.create(question='Name the process', answer='Osmosis moves water')
+        in_question = Card.objects.create(question='Where does osmosis happen?', answer='Across membranes')
+        self.assertEqual(self.ids('osmosis'), [('card', in_question.pk), ('card', in_answer.pk)])
+
+    def test_kind_filter_and_prefix(self):
+        card = Card.objects.create(question='What is a ribosome?', answer='Protein factory')
+        quiz = Quiz.objects.create(question='Where are ribosomes found?', answer1='Cytoplasm', answer2='Nucleus',
+                                   answer3='Wall', answer4='Vacuole')
+        self.assertEqual(sorted(self.ids('ribo')), sorted([('card', card.pk), ('quiz', quiz.pk)]))
+        self.assertEqual(self.ids('ribo', kinds=['quiz']), [('quiz', quiz.pk)])
+
+    def test_query_operators_are_taken_literally(self):
+        Card.objects.create(question='Osmosis AND diffusion', answer='Both move molecules')
+        self.assertEqual(self.backend.search('"osmosis NOT (diffusion'), [])
+        self.assertEqual(len(self.backend.search('osmosis AND')), 1)
+
+    def test_database_backend_finds_the_same_rows(self):
+        card = Card.objects.create(question='What is osmosis?', answer='Water crossing a membrane')
+        Card.objects.create(question='What is a ribosome?', answer='Protein factory')
+        self.assertEqual([(result['kind'], result['id']) for result in DatabaseBackend().search('osmosis water')],
+                         [('card', card.pk)])
+
+
+class SearchViewTests(TestCase):
+    def test_pagination_header(self):
+        for i in range(3):
+            Card.objects.create(question=f'Osmosis question {i}', answer='answer')
+        response = self.client.get('/api/search/', {'q': 'osmosis', 'limit': 2})
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(response['X-Next-Offset'], '2')
+        response = self.client.get('/api/search/', {'q': 'osmosis', 'limit': 2, 'offset': 2})
+        self.assertEqual(len(response.json()), 1)
+        self.assertNotIn('X-Next-Offset', response)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'x', 'kind': 'video'}).status_code, 400)
@@ -0,0 +1,46 @@
+"""
+Triggers keeping the FTS5 index (search/migrations/0001_fts.py) in sync.
+
+SQLite drops a table's triggers when a migration rebuilds the table (e.g.
+to add a foreign key), so they are recreated after every migrate run by
+the post_migrate handler registered in SearchConfig.ready().
+"""
+from django.apps import apps
+
+from .backends import SOURCES
+
+# Part of the index rowid (object id * 8 + code); must not change
+KIND_CODES = {'card': 1, 'quiz': 2, 'diagram': 3, 'transcript': 4}
+
+
+def _values(kind: str, title: str, body, row: str) -> str:
+    body = " || ' ' || ".join(f"coalesce({row}{column}, '')" for column in body)
+    return f"{row}id * 8 + {KIND_CODES[kind]}, '{kind}', {row}id, coalesce({row}{title}, ''), {body}"
+
+
+def statements():
+    for kind, (label, title_field, body_fields) in SOURCES.items():
+        meta = apps.get_model(label)._meta
+        table = meta.db_table
+        title = meta.get_field(title_field).column
+        body = [meta.get_field(name).column for name in body_fields]
+        insert = (f'INSERT INTO search_fts (rowid, kind, object_id, title, body) '
+                  f'VALUES ({_values(kind, title, body, "new.")});')
+        delete = f'DELETE FROM search_fts WHERE rowid = old.id * 8 + {KIND_CODES[kind]};'
+        columns = ', '.join(['id', title] + body)
+        yield f'CREATE TRIGGER IF NOT EXISTS search_{table}_ai AFTER INSERT ON {table} BEGIN {insert} END'
+        yield f'CREATE TRIGGER IF NOT EXISTS search_{table}_ad AFTER DELETE ON {table} BEGIN {delete} END'
+        yield (f'CREATE TRIGGER IF NOT EXISTS search_{table}_au AFTER UPDATE OF {columns} ON {table} '
+               f'BEGIN {delete} {insert} END')
+
+
+def ensure_triggers(using: str = 'default', **kwargs) -> None:
+    """Create any missing index triggers (post_migrate handler)."""
+    from django.db import connections
+
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or 'search_fts' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for sql in statements():
+            cursor.execute(sql)
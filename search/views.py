@@ -0,0 +1,44 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from .backends import KINDS, get_backend
+
+
+@api_view(['GET'])
+def search(request):
+    """
+    Full-text search over cards, quizzes, diagrams and transcripts.
+
+    Query parameters:
+        q      -- the words to find (the last one also matches as a prefix)
+        kind   -- comma-separated subset of card, quiz, diagram, transcript
+        offset -- number of results to skip
+        limit  -- page size (default SEARCH_PAGE_SIZE, at most SEARCH_MAX_PAGE_SIZE)
+
+    The response body is a JSON list of results, best first, with matches
+    wrapped in <mark> tags; the offset of the next page is sent in the
+    X-Next-Offset header and is absent on the last page.
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'Query is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind] or list(KINDS)
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown:
+        return Response({'error': f'Unknown kind: {", ".join(unknown)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        offset = max(0, int(request.query_params.get('offset', 0)))
+        limit = int(request.query_params.get('limit', settings.SEARCH_PAGE_SIZE))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, settings.SEARCH_MAX_PAGE_SIZE))
+
+    # One extra row tells whether there is a next page without counting matches
+    results = get_backend().search(query, kinds, limit + 1, offset)
+    response = Response(results[:limit])
+    if len(results) > limit:
+        response['X-Next-Offset'] = str(offset + limit)
+    return response
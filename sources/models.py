@@ -0,0 +1,90 @@
+import hashlib
+import json
+from typing import Dict, Optional
+
+from django.db import models
+from django.utils import timezone
+
+from pfe.generation_cache import normalize_text
+from pfe.language import detect_language
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 of the whitespace-normalized text."""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def options_hash(options: Optional[Dict] = None) -> str:
+    """SHA-256 of the generation options, so sets made with other options are kept apart."""
+    payload = json.dumps(options or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def filter_by_source(queryset, params):
+    """
+    Filter a queryset of rows with a source foreign key on the source or
+    transcript_id query parameter. Raises ValueError when neither is valid.
+    """
+    if params.get('source'):
+        return queryset.filter(source__text_hash=params['source'])
+    if params.get('transcript_id'):
+        try:
+            return queryset.filter(source__transcript_id=int(params['transcript_id']))
+        except ValueError:
+            raise ValueError('transcript_id must be an integer')
+    raise ValueError('source or transcript_id is required')
+
+
+class SourceManager(models.Manager):
+    def for_text(self, text: str, language: str = '', transcript=None, origin_url: str = '') -> 'Source':
+        """Return the Source row for text, creating it on first use."""
+        if transcript is not None and not origin_url:
+            origin_url = transcript.url
+        source, _ = self.get_or_create(
+            text_hash=text_hash(text),
+            defaults={'language': language, 'transcript': transcript, 'origin_url': origin_url},
+        )
+        return source
+
+    def for_request(self, data, text: str) -> 'Source':
+        """Source for a request's input, linked to the transcript named by transcript_id."""
+        from youtube.models import Youtube
+
+        transcript = None
+        if data.get('transcript_id') and not data.get('input_text'):
+            transcript = Youtube.objects.filter(pk=data['transcript_id']).first()
+        return self.for_text(text, detect_language(text), transcript)
+
+    async def afor_request(self, data, text: str) -> 'Source':
+        """Async variant of for_request()."""
+        from youtube.models import Youtube
+
+        transcript = None
+        if data.get('transcript_id') and not data.get('input_text'):
+            transcript = await Youtube.objects.filter(pk=data['transcript_id']).afirst()
+        return await self.afor_text(text, detect_language(text), transcript)
+
+    async def afor_text(self, text: str, language: str = '', transcript=None, origin_url: str = '') -> 'Source':
+        if transcript is not None and not origin_url:
+            origin_url = transcript.url
+        source, _ = await self.aget_or_create(
+            text_hash=text_hash(text),
+            defaults={'language': language, 'transcript': transcript, 'origin_url': origin_url},
+        )
+        return source
+
+
+class Source(models.Model):
+    """An input text that content was generated from, identified by its hash."""
+
+    text_hash = models.CharField(max_length=64, unique=True)
+    language = models.CharField(max_length=20, blank=True, default='')
+    origin_url = models.CharField(max_length=500, blank=True, default='')
+    transcript = models.ForeignKey('youtube.Youtube', null=True, blank=True, on_delete=models.SET_NULL,
+                                   related_name='sources')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, editable=False)
+
+    objects = SourceManager()
+
+    def __str__(self):
+        return self.origin_url or self.text_hash[:12]
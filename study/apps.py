@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class StudyConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'study'
+
+    def ready(self):
+        # Register the study pack prompt templates once at startup
+        from . import prompts  # noqa: F401
@@ -0,0 +1,73 @@
+"""
+Study pack prompt templates, registered with the shared prompt registry.
+'study_pack' wraps the input text; {sections} is filled with one
+'study_pack_<kind>' template per requested kind, each introduced by the
+marker line matched by SECTION_MARKER.
+"""
+import re
+
+from cards.prompts import DEFAULT_CUSTOMIZATIONS as CARD_DEFAULTS
+from pfe.prompts import registry
+from quiz.prompts import DEFAULT_CUSTOMIZATIONS as QUIZ_DEFAULTS
+
+# "### CARDS ###", "### QUIZ ###", "### DIAGRAM ###", tolerating markdown decoration
+SECTION_MARKER = re.compile(r'^[ \t*#]*#{2,}\s*(CARDS|QUIZ|DIAGRAM)\s*#{2,}[ \t*]*$', re.MULTILINE | re.IGNORECASE)
+
+STUDY_PACK_PROMPTS = {
+    "english": """
+        You are an expert educator. Create the study material described in the
+        sections below from the input text. Write all of it in the language of
+        the input text.
+
+        Answer with every section below, in order. Start each section with its
+        marker line exactly as shown (for example "### CARDS ###") and follow it
+        with that section's content only.
+        {sections}
+        Input text:
+        {input_text}
+        """
+}
+
+SECTION_PROMPTS = {
+    'cards': {
+        "english": """
+        ### CARDS ###
+        Flashcards on the key concepts, definitions and facts of the text:
+           - Minimum cards: {min_cards}
+           - Maximum cards: {max_cards}
+           - Question format: {question_format}
+           - Answer length: {answer_length}
+           - Include {special_focus} concepts
+           - {special_instructions}
+        Format each card as the question on one line and its answer on the next
+        line, and separate cards with a blank line.
+        """
+    },
+    'quiz': {
+        "english": """
+        ### QUIZ ###
+        {min_questions} to {max_questions} multiple-choice questions testing
+        comprehension of the text, each with one correct answer and three
+        plausible incorrect ones, in this exact format:
+        Question: [Question text here]
+        a) [First answer]
+        b) [Second answer]
+        c) [Third answer]
+        d) [Fourth answer]
+        """
+    },
+    'diagram': {
+        "english": """
+        ### DIAGRAM ###
+        One Mermaid diagram summarizing the main concepts of the text and how
+        they relate, in a ```mermaid block. Start with 'graph TD' on its own
+        line, use alphanumeric node ids, put node texts in square brackets and
+        keep them concise, with at most 3-4 nodes per level.
+        """
+    },
+}
+
+registry.register('study_pack', STUDY_PACK_PROMPTS)
+registry.register('study_pack_cards', SECTION_PROMPTS['cards'], defaults=CARD_DEFAULTS)
+registry.register('study_pack_quiz', SECTION_PROMPTS['quiz'], defaults=QUIZ_DEFAULTS)
+registry.register('study_pack_diagram', SECTION_PROMPTS['diagram'])
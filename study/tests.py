@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+
+from study import views
+
+
+class TranscriptIdTests(TestCase):
+    def test_non_integer_transcript_id_is_rejected(self):
+        response = self.client.post('/api/study/create/', {'transcript_id': 'abc'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'transcript_id must be an integer'})
+
+
+PACK = '''### CARDS ###
+What is osmosis?
+Water movement
+
+**### QUIZ ###**
+Question: What is diffusion?
+a) Spreading
+b) Binding
+c) Folding
+d) Cutting
+
+### DIAGRAM ###
+```mermaid
+graph TD
+A[Osmosis] --> B[Diffusion]
+```
+
+### CARDS ###
+Repeated section?
+Ignored
+'''
+
+
+class SectionTests(SimpleTestCase):
+    def test_split_sections_keeps_the_first_section_of_each_kind(self):
+        sections = views.split_sections(PACK)
+        self.assertEqual(list(sections), ['cards', 'quiz', 'diagram'])
+        self.assertEqual(sections['cards'], 'What is osmosis?\nWater movement')
+
+    def test_parse_sections_routes_each_section_to_its_parser(self):
+        parsed = views.parse_sections(PACK, views.KINDS)
+        self.assertEqual(parsed['cards'], [{'question': 'What is osmosis?', 'answer': 'Water movement'}])
+        self.assertEqual(parsed['quiz'][0]['answer4'], 'Cutting')
+        self.assertEqual(parsed['diagram'], 'graph TD\n    A[Osmosis] --> B[Diffusion]')
+
+    def test_only_requested_valid_sections_are_kept(self):
+        self.assertEqual(list(views.parse_sections(PACK, ['quiz'])), ['quiz'])
+        self.assertEqual(views.parse_sections('### QUIZ ###\nno questions here', ['quiz']), {})
+
+
+class StudyPackTests(TestCase):
+    def test_one_model_call_then_stored_parts_are_reused(self):
+        data = {'input_text': 'Osmosis and diffusion move molecules across membranes.'}
+        with mock.patch.object(views.llm, 'generate', return_value=SimpleNamespace(text=PACK)) as generate:
+            created = self.client.post('/api/study/create/', data, content_type='application/json')
+            reused = self.client.post('/api/study/create/', data, content_type='application/json')
+
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(generate.call_args.args[0], settings.STUDY_PACK_MODEL)
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(created.json()['generated'], ['cards', 'quiz', 'diagram'])
+        self.assertEqual(reused.status_code, 200)
+        self.assertEqual(reused.json()['generated'], [])
+        self.assertEqual(reused.json()['deck'], created.json()['deck'])
+
+    def test_missing_kinds_fall_back_to_their_own_generation(self):
+        with mock.patch.object(views.llm, 'generate', return_value=SimpleNamespace(text='### CARDS ###\nQ?\nA')), \
+                mock.patch.dict(views.FALLBACKS, {'quiz': mock.Mock(side_effect=RuntimeError('quota'))}):
+            response = self.client.post('/api/study/create/', {'input_text': 'Cells', 'kinds': ['cards', 'quiz']},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['generated'], ['cards'])
+        self.assertEqual(response.json()['errors'], {'quiz': 'quota'})
+
+    def test_unknown_kind_is_rejected(self):
+        response = self.client.post('/api/study/create/', {'input_text': 'Cells', 'kinds': ['video']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('create/', views.create_study_pack, name='create_study_pack'),
+]
@@ -0,0 +1,234 @@
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from django.conf import settings
+from django.db import transaction
+from .prompts import SECTION_MARKER
+from cards.models import Card
+from cards.serializers import CardSerializer
+from cards.views import deck_queryset, generate_card_data, get_customizations, parse_flashcards, save_deck
+from mermiad.models import Diagram
+from mermiad.serializers import DiagramSerializer
+from mermiad.views import InvalidDiagramError, generate_diagram_code, repair_diagram
+from quiz.models import Quiz
+from quiz.serializers import QuizSerializer
+from quiz.views import generate_quiz_data, parse_quiz_blocks, quiz_set_queryset, save_quiz_set
+from sources.models import Source, options_hash
+from youtube.models import Youtube
+from pfe import fingerprint, generation_cache, llm, long_input, tracing
+from pfe.batch_writer import bulk_save
+from pfe.language import detect_language
+from pfe.prompts import registry
+from pfe.rate_limit import RateLimited
+from typing import Dict, List, Sequence, Tuple
+
+KINDS = ('cards', 'quiz', 'diagram')
+
+def build_prompt(input_text: str, kinds: Sequence[str], customizations: Dict) -> str:
+    """The study pack prompt asking for one section per kind."""
+    sections = ''.join(
+        registry.build(f'study_pack_{kind}', 'english', '', customizations if kind == 'cards' else None)
+        for kind in kinds
+    )
+    return registry.build('study_pack', 'english', input_text, {'sections': sections})
+
+def split_sections(content: str) -> Dict[str, str]:
+    """
+    Split a study pack answer on its "### KIND ###" marker lines. Returns the
+    text of each section by kind; a repeated kind keeps its first section.
+    """
+    sections = {}
+    matches = list(SECTION_MARKER.finditer(content))
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following else len(content)
+        sections.setdefault(match.group(1).lower(), content[match.end():end].strip())
+    return sections
+
+def parse_sections(content: str, kinds: Sequence[str]) -> Dict:
+    """
+    Route each section of the answer to the parser of its kind. Sections that
+    are missing or yield nothing valid are left out.
+    """
+    sections = split_sections(content)
+    parsed = {}
+    with tracing.span('parse'):
+        if 'cards' in kinds and sections.get('cards'):
+            parsed['cards'] = parse_flashcards(sections['cards'])
+        if 'quiz' in kinds and sections.get('quiz'):
+            parsed['quiz'] = parse_quiz_blocks(sections['quiz'])
+    if 'diagram' in kinds and sections.get('diagram'):
+        try:
+            parsed['diagram'] = repair_diagram(sections['diagram'])
+        except InvalidDiagramError:
+            pass
+    return {kind: value for kind, value in parsed.items() if value}
+
+# Generates one kind on its own: (input_text, language, customizations) -> parsed
+FALLBACKS = {
+    'cards': lambda input_text, language, customizations: generate_card_data(input_text, customizations),
+    'quiz': lambda input_text, language, customizations: generate_quiz_data(input_text),
+    'diagram': lambda input_text, language, customizations: generate_diagram_code(input_text, language),
+}
+
+def generate_parts(input_text: str, language: str, kinds: Sequence[str], customizations: Dict) -> Tuple[Dict, Dict]:
+    """
+    Generate every kind with one model call. Kinds the answer lacks are
+    generated on their own. Returns (parsed by kind, error by kind).
+    """
+    with tracing.span('cache'):
+        cache_key = generation_cache.make_key('study_pack', settings.STUDY_PACK_MODEL, language, input_text,
+                                              {'kinds': list(kinds), **customizations})
+        cached = generation_cache.get(cache_key)
+
+    if cached is not None:
+        parsed = dict(cached['parsed'])
+    else:
+        with tracing.span('prompt'):
+            prompt = build_prompt(input_text, kinds, customizations)
+        response = llm.generate(settings.STUDY_PACK_MODEL, prompt)
+        parsed = parse_sections(response.text, kinds)
+        if parsed:
+            generation_cache.set(cache_key, response.text, parsed)
+
+    errors = {}
+    for kind in kinds:
+        if kind in parsed:
+            continue
+        try:
+            value = FALLBACKS[kind](input_text, language, customizations)
+        except RateLimited:
+            raise
+        except Exception as e:
+            errors[kind] = str(e)
+            continue
+        if value:
+            parsed[kind] = value
+        else:
+            errors[kind] = 'Nothing valid was generated'
+    return parsed, errors
+
+def save_parts(parsed: Dict, source: Source, input_text: str, language: str, customizations: Dict) -> Dict:
+    """Save the generated kinds and group them, all in one transaction."""
+    with tracing.span('db_write'):
+        # Near-duplicates are looked up first, so the write lock is only held for the inserts
+        cards, quizzes, diagrams = fingerprint.resolve_groups([
+            [Card(question=card_data['question'], answer=card_data['answer'], source=source)
+             for card_data in parsed.get('cards', [])],
+            [Quiz(**question_data, source=source) for question_data in parsed.get('quiz', [])],
+            [Diagram(title=parsed['diagram'], source_text=input_text, language=language, source=source)]
+            if 'diagram' in parsed else [],
+        ])
+        with transaction.atomic():
+            bulk_save(obj for group in (cards, quizzes, diagrams) for obj in group if obj.pk is None)
+            saved = {}
+            if cards:
+                saved['cards'] = save_deck(source, options_hash(customizations), cards)
+            if quizzes:
+                saved['quiz'] = save_quiz_set(source, quizzes)
+            if diagrams:
+                saved['diagram'] = diagrams[0]
+    return saved
+
+def stored_parts(source: Source, kinds: Sequence[str], customizations: Dict) -> Dict:
+    """The kinds already generated from source, as saved by save_parts()."""
+    stored = {}
+    if 'cards' in kinds:
+        deck = deck_queryset().filter(source=source, options_hash=options_hash(customizations)).first()
+        if deck is not None:
+            stored['cards'] = (deck, list(deck.cards.all()))
+    if 'quiz' in kinds:
+        quiz_set = quiz_set_queryset().filter(source=source).first()
+        if quiz_set is not None:
+            stored['quiz'] = (quiz_set, list(quiz_set.quizzes.all()))
+    if 'diagram' in kinds:
+        diagram = source.diagrams.order_by('-created_at', '-pk').first()
+        if diagram is not None:
+            stored['diagram'] = diagram
+    return stored
+
+def _parse_kinds(value) -> List[str]:
+    if value is None:
+        return list(KINDS)
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise ValueError('kinds must be a list')
+    kinds = [kind.strip() for kind in value if isinstance(kind, str) and kind.strip()]
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown or not kinds:
+        raise ValueError(f"kinds must be a non-empty subset of {', '.join(KINDS)}")
+    # Canonical order, so the prompt and cache key don't depend on it
+    return [kind for kind in KINDS if kind in kinds]
+
+@api_view(['POST'])
+def create_study_pack(request):
+    """
+    Create flashcards, quiz questions and a Mermaid diagram for one text with
+    a single model call, instead of one call per endpoint.
+
+    Body: {"input_text": ... or "transcript_id": ..., "kinds": ["cards", "quiz",
+    "diagram"], <flashcard customization options>}. The answer is split into
+    one section per kind and each section goes through the parser of its
+    endpoint; kinds the answer lacks are generated on their own. Kinds already
+    generated from the same text are reused, and everything new is saved in
+    one transaction. The response has the items of each kind, the deck and
+    quiz set ids, and "errors" for kinds that could not be generated; the
+    status is 200 when nothing had to be generated.
+    """
+    try:
+        input_text = long_input.resolve_input_text(request.data)
+    except Youtube.DoesNotExist:
+        return Response({'error': 'Transcript not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not input_text:
+        return Response({'error': 'Input text is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        kinds = _parse_kinds(request.data.get('kinds'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        customizations = get_customizations(request.data)
+        with tracing.span('detect_language'):
+            language = detect_language(input_text)
+        with tracing.span('source'):
+            source = Source.objects.for_request(request.data, input_text)
+            parts = stored_parts(source, kinds, customizations)
+
+        missing = [kind for kind in kinds if kind not in parts]
+        errors = {}
+        if missing:
+            parsed, errors = generate_parts(input_text, language, missing, customizations)
+            parts.update(save_parts(parsed, source, input_text, language, customizations))
+
+        with tracing.span('serialize'):
+            data = {'source': source.text_hash, 'generated': [kind for kind in missing if kind in parts]}
+            if 'cards' in parts:
+                deck, cards = parts['cards']
+                data['deck'] = deck.pk
+                data['cards'] = CardSerializer(cards, many=True).data
+            if 'quiz' in parts:
+                quiz_set, quizzes = parts['quiz']
+                data['quiz_set'] = quiz_set.pk
+                data['quiz'] = QuizSerializer(quizzes, many=True).data
+            if 'diagram' in parts:
+                data['diagram'] = DiagramSerializer(parts['diagram']).data
+                data['mermaid_code'] = parts['diagram'].title
+            if errors:
+                data['errors'] = errors
+
+        if not any(kind in parts for kind in kinds):
+            return Response({'error': 'Nothing valid was generated', 'errors': errors},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(data, status=status.HTTP_201_CREATED if data['generated'] else status.HTTP_200_OK)
+
+    except RateLimited as e:
+        return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={'Retry-After': str(e.retry_after)})
+
+    except Exception as e:
+        return Response({
+            'error': str(e),
+            'error_type': type(e).__name__
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:11
+
+import re
+
+from django.db import migrations, models
+
+
+def backfill_video_ids(apps, schema_editor):
+    # Give each video id to its most recent row; older duplicates keep NULL
+    Youtube = apps.get_model('youtube', 'Youtube')
+    seen = set()
+    for row in Youtube.objects.order_by('-id').only('id', 'url'):
+        match = re.search(r'(?:v=|\/)([0-9A-Za-z_-]{11}).*', row.url)
+        if match and match.group(1) not in seen:
+            seen.add(match.group(1))
+            Youtube.objects.filter(pk=row.pk).update(video_id=match.group(1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0002_youtube_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='youtube',
+            name='fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='youtube',
+            name='video_id',
+            field=models.CharField(blank=True, max_length=11, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_video_ids, migrations.RunPython.noop),
+    ]
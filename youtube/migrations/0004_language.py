@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0003_video_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='youtube',
+            name='language',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
@@ -2,5 +2,8 @@ from django.db import models
 
 class Youtube(models.Model):
     url = models.CharField(max_length=200, default='default-url')  # Add default value
+    video_id = models.CharField(max_length=11, unique=True, null=True, blank=True)
     text = models.TextField()
-    
\ No newline at end of file
+    # Code of the transcript's language, e.g. 'en'
+    language = models.CharField(max_length=20, blank=True, default='')
+    fetched_at = models.DateTimeField(null=True, blank=True)
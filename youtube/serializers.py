@@ -4,4 +4,4 @@ from .models import Youtube
 class YoutubeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Youtube
-        fields = ['id', 'text', 'url']
+        fields = ['id', 'text', 'url', 'video_id', 'language', 'fetched_at']
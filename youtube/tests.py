@@ -1,3 +1,106 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TransactionTestCase
+
+from youtube import views
+from youtube.models import Youtube
+
+
+class GetTranscriptTests(TransactionTestCase):
+    def test_only_the_fetching_request_reports_fetched(self):
+        started, release = threading.Event(), threading.Event()
+
+        def fetch_transcript(video_id, *args, **kwargs):
+            started.set()
+            release.wait(5)
+            return 'transcript text', 'en', False
+
+        results = {}
+
+        def request(name):
+            try:
+                results[name] = views.get_transcript('dQw4w9WgXcQ', 'https://youtu.be/dQw4w9WgXcQ')[1]
+            finally:
+                connection.close()
+
+        with mock.patch.object(views, 'fetch_transcript', fetch_transcript):
+            leader = threading.Thread(target=request, args=('leader',))
+            leader.start()
+            started.wait(5)
+            followers = [threading.Thread(target=request, args=(f'follower{i}',)) for i in range(3)]
+            for thread in followers:
+                thread.start()
+            time.sleep(0.2)
+            release.set()
+            for thread in [leader, *followers]:
+                thread.join(5)
+
+        self.assertEqual(results, {'leader': True, 'follower0': False, 'follower1': False, 'follower2': False})
+        self.assertEqual(Youtube.objects.filter(video_id='dQw4w9WgXcQ').count(), 1)
+
+    def test_fresh_stored_transcript_is_reused(self):
+        with mock.patch.object(views, 'fetch_transcript', return_value=('transcript text', 'en', False)) as fetch:
+            self.assertTrue(views.get_transcript('dQw4w9WgXcQ', 'https://youtu.be/dQw4w9WgXcQ')[1])
+            self.assertFalse(views.get_transcript('dQw4w9WgXcQ', 'https://youtu.be/dQw4w9WgXcQ')[1])
+        self.assertEqual(fetch.call_count, 1)
+
+
+class CaptionsBulkTests(TransactionTestCase):
+    url = '/api/youtube/get_captions/bulk/'
+
+    def post(self, **data):
+        return self.client.post(self.url, {'urls': ['https://youtu.be/abcdefghijk'], **data},
+                                content_type='application/json')
+
+    def test_translate_is_parsed_explicitly(self):
+        cases = [(None, True), (False, False), ('false', False), ('0', False), ('no', False),
+                 ('true', True), ('1', True), ('Yes', True)]
+        for value, expected in cases:
+            Youtube.objects.all().delete()
+            data = {} if value is None else {'translate': value}
+            with self.subTest(translate=value), \
+                    mock.patch.object(views, 'fetch_transcript', return_value=('text', 'en', False)) as fetch:
+                self.assertEqual(self.post(**data).status_code, 200)
+                self.assertIs(fetch.call_args.args[2], expected)
+
+    def test_timed_out_fetches_stay_on_the_bulk_pool(self):
+        release = threading.Event()
+        threads = []
+
+        def fetch_transcript(video_id, languages, translate):
+            threads.append(threading.current_thread().name)
+            release.wait(5)
+            return 'text', 'en', False
+
+        self.addCleanup(release.set)
+        with mock.patch.object(views, 'fetch_transcript', fetch_transcript), \
+                self.settings(YOUTUBE_BULK_TIMEOUT=0.05):
+            response = self.post()
+            self.assertEqual(response.json()['results'][0]['status'], 'timeout')
+        # The abandoned fetch holds a bulk thread, not one of the shared pool
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('transcript'))
+        self.assertFalse(Youtube.objects.exists())
+
+
+class CaptionsAsyncTests(TransactionTestCase):
+    url = '/api/youtube/get_captions/async/'
+
+    async def post(self, data):
+        return await self.async_client.post(self.url, data, content_type='application/json')
+
+    async def test_transcript_is_fetched_once_then_reused(self):
+        with mock.patch.object(views, 'fetch_transcript', return_value=('transcript text', 'en', False)) as fetch:
+            created = await self.post({'url': 'https://www.youtube.com/watch?v=abcdefghijk'})
+            reused = await self.post({'url': 'https://youtu.be/abcdefghijk'})
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual((created.status_code, reused.status_code), (201, 200))
+        self.assertEqual(created.json()['text'], 'transcript text')
+        self.assertEqual(reused.json()['id'], created.json()['id'])
+
+    async def test_invalid_urls_are_rejected(self):
+        self.assertEqual((await self.post({})).status_code, 400)
+        self.assertEqual((await self.post({'url': 'https://example.com/'})).status_code, 400)
@@ -2,4 +2,6 @@ from django.urls import path
 from . import views
 urlpatterns = [
     path('get_captions/', views.get_captions, name='get_captions'),
+    path('get_captions/async/', views.get_captions_async, name='get_captions_async'),
+    path('get_captions/bulk/', views.get_captions_bulk, name='get_captions_bulk'),
 ]
\ No newline at end of file
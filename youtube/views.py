@@ -1,10 +1,124 @@
+import asyncio
 import re
+from datetime import timedelta
+from asgiref.sync import async_to_sync
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from .models import Youtube
 from .serializers import YoutubeSerializer
-from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api import NoTranscriptFound, YouTubeTranscriptApi
+from pfe import tracing
+from pfe.async_utils import make_executor, parse_json_body, run_blocking, run_in
+from pfe.single_flight import SingleFlight
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Coalesces concurrent fetches of the same video
+_transcript_fetches = SingleFlight()
+
+# Bulk fetches run on their own pool: youtube_transcript_api sets no HTTP
+# timeout, so a fetch that times out keeps its thread until YouTube answers
+_bulk_executor = None
+
+
+def get_bulk_executor():
+    global _bulk_executor
+    if _bulk_executor is None:
+        _bulk_executor = make_executor(settings.YOUTUBE_BULK_MAX_WORKERS, 'transcript')
+    return _bulk_executor
+
+
+def extract_video_id(url):
+    # Regex pattern to match different YouTube URL formats
+    video_id_match = re.search(r'(?:v=|\/)([0-9A-Za-z_-]{11}).*', url)
+    return video_id_match.group(1) if video_id_match else None
+
+
+def extract_playlist_id(value):
+    # A playlist URL ("...?list=PL...") or a bare playlist id
+    match = re.search(r'[?&]list=([0-9A-Za-z_-]+)', value)
+    if match:
+        return match.group(1)
+    return value if re.fullmatch(r'[0-9A-Za-z_-]{10,}', value) else None
+
+
+def fetch_transcript(video_id, languages: Optional[Sequence[str]] = None,
+                     translate: bool = False) -> Tuple[str, str, bool]:
+    """
+    Fetch the transcript in the first available of languages (default
+    YOUTUBE_TRANSCRIPT_LANGUAGES) and join its segments into plain text.
+    With translate, a video that has none of them is translated by YouTube
+    into the first one. Returns (text, language code, translated).
+    """
+    languages = list(languages or settings.YOUTUBE_TRANSCRIPT_LANGUAGES)
+    with tracing.span('transcript'):
+        transcripts = YouTubeTranscriptApi.list_transcripts(video_id)
+        try:
+            transcript, translated = transcripts.find_transcript(languages), False
+        except NoTranscriptFound:
+            original = next((t for t in transcripts if t.is_translatable), None) if translate else None
+            if original is None:
+                raise
+            transcript, translated = original.translate(languages[0]), True
+        segments = transcript.fetch()
+    return ' '.join(item['text'] for item in segments), transcript.language_code, translated
+
+
+def fetch_transcript_text(video_id):
+    # Fetch the transcript and join its segments into plain text
+    return fetch_transcript(video_id)[0]
+
+
+def is_fresh(youtube):
+    # A stored transcript is reused until it is older than YOUTUBE_TRANSCRIPT_MAX_AGE
+    # seconds; None means stored transcripts never expire
+    max_age = settings.YOUTUBE_TRANSCRIPT_MAX_AGE
+    if youtube.fetched_at is None:
+        return False
+    return max_age is None or timezone.now() - youtube.fetched_at < timedelta(seconds=max_age)
+
+
+def _fetch_and_store(video_id, url):
+    # Another request may have stored it while we waited for the single-flight slot
+    youtube = Youtube.objects.filter(video_id=video_id).first()
+    if youtube is not None and is_fresh(youtube):
+        return youtube, False
+    text, language, _ = fetch_transcript(video_id)
+    with tracing.span('db_write'):
+        youtube, _ = Youtube.objects.update_or_create(
+            video_id=video_id,
+            defaults={'url': url, 'text': text, 'language': language, 'fetched_at': timezone.now()},
+        )
+    return youtube, True
+
+
+def get_transcript(video_id, url):
+    """
+    Return (youtube, fetched) for a video: the stored row if it is fresh,
+    otherwise a newly fetched transcript. Concurrent requests for the same
+    video in this process share one fetch, and only the request that made
+    it reports fetched; the unique video_id keeps other processes from
+    storing duplicates.
+    """
+    youtube = Youtube.objects.filter(video_id=video_id).first()
+    if youtube is not None and is_fresh(youtube):
+        return youtube, False
+    (youtube, fetched), shared = _transcript_fetches.do_shared(video_id, lambda: _fetch_and_store(video_id, url))
+    return youtube, fetched and not shared
+
+
+def save_captions(url):
+    # Fetch (or reuse) the transcript for a YouTube URL; shared by the view
+    # and the background job handler
+    video_id = extract_video_id(url)
+    if not video_id:
+        raise ValueError('Invalid YouTube URL')
+    return get_transcript(video_id, url)[0]
 
 
 @api_view(['POST'])
@@ -12,30 +126,204 @@ def get_captions(request):
     url = request.data.get('url')
     if not url:
         return Response({'error': 'URL is required'}, status=400)
-    
-    # Regex pattern to match different YouTube URL formats
-    video_id_match = re.search(r'(?:v=|\/)([0-9A-Za-z_-]{11}).*', url)
-    
-    if not video_id_match:
+
+    video_id = extract_video_id(url)
+
+    if not video_id:
         return Response({'error': 'Invalid YouTube URL'}, status=400)
 
-    video_id = video_id_match.group(1)
+    try:
+        # Reuse the stored transcript, or fetch and store it
+        youtube, fetched = get_transcript(video_id, url)
+
+        # Serialize the Youtube instance
+        with tracing.span('serialize'):
+            data = YoutubeSerializer(youtube).data
+
+        return Response(data, status=status.HTTP_201_CREATED if fetched else status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_POST
+async def get_captions_async(request):
+    # Async variant of get_captions; the lookup and transcript API are
+    # blocking, so they run on the shared bounded executor instead of the
+    # event loop.
+    data = parse_json_body(request)
+    if data is None:
+        return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+
+    url = data.get('url')
+    if not url:
+        return JsonResponse({'error': 'URL is required'}, status=400)
+
+    video_id = extract_video_id(url)
+
+    if not video_id:
+        return JsonResponse({'error': 'Invalid YouTube URL'}, status=400)
 
     try:
-        # Fetch the transcript
-        transcript = YouTubeTranscriptApi.get_transcript(video_id)
+        youtube, fetched = await run_blocking(get_transcript, video_id, url)
+        with tracing.span('serialize'):
+            data = YoutubeSerializer(youtube).data
+        return JsonResponse(data, status=status.HTTP_201_CREATED if fetched else status.HTTP_200_OK)
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
 
-        # Extract the text from the transcript
-        text = ' '.join([item['text'] for item in transcript])
 
-        # Create a new Youtube instance and save it to the database
-        youtube = Youtube(url=url, text=text)
-        youtube.save()
+def playlist_video_ids(playlist_id, limit):
+    """
+    Video ids of a playlist in playlist order, at most limit of them, listed
+    with the YouTube Data API.
+    """
+    from googleapiclient.discovery import build
 
-        # Serialize the Youtube instance
-        serializer = YoutubeSerializer(youtube)
+    if not settings.YOUTUBE_API_KEY:
+        raise ValueError('YOUTUBE_API_KEY must be set to fetch playlists')
+    client = build('youtube', 'v3', developerKey=settings.YOUTUBE_API_KEY, cache_discovery=False)
+    video_ids, page_token = [], None
+    while len(video_ids) < limit:
+        page = client.playlistItems().list(
+            part='contentDetails', playlistId=playlist_id, maxResults=50, pageToken=page_token
+        ).execute()
+        video_ids.extend(item['contentDetails']['videoId'] for item in page.get('items', []))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            break
+    return video_ids[:limit]
+
+
+async def fetch_transcripts(video_ids, languages, translate) -> Dict[str, Dict]:
+    """
+    Fetch the transcripts of several videos concurrently,
+    YOUTUBE_BULK_CONCURRENCY at a time, giving up on a video after
+    YOUTUBE_BULK_TIMEOUT seconds. Returns a result dict per video id.
+
+    A timeout only abandons the await: the fetch keeps running on its thread.
+    The fetches share a pool of YOUTUBE_BULK_MAX_WORKERS threads, so stuck
+    fetches can't grow past it or take the threads of the other async views;
+    once it is full, new fetches wait in its queue and time out there.
+    """
+    semaphore = asyncio.Semaphore(settings.YOUTUBE_BULK_CONCURRENCY)
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    async def fetch(video_id):
+        async with semaphore:
+            try:
+                text, language, translated = await asyncio.wait_for(
+                    run_in(get_bulk_executor(), fetch_transcript, video_id, languages, translate),
+                    settings.YOUTUBE_BULK_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                return {'status': 'timeout', 'error': f'No transcript after {settings.YOUTUBE_BULK_TIMEOUT:g} seconds'}
+            except Exception as e:
+                return {'status': 'error', 'error': str(e), 'error_type': type(e).__name__}
+            return {'status': 'fetched', 'text': text, 'language': language, 'translated': translated}
+
+    results = await asyncio.gather(*(fetch(video_id) for video_id in video_ids))
+    return dict(zip(video_ids, results))
+
+
+def _parse_languages(value) -> List[str]:
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list) or not all(isinstance(code, str) for code in value):
+        raise ValueError('languages must be a list of language codes')
+    return [code.strip() for code in value if code.strip()]
+
+
+@api_view(['POST'])
+def get_captions_bulk(request):
+    """
+    Fetch the transcripts of many videos in one request.
+    Body: {"urls": [...], "playlist": <playlist id or URL>, "languages": ["ar", "en"],
+           "translate": true}
+    Fresh stored transcripts are reused (when in one of the languages, if
+    given); the others are fetched concurrently, with a timeout per video,
+    and stored with one bulk upsert. With "translate" (the default), a video
+    without a transcript in any of the languages is translated into the
+    first one. The response has one result per video, in input order.
+    """
+    urls = request.data.get('urls') or []
+    playlist = request.data.get('playlist')
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        return Response({'error': 'urls must be a list of URLs'}, status=400)
+    if not urls and not playlist:
+        return Response({'error': 'urls or playlist is required'}, status=400)
+    try:
+        requested_languages = _parse_languages(request.data.get('languages') or [])
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    languages = requested_languages or settings.YOUTUBE_TRANSCRIPT_LANGUAGES
+    translate = request.data.get('translate', True)
+    if not isinstance(translate, bool):
+        translate = str(translate).strip().lower() in ('1', 'true', 'yes')
+
+    max_videos = settings.YOUTUBE_BULK_MAX_VIDEOS
+    if len(urls) > max_videos:
+        return Response({'error': f'At most {max_videos} videos are allowed'}, status=400)
+    if playlist:
+        playlist_id = extract_playlist_id(str(playlist))
+        if not playlist_id:
+            return Response({'error': 'Invalid YouTube playlist'}, status=400)
+        try:
+            # One more than allowed, to tell a full playlist from a too long one
+            video_ids = playlist_video_ids(playlist_id, max_videos - len(urls) + 1)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        except Exception as e:
+            return Response({'error': f'Could not list the playlist: {e}'}, status=502)
+        urls = urls + [f'https://www.youtube.com/watch?v={video_id}' for video_id in video_ids]
+        if len(urls) > max_videos:
+            return Response({'error': f'At most {max_videos} videos are allowed'}, status=400)
+
+    try:
+        videos = [(url, extract_video_id(url)) for url in urls]
+        video_ids = list(dict.fromkeys(video_id for _, video_id in videos if video_id))
+
+        # Fresh transcripts stored before, in a usable language
+        stored = {
+            youtube.video_id: youtube
+            for youtube in Youtube.objects.filter(video_id__in=video_ids)
+            if is_fresh(youtube) and (not requested_languages or youtube.language in requested_languages)
+        }
+        missing = [video_id for video_id in video_ids if video_id not in stored]
+        fetched = async_to_sync(fetch_transcripts)(missing, languages, translate) if missing else {}
+
+        # Store every new transcript with one bulk upsert
+        urls_by_id = {video_id: url for url, video_id in reversed(videos) if video_id}
+        now = timezone.now()
+        rows = [
+            Youtube(video_id=video_id, url=urls_by_id[video_id], text=result['text'],
+                    language=result['language'], fetched_at=now)
+            for video_id, result in fetched.items() if result['status'] == 'fetched'
+        ]
+        if rows:
+            with tracing.span('db_write'):
+                Youtube.objects.bulk_create(rows, update_conflicts=True, unique_fields=['video_id'],
+                                            update_fields=['url', 'text', 'language', 'fetched_at'])
+        saved = {youtube.video_id: youtube for youtube in rows}
+
+        with tracing.span('serialize'):
+            results = []
+            for index, (url, video_id) in enumerate(videos):
+                result = {'index': index, 'url': url, 'video_id': video_id}
+                if not video_id:
+                    result.update(status='error', error='Invalid YouTube URL')
+                elif video_id in stored:
+                    result.update(status='stored', transcript=YoutubeSerializer(stored[video_id]).data)
+                else:
+                    outcome = fetched[video_id]
+                    if outcome['status'] == 'fetched':
+                        result.update(status='fetched', translated=outcome['translated'],
+                                      transcript=YoutubeSerializer(saved[video_id]).data)
+                    else:
+                        result.update(outcome)
+                results.append(result)
+        return Response({'results': results}, status=status.HTTP_200_OK)
 
     except Exception as e:
-        return Response({'error': str(e)}, status=500)
+        return Response({'error': str(e), 'error_type': type(e).__name__}, status=500)